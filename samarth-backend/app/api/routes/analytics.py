@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException
-from app.models.request_models import AnalyticsQuery, QueryFeedback
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.config import settings
+from app.models.request_models import AnalyticsQuery, BatchQuery, QueryFeedback, RollupQuery, StructuredQuery
 from app.models.response_models import AnalyticsResponse, APIResponse
 from app.services.query_processor import query_processor
 from app.core.logging import logger
+from app.core.concurrency import ServiceSaturatedError, run_blocking
+from app.core.telemetry import encoded_response, mark_request_parsed
+from app.services.history_store import history_store
+from app.services.rollup_engine import rollup_engine
+from app.utils.serialization import dumps_compact
 
-router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
-
-# Store query history temporarily in memory for POC
-query_history = []
+router = APIRouter(prefix="/api/analytics", tags=["Analytics"], dependencies=[Depends(mark_request_parsed)])
 
 @router.post("/query", response_model=AnalyticsResponse)
 async def execute_query(query_request: AnalyticsQuery):
@@ -21,21 +27,176 @@ async def execute_query(query_request: AnalyticsQuery):
         )
         
         # Store in history
-        query_history.append(result.dict())
+        history_store.record(result)
         
-        return result
+        return encoded_response(result)
         
+    except ServiceSaturatedError as e:
+        logger.warning(f"Rejecting query with {e.status_code}: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error executing query: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+def _sse(event: Dict[str, Any]) -> str:
+    """Formats one processor event as a Server-Sent Event frame."""
+    name = event["event"]
+    if name == "result":
+        extra = {"index": event["index"]} if "index" in event else {}
+        data = event["response"].to_json(**extra).decode("utf-8")
+    else:
+        data = dumps_compact({k: v for k, v in event.items() if k != "event"})
+    return f"event: {name}\ndata: {data}\n\n"
+
+@router.post("/query/stream")
+async def stream_query(query_request: AnalyticsQuery):
+    """Execute analytics query, streaming tool activity and insight tokens as Server-Sent Events"""
+
+    events = query_processor.stream_query(
+        query=query_request.query,
+        context=query_request.context,
+        filters=query_request.filters
+    )
+
+    # Admission happens before the first event, so saturation can still be a 503
+    try:
+        first = await events.__anext__()
+    except ServiceSaturatedError as e:
+        logger.warning(f"Rejecting query with {e.status_code}: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error executing query: {e}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+    async def body() -> AsyncIterator[str]:
+        event = first
+        try:
+            while True:
+                if event["event"] == "result":
+                    history_store.record(event["response"])
+                yield _sse(event)
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield _sse({"event": "error", "detail": f"Internal Server Error: {str(e)}"})
+        finally:
+            # Releases the agent slot promptly if the client disconnects mid-stream
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _batch_error(index: int, error: Exception) -> Dict[str, Any]:
+    """Error event for one batch item, with the status the single-query route would have used."""
+    if isinstance(error, ServiceSaturatedError):
+        return {"event": "error", "index": index, "status": error.status_code, "detail": str(error), "retry_after": error.retry_after}
+    logger.error(f"Error executing batch item {index}: {error}")
+    return {"event": "error", "index": index, "status": 500, "detail": f"Internal Server Error: {str(error)}"}
+
+@router.post("/query/batch")
+async def batch_query(batch_request: BatchQuery):
+    """
+    Execute several analytics queries, streaming each result as a Server-Sent
+    Event as soon as it finishes. Identical questions are answered once.
+    """
+    if len(batch_request.queries) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {settings.BATCH_MAX_ITEMS} queries")
+
+    max_parallel = min(batch_request.max_parallel or settings.BATCH_MAX_PARALLEL, settings.BATCH_MAX_PARALLEL)
+    events = query_processor.process_batch(batch_request.queries, max_parallel)
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for event in events:
+                if event["event"] == "result":
+                    history_store.record(event["response"])
+                elif event["event"] == "error":
+                    event = _batch_error(event["index"], event["error"])
+                yield _sse(event)
+        except Exception as e:
+            logger.error(f"Error streaming batch: {e}")
+            yield _sse({"event": "error", "detail": f"Internal Server Error: {str(e)}"})
+        finally:
+            # Stops the remaining items if the client disconnects
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/structured", response_model=AnalyticsResponse)
+async def execute_structured_query(structured_query: StructuredQuery):
+    """Run a typed dimensions/measures/filters query directly, without the AI agent"""
+    try:
+        result = await query_processor.process_structured(structured_query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error executing structured query: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+    history_store.record(result)
+    return encoded_response(result)
+
+@router.post("/rollup", response_model=APIResponse)
+async def query_rollup(rollup_request: RollupQuery):
+    """Answer State/Year/Crop group-bys directly from the in-memory rollup engine"""
+    if rollup_engine is None:
+        raise HTTPException(status_code=503, detail="Rollup engine is disabled")
+    if not await run_blocking(rollup_engine.ensure_fresh):
+        raise HTTPException(status_code=503, detail="Rollup engine is not available")
+
+    try:
+        rows = rollup_engine.query(
+            group_by=rollup_request.group_by,
+            measures=rollup_request.measures,
+            filters=rollup_request.filters,
+            order_by=rollup_request.order_by,
+            descending=rollup_request.descending,
+            limit=rollup_request.limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return encoded_response(APIResponse(
+        success=True,
+        message=f"{len(rows)} rows",
+        data=rows
+    ))
+
 @router.get("/history")
-async def get_query_history(limit: int = 10):
-    """Get recent query history"""
+async def get_query_history(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = Query(None, max_length=200, description="Case-insensitive text the query must contain")
+):
+    """Get query history, newest first, one keyset page at a time"""
+    try:
+        items, next_cursor = await history_store.list(limit=limit, cursor=cursor, since=since, until=until, text=q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return {
         "success": True,
-        "data": query_history[-limit:],
-        "total": len(query_history)
+        "data": items,
+        "next_cursor": next_cursor
     }
 
 @router.post("/feedback", response_model=APIResponse)
@@ -43,7 +204,10 @@ async def submit_feedback(feedback: QueryFeedback):
     """Submit feedback for a query"""
     logger.info(f"Received feedback for query {feedback.query_id}: {feedback.rating}/5")
     
-    return APIResponse(
+    if not history_store.record_feedback(feedback):
+        raise HTTPException(status_code=503, detail="Feedback storage is unavailable")
+
+    return encoded_response(APIResponse(
         success=True,
         message="Feedback submitted successfully"
-    )
\ No newline at end of file
+    ))
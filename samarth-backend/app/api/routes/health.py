@@ -1,19 +1,46 @@
+import os
 from fastapi import APIRouter
 from app.models.response_models import HealthResponse
 from app.services.ai_service import ai_service
+from app.core.admission import admission
+from app.core.concurrency import run_blocking, run_shared
+from app.core.shared_state import shared_state
+from app.database.engine import database_status
+from app.services.answer_cache import answer_cache
+from app.services.history_store import history_store
+from app.services.insight_store import insight_store
+from app.services.query_processor import query_processor
+from app.services.rollup_engine import rollup_engine
+from app.tools.sql_cache import sql_result_cache
+from app.tools.sql_tools import sql_single_flight
 
 router = APIRouter(prefix="/api/health", tags=["Health"])
 
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    # Off the event loop: an unreachable server would otherwise stall every request for the timeout
+    reachable = await run_shared(shared_state.ping)
+    answer_cache_stats = await run_blocking(answer_cache.stats) if answer_cache else "disabled"
     return HealthResponse(
         status="healthy",
         version="1.0.0",
         services={
             "api": "operational",
-            # Check if Gemini model was initialized
-            "ai_service": "operational" if ai_service.model else "unavailable (Check GEMINI_API_KEY)", 
-            "database": "mocked" 
+            # Tells workers apart when several serve the same port
+            "worker_pid": os.getpid(),
+            # Reported without forcing the lazy Gemini client to load
+            "ai_service": ai_service.status(),
+            "database": database_status(),
+            "answer_cache": answer_cache_stats,
+            "sql_cache": sql_result_cache.stats() if sql_result_cache else "disabled",
+            "rollup_engine": rollup_engine.stats() if rollup_engine else "disabled",
+            "history": history_store.stats(),
+            "insights": insight_store.stats() if insight_store else "disabled",
+            # Lane queue depths and rejections by reason
+            "admission": admission.stats(),
+            # Concurrent identical questions / SQL statements answered by one run
+            "single_flight": {"queries": query_processor.single_flight.stats(), "sql": sql_single_flight.stats()},
+            "shared_state": {**shared_state.stats(), "reachable": reachable}
         }
     )
\ No newline at end of file
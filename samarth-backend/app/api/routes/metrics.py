@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.core.admission import admission
+from app.core.concurrency import agent_limiter, run_blocking
+from app.core.telemetry import render_gauges, render_metrics
+from app.database.engine import database_status
+from app.services.answer_cache import answer_cache
+from app.tools.sql_cache import sql_result_cache
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of latency histograms, token counters and pool/cache gauges"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+
+    lines = [render_metrics()]
+    lines += render_gauges("samarth_agent_limiter", "Agent concurrency limiter state.", agent_limiter.stats(), "field")
+    lines += render_gauges("samarth_admission", "Admission control lanes and rejections.", admission.stats(), "field")
+    pool = database_status()["sync"]
+    if isinstance(pool, dict):
+        lines += render_gauges("samarth_db_pool", "Sync database pool state.", pool, "field")
+    if answer_cache is not None:
+        lines += render_gauges("samarth_answer_cache", "Answer cache counters.", await run_blocking(answer_cache.stats), "field")
+    if sql_result_cache is not None:
+        lines += render_gauges("samarth_sql_cache", "SQL result cache counters.", sql_result_cache.stats(), "field")
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
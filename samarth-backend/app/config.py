@@ -24,7 +24,112 @@ class Settings(BaseSettings):
     def DATABASE_URL(self) -> str:
         # Using psycopg2 driver
         return f"postgresql+psycopg2://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        # Same database through the asyncpg driver
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+
+    # Connection pool / statement limits
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_TIMEOUT_SECONDS: float = Field(10.0, description="Max wait for a pooled connection before failing.")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(5000, description="Server-side statement_timeout for model-generated SQL.")
+    DB_ASYNC_ENABLED: bool = Field(False, description="Run SQL tool calls through the asyncpg engine.")
     
+    # Agent concurrency / backpressure
+    AGENT_MAX_CONCURRENCY: int = Field(8, description="Max agent loops running at once per process.")
+    AGENT_MAX_QUEUE: int = Field(32, description="Max requests waiting for an agent slot before rejecting with 503.")
+    AGENT_QUEUE_TIMEOUT_SECONDS: float = Field(10.0, description="How long a request may wait for an agent slot.")
+    AGENT_RETRY_AFTER_SECONDS: int = Field(5, description="Retry-After hint sent with 503 responses.")
+    AGENT_MAX_TURNS: int = Field(5, description="Max model calls per agent loop; the last one must answer without tools.")
+    AGENT_TIME_BUDGET_SECONDS: float = Field(45.0, description="Hard wall-clock limit for one agent loop.")
+    AGENT_RATE_LIMIT_PER_MINUTE: int = Field(0, description="Agent runs allowed per minute across all workers sharing state; 0 disables.")
+    SHUTDOWN_DRAIN_SECONDS: float = Field(20.0, description="On shutdown, how long in-flight agent loops may finish while new ones are refused.")
+    SQL_EXECUTOR_WORKERS: int = Field(4, description="Threads used to run blocking SQL tool calls.")
+
+    # Admission control (per client, per process)
+    ADMISSION_ENABLED: bool = Field(True, description="Apply per-client cost budgets and the in-flight cap to /api/analytics.")
+    ADMISSION_MAX_IN_FLIGHT: int = Field(256, description="Max analytics requests in flight per process; keep it above AGENT_MAX_CONCURRENCY + AGENT_MAX_QUEUE so cheap requests always have room.")
+    ADMISSION_BUCKET_CAPACITY: float = Field(60.0, description="Cost units a client may spend in a burst.")
+    ADMISSION_REFILL_PER_SECOND: float = Field(0.5, description="Cost units restored to each client's bucket per second.")
+    ADMISSION_BASE_COST: float = Field(0.1, description="Cost charged for every request, however cheap.")
+    ADMISSION_COST_PER_MODEL_CALL: float = Field(5.0, description="Cost charged per Gemini call a request made.")
+    ADMISSION_COST_PER_SQL_SECOND: float = Field(10.0, description="Cost charged per second of database or structured-query time.")
+    ADMISSION_MAX_CLIENTS: int = Field(10000, description="Client buckets tracked; the least recently seen are forgotten first.")
+    ADMISSION_TRUST_FORWARDED_FOR: bool = Field(False, description="Identify clients by the first X-Forwarded-For address (only behind a trusted proxy).")
+
+    # Answer cache (in front of the Gemini agent loop)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_BACKEND: str = Field("memory", description="'memory', 'sqlite' or 'shared' (the shared-state backend).")
+    ANSWER_CACHE_MAX_ENTRIES: int = 512
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SQLITE_PATH: str = "cache/answer_cache.sqlite3"
+    ANSWER_CACHE_SEMANTIC_ENABLED: bool = Field(False, description="Also match paraphrased questions via embeddings.")
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = Field(0.92, description="Minimum cosine similarity for a semantic hit.")
+    EMBEDDING_MODEL: str = "models/text-embedding-004"
+
+    # SQL tool
+    SQL_TOOL_ROW_LIMIT: int = Field(50, description="Max rows fetched and returned to the model per tool call.")
+    SQL_TOOL_FORMAT: str = Field("csv", description="Tool result encoding: 'csv' (one header row, rounded numbers) or 'json' (an object per row).")
+    SQL_TOOL_DECIMALS: int = Field(2, description="Decimal places kept for non-integer numbers in csv tool results.")
+    SQL_TOOL_SUMMARIZE: bool = Field(True, description="Return per-group min/max/mean (computed in the database) instead of a truncated listing when rows exceed the limit.")
+    SQL_TOOL_SAMPLE_ROWS: int = Field(5, description="Rows listed alongside a summary.")
+    SQL_MAX_PLAN_COST: float = Field(1_000_000.0, description="Reject model SQL whose Postgres EXPLAIN total cost exceeds this; 0 disables.")
+    SQL_REWRITE_AGGREGATES: bool = Field(True, description="Run base-table GROUP BYs on the materialized aggregate views when equivalent.")
+
+    # SQL tool result cache
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_MAX_BYTES: int = Field(8 * 1024 * 1024, description="Total serialized result bytes kept in the SQL cache.")
+
+    # In-memory rollup engine
+    ROLLUP_ENGINE_ENABLED: bool = True
+    ROLLUP_MAX_ROWS: int = Field(5_000_000, description="Skip building the in-memory rollups above this many rows.")
+
+    # Structured queries
+    INTENT_ROUTER_ENABLED: bool = Field(True, description="Answer template questions as structured queries without calling Gemini.")
+
+    # Batch queries
+    BATCH_MAX_ITEMS: int = Field(50, description="Max questions accepted in one /query/batch request.")
+    BATCH_MAX_PARALLEL: int = Field(4, description="Distinct questions of one batch processed at once.")
+
+    # Precomputed insights for popular questions
+    INSIGHTS_PRECOMPUTE_ENABLED: bool = Field(True, description="Answer the most asked questions ahead of time in a background job.")
+    INSIGHTS_TOP_N: int = Field(20, description="Questions from history kept precomputed.")
+    INSIGHTS_MIN_ASKS: int = Field(3, description="Times a question must appear in the history window to be precomputed.")
+    INSIGHTS_HISTORY_WINDOW: int = Field(2000, description="Most recent history entries used to rank questions.")
+    INSIGHTS_MAX_AGE_SECONDS: float = Field(3600.0, description="Age after which a precomputed answer is refreshed (it is still served meanwhile).")
+    INSIGHTS_POLL_SECONDS: float = Field(60.0, description="How often popularity is re-ranked and stale or reloaded-data answers are refreshed.")
+
+    # Query history
+    HISTORY_BUFFER_SIZE: int = Field(500, description="Recent history entries kept in memory per worker.")
+    HISTORY_PERSIST: bool = Field(True, description="Write history and feedback to the database in background batches.")
+    HISTORY_DATABASE_URL: str = Field("", description="Separate database for history, e.g. sqlite:///cache/history.sqlite3; empty uses the main database.")
+    HISTORY_BATCH_SIZE: int = Field(200, description="Max history/feedback rows per background write.")
+    HISTORY_FLUSH_SECONDS: float = Field(1.0, description="Max delay before queued history rows are written.")
+    HISTORY_QUEUE_MAX: int = Field(10000, description="Queued writes beyond this are dropped rather than blocking requests.")
+
+    # data.gov.in ingestion
+    DATA_GOV_BASE_URL: str = Field("https://api.data.gov.in/resource", description="Base URL of the data.gov.in resource API.")
+    DATA_GOV_API_KEY: str = Field("", description="API key for data.gov.in.")
+    DATA_GOV_TIMEOUT_SECONDS: float = 30.0
+    INGEST_PAGE_SIZE: int = Field(1000, description="Records requested per data.gov.in page.")
+    INGEST_CHUNK_ROWS: int = Field(50000, description="Rows per COPY/upsert batch.")
+    SEED_MOCK_DATA: bool = Field(True, description="Load the built-in mock rows on startup into an empty table. The first ingestion replaces them.")
+    DATA_VERSION_POLL_SECONDS: float = Field(2.0, description="How often a worker checks the database for data loaded by another process.")
+
+    # Shared state (multi-worker / multi-node deployments)
+    SHARED_STATE_BACKEND: str = Field("memory", description="'memory' (per process) or 'redis' (shared by every worker and node).")
+    SHARED_STATE_URL: str = Field("redis://localhost:6379/0", description="Redis-protocol server for the redis backend; rediss:// for TLS.")
+    SHARED_STATE_PREFIX: str = Field("samarth:", description="Prefix for every shared-state key.")
+    SHARED_STATE_TIMEOUT_SECONDS: float = 0.5
+    SHARED_STATE_WORKERS: int = Field(8, description="Threads that run shared-state calls off the event loop (one connection each).")
+
+    # Startup
+    STARTUP_WARMUP: bool = Field(True, description="Build the Gemini client and rollups in the background after startup instead of on the first request.")
+
     # Security (Placeholder for POC)
     SECRET_KEY: str = Field("a-very-secure-secret-key-for-poc-only", description="A strong secret key for security tokens.")
     JWT_ALGORITHM: str = "HS256"
@@ -32,6 +137,11 @@ class Settings(BaseSettings):
     
     # Logging
     LOG_LEVEL: str = "INFO"
+
+    # Instrumentation
+    METRICS_ENABLED: bool = Field(True, description="Expose Prometheus-format metrics on /metrics.")
+    DEBUG_TIMING_ENABLED: bool = Field(False, description="Honour X-Debug-Timing request headers with per-stage timings.")
+    OTEL_ENABLED: bool = Field(False, description="Also emit spans through OpenTelemetry (requires opentelemetry-api/sdk).")
     
     model_config = SettingsConfigDict(
         env_file = ".env",
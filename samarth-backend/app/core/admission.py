@@ -0,0 +1,215 @@
+import contextvars
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.core.concurrency import ClientRateLimitedError, agent_limiter
+from app.core.logging import logger
+from app.core.telemetry import RequestTrace, current_trace
+
+# Only the analytics API is metered; health checks, metrics and docs always get through
+ADMITTED_PREFIXES = ("/api/analytics",)
+
+# Spans that make up a request's measured cost
+MODEL_SPANS = ("gemini.generate",)
+SQL_SPANS = ("sql.db", "structured.query")
+
+_current_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("samarth_client", default=None)
+
+
+def client_key(scope: Dict[str, Any]) -> str:
+    """Identifies the caller: its X-API-Key (hashed, never stored raw) or else its address."""
+    headers = dict(scope.get("headers") or [])
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key).hexdigest()[:16]
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and settings.ADMISSION_TRUST_FORWARDED_FOR:
+        return "ip:" + forwarded.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+def detach_client() -> None:
+    """Clears the client in the current context, for work shared by several clients' requests."""
+    _current_client.set(None)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class AdmissionController:
+    """
+    Per-client token buckets charged with what each request actually cost
+    (Gemini calls plus SQL time, measured from its spans), and a cap on
+    requests in flight in this process.
+
+    Requests form two lanes. Every request only needs a positive balance and
+    a free in-flight slot; agent runs additionally need enough budget for a
+    typical run and then wait in the agent limiter's queue. Cached and
+    structured answers therefore never queue behind agent loops, and a client
+    that has spent its agent budget can still use the cheap paths.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_per_second: float,
+        max_in_flight: int,
+        max_clients: int,
+        base_cost: float,
+        cost_per_model_call: float,
+        cost_per_sql_second: float
+    ):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_in_flight = max_in_flight
+        self.max_clients = max_clients
+        self.base_cost = base_cost
+        self.cost_per_model_call = cost_per_model_call
+        self.cost_per_sql_second = cost_per_sql_second
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._in_flight = 0
+        # Moving average of what agent runs cost, starting at two model calls
+        self._agent_cost = base_cost + 2 * cost_per_model_call
+        self._charged = 0.0
+        self._rejected_capacity = 0
+        self._rejected_rate_limited = 0
+        self._rejected_agent_budget = 0
+
+        agent_lane = agent_limiter.max_concurrency + agent_limiter.max_queue
+        if max_in_flight <= agent_lane:
+            logger.warning(
+                f"ADMISSION_MAX_IN_FLIGHT ({max_in_flight}) does not exceed the agent lane ({agent_lane}); "
+                f"agent runs can fill every slot"
+            )
+
+    def _bucket(self, client: str) -> TokenBucket:
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.capacity, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return bucket
+        self._buckets.move_to_end(client)
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_per_second)
+        bucket.updated = now
+        return bucket
+
+    def _retry_after(self, bucket: TokenBucket, needed: float) -> int:
+        if self.refill_per_second <= 0:
+            return 60
+        return max(1, math.ceil((needed - bucket.tokens) / self.refill_per_second))
+
+    def admit(self, client: str) -> Optional[Tuple[int, str, int]]:
+        """Takes an in-flight slot for the client, or returns (status, detail, retry_after) to reject with."""
+        if self._in_flight >= self.max_in_flight:
+            self._rejected_capacity += 1
+            return 503, "Server is at capacity, please retry.", settings.AGENT_RETRY_AFTER_SECONDS
+        bucket = self._bucket(client)
+        # Costs are charged afterwards, so a balance above zero is enough to start
+        if bucket.tokens <= 0:
+            self._rejected_rate_limited += 1
+            return 429, "Rate limit exceeded for this client, please retry later.", self._retry_after(bucket, self.base_cost)
+        self._in_flight += 1
+        return None
+
+    def release(self, client: str, trace: Optional[RequestTrace]) -> float:
+        """Frees the slot and charges the client for what the request cost."""
+        self._in_flight -= 1
+        model_calls, _ = trace.totals(*MODEL_SPANS) if trace else (0, 0.0)
+        _, sql_seconds = trace.totals(*SQL_SPANS) if trace else (0, 0.0)
+        cost = self.base_cost + model_calls * self.cost_per_model_call + sql_seconds * self.cost_per_sql_second
+        self._bucket(client).tokens -= cost
+        self._charged += cost
+        if model_calls:
+            self._agent_cost = 0.8 * self._agent_cost + 0.2 * cost
+        return cost
+
+    def check_agent_budget(self) -> None:
+        """Agent lane gate: the current client must be able to afford a typical agent run."""
+        client = _current_client.get()
+        if client is None:
+            return
+        bucket = self._bucket(client)
+        needed = min(self._agent_cost, self.capacity)
+        if bucket.tokens < needed:
+            self._rejected_agent_budget += 1
+            raise ClientRateLimitedError(
+                "Agent budget for this client is spent; cached and structured queries remain available.",
+                self._retry_after(bucket, needed)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        agent = agent_limiter.stats()
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "fast_lane_in_flight": max(self._in_flight - agent["active"] - agent["waiting"], 0),
+            "agent_lane_active": agent["active"],
+            "agent_lane_queue_depth": agent["waiting"],
+            "rejected_capacity": self._rejected_capacity,
+            "rejected_rate_limited": self._rejected_rate_limited,
+            "rejected_agent_budget": self._rejected_agent_budget,
+            "rejected_agent_queue": agent["rejected"],
+            "clients": len(self._buckets),
+            "cost_charged": round(self._charged, 2),
+            "agent_cost_estimate": round(self._agent_cost, 2),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the AdmissionController to analytics routes.
+    Installed inside CORSMiddleware (so rejections still carry CORS headers)
+    and TimingMiddleware, whose request trace it reads the cost from.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or not settings.ADMISSION_ENABLED
+            # CORS preflights are answered by the CORS middleware and never metered
+            or scope["method"] == "OPTIONS"
+            or not scope["path"].startswith(ADMITTED_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client = client_key(scope)
+        rejection = admission.admit(client)
+        if rejection is not None:
+            status, detail, retry_after = rejection
+            logger.warning(f"Admission rejected {client} with {status}: {detail}")
+            response = JSONResponse({"detail": detail}, status_code=status, headers={"Retry-After": str(retry_after)})
+            await response(scope, receive, send)
+            return
+
+        token = _current_client.set(client)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_client.reset(token)
+            admission.release(client, current_trace())
+
+
+admission = AdmissionController(
+    capacity=settings.ADMISSION_BUCKET_CAPACITY,
+    refill_per_second=settings.ADMISSION_REFILL_PER_SECOND,
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    max_clients=settings.ADMISSION_MAX_CLIENTS,
+    base_cost=settings.ADMISSION_BASE_COST,
+    cost_per_model_call=settings.ADMISSION_COST_PER_MODEL_CALL,
+    cost_per_sql_second=settings.ADMISSION_COST_PER_SQL_SECOND,
+)
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+from app.config import settings
+from app.core.logging import logger
+from app.core.shared_state import SharedStateError, shared_state
+
+
+class ServiceSaturatedError(Exception):
+    """Raised when the agent pipeline cannot accept more work right now."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientRateLimitedError(ServiceSaturatedError):
+    """Raised when one client has spent its cost budget; other clients are unaffected."""
+
+    status_code = 429
+
+
+def after_fork(callback: Callable[[], None]) -> None:
+    """
+    Runs `callback` in every child process forked from this one (gunicorn
+    --preload, uvicorn --workers), to drop sockets, pools and threads that
+    must not be shared with the parent.
+    """
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=callback)
+
+
+class ConcurrencyLimiter:
+    """
+    Per-process limiter with a bounded wait queue for expensive agent runs,
+    plus an optional per-minute rate limit counted in shared state.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int,
+        rate_limit_per_minute: int = 0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.rate_limit_per_minute = rate_limit_per_minute
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+        self._rate_limited = 0
+        self._draining = False
+
+    async def _check_rate(self) -> None:
+        now = time.time()
+        try:
+            count = await run_shared(shared_state.incr, f"agent_rate:{int(now // 60)}", ttl=60)
+        except SharedStateError as e:
+            # Fail open: an unreachable store must not take the API down with it
+            logger.warning(f"Agent rate limit not enforced, shared state unavailable: {e}")
+            return
+        if count > self.rate_limit_per_minute:
+            self._rate_limited += 1
+            raise ServiceSaturatedError("Agent rate limit reached, please retry later.", 60 - int(now % 60))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one execution slot, queueing briefly or rejecting when saturated."""
+        if self._draining:
+            raise ServiceSaturatedError("Server is shutting down, please retry.", self.retry_after)
+        # Counted synchronously so bursts are judged before any acquire is scheduled
+        if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+            self._rejected += 1
+            raise ServiceSaturatedError("Agent queue is full, please retry later.", self.retry_after)
+
+        self._waiting += 1
+        try:
+            if self.rate_limit_per_minute:
+                await self._check_rate()
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise ServiceSaturatedError("Timed out waiting for an agent slot.", self.retry_after)
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Refuses new agent runs and waits for the running and queued ones to
+        finish. Returns False if some were still in flight at the timeout.
+        """
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        while self._active + self._waiting and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return not (self._active + self._waiting)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "rate_limited": self._rate_limited,
+            "draining": self._draining,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one in-flight task:
+    later callers await the first caller's result instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Returns (result, shared); shared is True when another caller's run was reused."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self._coalesced += 1
+        else:
+            self._started += 1
+            task = self._calls[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda done: self._calls.pop(key, None) if self._calls.get(key) is done else None)
+        # Shielded: one caller going away must not cancel the work the others are waiting for
+        return await asyncio.shield(task), shared
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "started": self._started, "coalesced": self._coalesced}
+
+
+def _new_sql_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=settings.SQL_EXECUTOR_WORKERS, thread_name_prefix="samarth-sql")
+
+
+def _new_shared_state_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=settings.SHARED_STATE_WORKERS, thread_name_prefix="samarth-shared-state")
+
+
+def _reset_sql_executor() -> None:
+    # Worker threads don't survive fork(); a child must start its own pools
+    global _sql_executor, _shared_state_executor
+    _sql_executor = _new_sql_executor()
+    _shared_state_executor = _new_shared_state_executor()
+
+
+# Dedicated pools so blocking DB work and shared-state round trips never run on the
+# event loop thread, and a slow shared-state server never takes SQL threads
+_sql_executor = _new_sql_executor()
+_shared_state_executor = _new_shared_state_executor()
+after_fork(_reset_sql_executor)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the SQL thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry contextvars (the request trace) into the worker thread, like asyncio.to_thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_sql_executor, partial(context.run, func, *args, **kwargs))
+
+
+async def run_shared(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a shared-state call and await its result. Network backends run on
+    their own thread pool; the in-process backend is called directly.
+    """
+    if not shared_state.shared:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_shared_state_executor, partial(context.run, func, *args, **kwargs))
+
+
+agent_limiter = ConcurrencyLimiter(
+    max_concurrency=settings.AGENT_MAX_CONCURRENCY,
+    max_queue=settings.AGENT_MAX_QUEUE,
+    queue_timeout=settings.AGENT_QUEUE_TIMEOUT_SECONDS,
+    retry_after=settings.AGENT_RETRY_AFTER_SECONDS,
+    rate_limit_per_minute=settings.AGENT_RATE_LIMIT_PER_MINUTE,
+)
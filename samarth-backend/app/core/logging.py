@@ -2,10 +2,18 @@ import logging
 import sys
 import os
 from pathlib import Path
+from typing import Optional
 from app.config import settings
 
-def setup_logging(log_level: str = settings.LOG_LEVEL):
-    """Configure application logging (Vercel-safe)"""
+_configured = False
+
+def setup_logging(log_level: Optional[str] = None):
+    """Configure application logging (Vercel-safe). Runs once per process; later calls are no-ops."""
+    global _configured
+    if _configured:
+        return logging.getLogger(__name__)
+    _configured = True
+    log_level = log_level or settings.LOG_LEVEL
 
     log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     handlers = [logging.StreamHandler(sys.stdout)]
@@ -0,0 +1,288 @@
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+from app.config import settings
+from app.core.logging import logger
+
+
+class SharedStateError(Exception):
+    """The shared-state server could not be reached or rejected a command."""
+
+
+class MemorySharedState:
+    """
+    Process-local implementation: the default for single-worker deployments.
+    Every worker has its own copy, so nothing here is shared.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[Any]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._values[key]
+            return None
+        return value
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._live(key)
+        return None if value is None else str(value)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            values = [self._live(key) for key in keys]
+        return [None if value is None else str(value) for value in values]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, self._expiry(ttl))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Adds to a counter; ttl is only applied when the counter is created."""
+        with self._lock:
+            current = self._live(key)
+            if current is None:
+                self._values[key] = (amount, self._expiry(ttl))
+                return amount
+            value = int(current) + amount
+            self._values[key] = (value, self._values[key][1])
+            return value
+
+    def push(self, key: str, value: str, cap: int) -> None:
+        """Prepends to a list that keeps only the newest `cap` items."""
+        with self._lock:
+            items = self._live(key)
+            if items is None:
+                items = deque(maxlen=cap)
+                self._values[key] = (items, None)
+            items.appendleft(value)
+
+    def items(self, key: str, count: int) -> List[str]:
+        """Newest-first items of a list made by push()."""
+        with self._lock:
+            items = self._live(key)
+            return list(items)[:count] if items is not None else []
+
+    def ping(self) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "keys": len(self._values)}
+
+
+class _RespConnection:
+    """One socket speaking RESP2, the protocol of Redis and its drop-in replacements."""
+
+    def __init__(self, host: str, port: int, timeout: float, use_tls: bool):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        if use_tls:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.pid = os.getpid()
+
+    @staticmethod
+    def _encode(args: Tuple[Any, ...]) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read(self) -> Any:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionResetError("Connection closed by the shared-state server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            # Returned, not raised, so the rest of a pipeline's replies are still read
+            return SharedStateError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise SharedStateError(f"Unexpected reply from the shared-state server: {line[:20]!r}")
+
+    def closed_by_server(self) -> bool:
+        """An idle connection only turns readable when the server has closed it (idle timeout, restart)."""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def execute(self, *commands: Tuple[Any, ...]) -> List[Any]:
+        """Sends commands as one pipeline and returns their replies in order."""
+        self.sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, SharedStateError):
+                raise reply
+        return replies
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisSharedState:
+    """
+    Shared state on a Redis-protocol server (Redis, Valkey, KeyDB, ...), so
+    every worker and node sees the same caches, history and rate limits.
+    Speaks RESP over a plain socket: one connection per thread, reopened
+    after a fork or a network error. The calls block, so async code runs
+    them through concurrency.run_shared, never on the event loop.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str, timeout: float):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "rediss"):
+            raise ValueError(f"Unsupported shared-state URL scheme: {parsed.scheme!r}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.use_tls = parsed.scheme == "rediss"
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+        self._errors = 0
+
+    def _connect(self) -> _RespConnection:
+        connection = _RespConnection(self.host, self.port, self.timeout, self.use_tls)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.username, self.password) if self.username else ("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            connection.execute(*setup)
+        return connection
+
+    def _execute(self, *commands: Tuple[Any, ...], idempotent: bool = True) -> List[Any]:
+        """
+        Runs a pipeline, reconnecting once if it fails. Pipelines that must not
+        run twice (INCRBY, LPUSH) are never resent: a connection can fail after
+        the server applied them, so they only get one attempt.
+        """
+        connection = getattr(self._local, "connection", None)
+        # A connection inherited through fork() shares its socket with the parent
+        if connection is not None and (connection.pid != os.getpid() or connection.closed_by_server()):
+            if connection.pid == os.getpid():
+                connection.close()
+            connection = self._local.connection = None
+        attempts = 2 if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                if connection is None:
+                    connection = self._connect()
+                    self._local.connection = connection
+                return connection.execute(*commands)
+            except SharedStateError:
+                self._errors += 1
+                raise
+            except (OSError, ValueError) as e:
+                if connection is not None:
+                    connection.close()
+                connection = self._local.connection = None
+                if attempt == attempts - 1:
+                    self._errors += 1
+                    raise SharedStateError(f"Shared state unavailable: {e}") from e
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Optional[str]:
+        return self._execute(("GET", self._key(key)))[0]
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        """Values of several keys in one round trip (MGET), None for missing ones."""
+        if not keys:
+            return []
+        return self._execute(("MGET", *(self._key(key) for key in keys)))[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        command = ("SET", self._key(key), value) + (("PX", int(ttl * 1000)) if ttl else ())
+        self._execute(command)
+
+    def delete(self, key: str) -> None:
+        self._execute(("DEL", self._key(key)))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Adds to a counter; ttl is only applied when the counter is created."""
+        if not ttl:
+            return self._execute(("INCRBY", self._key(key), amount), idempotent=False)[0]
+        value, remaining = self._execute(("INCRBY", self._key(key), amount), ("PTTL", self._key(key)), idempotent=False)
+        if remaining == -1:
+            # New counter (or one that lost its expiry): a window counter must never outlive its window
+            self._execute(("PEXPIRE", self._key(key), int(ttl * 1000)))
+        return value
+
+    def push(self, key: str, value: str, cap: int) -> None:
+        """Prepends to a list that keeps only the newest `cap` items."""
+        self._execute(("LPUSH", self._key(key), value), ("LTRIM", self._key(key), 0, cap - 1), idempotent=False)
+
+    def items(self, key: str, count: int) -> List[str]:
+        """Newest-first items of a list made by push()."""
+        return self._execute(("LRANGE", self._key(key), 0, count - 1))[0]
+
+    def ping(self) -> bool:
+        try:
+            return self._execute(("PING",))[0] == "PONG"
+        except SharedStateError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "server": f"{self.host}:{self.port}/{self.db}", "errors": self._errors}
+
+
+def _build_shared_state():
+    if settings.SHARED_STATE_BACKEND == "redis":
+        state = RedisSharedState(settings.SHARED_STATE_URL, settings.SHARED_STATE_PREFIX, settings.SHARED_STATE_TIMEOUT_SECONDS)
+        logger.info(f"Shared state on {state.host}:{state.port}/{state.db} (prefix {state.prefix!r})")
+        return state
+    if settings.SHARED_STATE_BACKEND != "memory":
+        logger.warning(f"Unknown SHARED_STATE_BACKEND {settings.SHARED_STATE_BACKEND!r}; using process memory")
+    return MemorySharedState()
+
+
+shared_state = _build_shared_state()
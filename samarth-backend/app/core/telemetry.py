@@ -0,0 +1,284 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from starlette.responses import JSONResponse, Response
+from app.config import settings
+from app.core.logging import logger
+from app.utils.serialization import dumps_bytes
+
+# Seconds; covers sub-millisecond cache hits up to slow multi-turn agent loops
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with Prometheus text rendering."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # [bucket counts..., +Inf count, sum]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            running = 0.0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                running += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {running:g}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {running:g}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._series: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._series.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._series)
+        lines += [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(snapshot.items())]
+        return lines
+
+
+def render_gauges(name: str, help_text: str, values: Dict[str, Any], label: str) -> List[str]:
+    """Renders point-in-time values (e.g. pool or limiter stats) as one gauge family."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"{name}{_format_labels(((label, key),))} {value:g}")
+    return lines
+
+
+STAGE_SECONDS = Histogram("samarth_stage_duration_seconds", "Duration of each pipeline stage.")
+REQUEST_SECONDS = Histogram("samarth_http_request_duration_seconds", "End-to-end HTTP request duration.")
+GEMINI_TOKENS = Counter("samarth_gemini_tokens_total", "Gemini tokens used, by kind (prompt/output).")
+TOOL_OUTPUT_TOKENS = Counter(
+    "samarth_tool_output_tokens_total",
+    "Estimated tokens of tool results sent to the model (sent) and of the same rows as JSON objects (json_rows).",
+)
+METRICS = [REQUEST_SECONDS, STAGE_SECONDS, GEMINI_TOKENS, TOOL_OUTPUT_TOKENS]
+
+
+class RequestTrace:
+    """Spans recorded while serving one request, for the X-Debug-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def merge(self, other: "RequestTrace") -> None:
+        """Adds another trace's spans, e.g. of work this request shared with others."""
+        with other._lock:
+            spans = list(other.spans)
+        with self._lock:
+            self.spans.extend(spans)
+
+    def totals(self, *names: str) -> Tuple[int, float]:
+        """Count and total seconds of the recorded spans with these names."""
+        with self._lock:
+            matched = [seconds for name, seconds in self.spans if name in names]
+        return len(matched), sum(matched)
+
+    def header(self) -> str:
+        total = time.perf_counter() - self.started
+        with self._lock:
+            spans = list(self.spans)
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans]
+        return ", ".join([*parts, f"total;dur={total * 1000:.2f}"])
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("samarth_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """The trace of the request being served, if any (set by TimingMiddleware)."""
+    return _current_trace.get()
+
+
+def start_trace() -> RequestTrace:
+    """Gives the current context (e.g. a task shared by several requests) a trace of its own."""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def _otel_tracer():
+    # Only imported when enabled, so it never adds to cold-start time
+    if not settings.OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:  # OpenTelemetry is optional; spans are still recorded locally
+        logger.warning("OTEL_ENABLED is set but opentelemetry is not installed; spans stay local")
+        return None
+    return otel_trace.get_tracer("samarth")
+
+
+_tracer = _otel_tracer()
+
+
+def record_span(name: str, seconds: float, **attributes: Any) -> None:
+    """
+    Records a finished stage: latency histogram, the current request's trace
+    and, when enabled, an OpenTelemetry span. Also used for durations measured
+    elsewhere (e.g. DB time reported by a query runner).
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+    if _tracer is not None:
+        # Emitted after the fact so spans never hold the OTel context across awaits or generator yields
+        end = time.time_ns()
+        otel_span = _tracer.start_span(name, start_time=end - int(seconds * 1e9))
+        for key, value in attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(f"samarth.{key}", value)
+        otel_span.end(end_time=end)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Times a pipeline stage with a monotonic clock. The yielded dict can be
+    filled with attributes (token counts, row counts) for OpenTelemetry.
+    """
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_span(name, time.perf_counter() - start, **attributes)
+
+
+def record_tokens(prompt: Optional[int], output: Optional[int]) -> None:
+    if prompt:
+        GEMINI_TOKENS.inc(prompt, kind="prompt")
+    if output:
+        GEMINI_TOKENS.inc(output, kind="output")
+
+
+def mark_request_parsed() -> None:
+    """Route dependency: closes the request.parse span once the body has been read and validated."""
+    trace = _current_trace.get()
+    if trace is not None:
+        record_span("request.parse", time.perf_counter() - trace.started)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware recording request latency per route. Clients that send
+    `X-Debug-Timing: 1` get the request's spans back in an X-Debug-Timing
+    header, when DEBUG_TIMING_ENABLED allows it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        debug = settings.DEBUG_TIMING_ENABLED and any(
+            name == b"x-debug-timing" and value not in (b"", b"0") for name, value in scope.get("headers", [])
+        )
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if debug:
+                    # Streaming responses only carry the spans finished before the first byte
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-debug-timing", trace.header().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - trace.started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records body encoding as the response.encode stage."""
+
+    def render(self, content: Any) -> bytes:
+        with span("response.encode"):
+            return dumps_bytes(content)
+
+
+def encoded_response(model: Any) -> Response:
+    """
+    Response from a model's own to_json(); skips FastAPI's re-validation and
+    jsonable_encoder pass over the return value (response_model still documents it).
+    """
+    with span("response.encode"):
+        body = model.to_json()
+    return Response(body, media_type="application/json")
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
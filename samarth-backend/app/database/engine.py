@@ -0,0 +1,263 @@
+import json
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.config import settings
+from app.core.concurrency import after_fork
+from app.core.logging import logger
+
+ENGINE: Optional[Engine] = None
+ASYNC_ENGINE = None  # sqlalchemy.ext.asyncio.AsyncEngine, created lazily
+
+QueryResult = Tuple[List[str], Sequence[Tuple[Any, ...]], int, float]
+
+
+class QueryCostExceededError(Exception):
+    """The planner's cost estimate for a statement is over the allowed budget."""
+
+    def __init__(self, cost: float, budget: float):
+        super().__init__(f"Estimated cost {cost:.0f} exceeds the budget of {budget:.0f}")
+        self.cost = cost
+        self.budget = budget
+
+
+class PoolMetrics:
+    """Counts connection checkouts and how long callers waited for them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def record_wait(self, wait_ms: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+            }
+
+
+sync_pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+def _pool_options() -> Dict[str, Any]:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+    }
+
+
+def get_engine() -> Optional[Engine]:
+    """Initializes and returns the pooled SQLAlchemy engine for Postgres."""
+    global ENGINE
+    if ENGINE is None:
+        try:
+            # SQLAlchemy connects using the computed URL from config.py
+            ENGINE = create_engine(settings.DATABASE_URL, **_pool_options())
+        except Exception as e:
+            logger.error(f"Failed to create PostgreSQL engine: {e}")
+            return None
+    return ENGINE
+
+
+def get_async_engine():
+    """Initializes and returns the asyncpg-backed engine, or None if disabled/unavailable."""
+    global ASYNC_ENGINE
+    if not settings.DB_ASYNC_ENABLED:
+        return None
+    if ASYNC_ENGINE is None:
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            ASYNC_ENGINE = create_async_engine(settings.ASYNC_DATABASE_URL, **_pool_options())
+        except Exception as e:
+            logger.error(f"Failed to create async PostgreSQL engine: {e}")
+            return None
+    return ASYNC_ENGINE
+
+
+def _reset_after_fork() -> None:
+    """Forked workers must never reuse pooled connections inherited from the parent."""
+    global ASYNC_ENGINE
+    if ENGINE is not None:
+        ENGINE.dispose(close=False)
+    # asyncpg connections belong to the parent's event loop; the child creates its own engine
+    ASYNC_ENGINE = None
+
+
+after_fork(_reset_after_fork)
+
+
+def _readonly_statements(dialect_name: str) -> List[str]:
+    """Session guards applied to every model-generated statement (Postgres only)."""
+    if dialect_name != "postgresql":
+        return []
+    return [
+        "SET TRANSACTION READ ONLY",
+        f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}",
+    ]
+
+
+def _capped(query: str, row_cap: int) -> str:
+    """Wrap the query so the server itself stops after row_cap rows."""
+    return f"SELECT * FROM ({query.strip().rstrip(';')}) AS _capped LIMIT {int(row_cap)}"
+
+
+def _count(query: str) -> str:
+    return f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')}) AS _counted"
+
+
+def _explain(query: str) -> str:
+    return f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}"
+
+
+def _check_cost(plan: Any, budget: float) -> None:
+    """Raises QueryCostExceededError when the top plan node's total cost is over budget."""
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    cost = float(plan[0]["Plan"]["Total Cost"])
+    if cost > budget:
+        raise QueryCostExceededError(cost, budget)
+
+
+@contextmanager
+def readonly_connection(engine: Engine):
+    """Checks out a pooled connection inside a read-only, time-limited transaction."""
+    start = time.perf_counter()
+    try:
+        connection: Connection = engine.connect()
+    except PoolTimeoutError:
+        sync_pool_metrics.record_timeout()
+        raise
+    sync_pool_metrics.record_wait((time.perf_counter() - start) * 1000)
+    try:
+        with connection.begin():
+            for statement in _readonly_statements(connection.dialect.name):
+                connection.execute(text(statement))
+            yield connection
+    finally:
+        connection.close()
+
+
+@asynccontextmanager
+async def readonly_connection_async(engine):
+    """Async counterpart of readonly_connection for the asyncpg engine."""
+    start = time.perf_counter()
+    try:
+        connection = await engine.connect()
+    except PoolTimeoutError:
+        async_pool_metrics.record_timeout()
+        raise
+    async_pool_metrics.record_wait((time.perf_counter() - start) * 1000)
+    try:
+        async with connection.begin():
+            for statement in _readonly_statements(connection.dialect.name):
+                await connection.execute(text(statement))
+            yield connection
+    finally:
+        await connection.close()
+
+
+def run_readonly_query(
+    engine: Engine,
+    query: str,
+    row_limit: int,
+    max_cost: float = 0,
+    count_total: bool = True
+) -> QueryResult:
+    """
+    Runs an untrusted SELECT read-only with a server-side row cap.
+
+    :param max_cost: reject (QueryCostExceededError) when Postgres estimates a higher cost; 0 disables.
+    :param count_total: run a COUNT when rows were cut off; otherwise total is row_limit + 1.
+    :return: (columns, rows[:row_limit], total_row_count, db_time_ms)
+    """
+    start = time.perf_counter()
+    with readonly_connection(engine) as connection:
+        if max_cost and connection.dialect.name == "postgresql":
+            _check_cost(connection.execute(text(_explain(query))).scalar(), max_cost)
+        result = connection.execution_options(
+            stream_results=True,
+            max_row_buffer=row_limit + 1
+        ).execute(text(_capped(query, row_limit + 1)))
+        columns = list(result.keys())
+        rows = result.fetchmany(row_limit + 1)
+        result.close()
+
+        total = len(rows)
+        if total > row_limit:
+            # Only pay for a COUNT when there is more than we are going to return
+            rows = rows[:row_limit]
+            if count_total:
+                total = connection.execute(text(_count(query))).scalar()
+    return columns, rows, total, (time.perf_counter() - start) * 1000
+
+
+async def run_readonly_query_async(
+    engine,
+    query: str,
+    row_limit: int,
+    max_cost: float = 0,
+    count_total: bool = True
+) -> QueryResult:
+    """Async counterpart of run_readonly_query."""
+    start = time.perf_counter()
+    async with readonly_connection_async(engine) as connection:
+        if max_cost and connection.dialect.name == "postgresql":
+            _check_cost((await connection.execute(text(_explain(query)))).scalar(), max_cost)
+        result = await connection.stream(text(_capped(query, row_limit + 1)))
+        columns = list(result.keys())
+        rows = await result.fetchmany(row_limit + 1)
+        await result.close()
+
+        total = len(rows)
+        if total > row_limit:
+            rows = rows[:row_limit]
+            if count_total:
+                total = (await connection.execute(text(_count(query)))).scalar()
+    return columns, rows, total, (time.perf_counter() - start) * 1000
+
+
+def _pool_status(engine, metrics: PoolMetrics) -> Dict[str, Any]:
+    pool = engine.pool
+    status = {"pool": pool.__class__.__name__, **metrics.snapshot()}
+    # QueuePool exposes live counters; other pools (e.g. StaticPool in tests) don't
+    for name in ("size", "checkedout", "checkedin", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            status[name] = method()
+    return status
+
+
+def database_status() -> Dict[str, Any]:
+    """Pool metrics for the health endpoint."""
+    status: Dict[str, Any] = {
+        "sync": _pool_status(ENGINE, sync_pool_metrics) if ENGINE is not None else "not initialized",
+    }
+    if settings.DB_ASYNC_ENABLED:
+        status["async"] = (
+            _pool_status(ASYNC_ENGINE.sync_engine, async_pool_metrics)
+            if ASYNC_ENGINE is not None else "not initialized"
+        )
+    return status
@@ -0,0 +1,82 @@
+"""
+Bulk ingestion CLI for agri_climate_data.
+
+    python -m app.ingestion api <resource_id> [--filter state_name=Bihar] [--map crop_year=Year]
+    python -m app.ingestion csv data/crop_production.csv
+    python -m app.ingestion synthetic /tmp/agri_5m.csv --rows 5000000
+"""
+import argparse
+import asyncio
+import sys
+from typing import Dict, List
+from app.config import settings
+from app.core.logging import logger
+from app.database.engine import get_engine
+from app.ingestion.loader import AgriLoader
+from app.ingestion.pipeline import ingest
+from app.ingestion.sources import ApiSource, CsvSource
+from app.ingestion.synthetic import write_synthetic_csv
+
+
+def _pairs(values: List[str]) -> Dict[str, str]:
+    pairs = {}
+    for value in values or []:
+        key, _, target = value.partition("=")
+        if not target:
+            raise SystemExit(f"Expected key=value, got {value!r}")
+        pairs[key] = target
+    return pairs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ingestion", description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_load_options(sub):
+        sub.add_argument("--map", action="append", help="source_field=Column override (repeatable)")
+        sub.add_argument("--chunk-rows", type=int, default=settings.INGEST_CHUNK_ROWS)
+        sub.add_argument("--full-refresh", action="store_true", help="ignore the stored watermark")
+
+    api = commands.add_parser("api", help="ingest a data.gov.in JSON resource")
+    api.add_argument("resource_id")
+    api.add_argument("--filter", action="append", help="field=value API filter (repeatable)")
+    api.add_argument("--page-size", type=int, default=settings.INGEST_PAGE_SIZE)
+    add_load_options(api)
+
+    csv_cmd = commands.add_parser("csv", help="ingest a local CSV file")
+    csv_cmd.add_argument("path")
+    add_load_options(csv_cmd)
+
+    synthetic = commands.add_parser("synthetic", help="write a synthetic CSV for load testing")
+    synthetic.add_argument("path")
+    synthetic.add_argument("--rows", type=int, default=1_000_000)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "synthetic":
+        write_synthetic_csv(args.path, args.rows)
+        logger.info(f"Wrote {args.rows} synthetic rows to {args.path}")
+        return 0
+
+    engine = get_engine()
+    if engine is None:
+        return 1
+
+    if args.command == "api":
+        source = ApiSource(args.resource_id, args.page_size, _pairs(args.filter))
+    else:
+        source = CsvSource(args.path, args.chunk_rows)
+
+    report = asyncio.run(ingest(
+        source,
+        AgriLoader(engine),
+        column_map=_pairs(args.map),
+        chunk_rows=args.chunk_rows,
+        full_refresh=args.full_refresh,
+    ))
+    logger.info(f"Ingestion finished: {report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import csv
+import io
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import BigInteger, Column, DateTime, MetaData, String, Table, select, text, tuple_, update
+from sqlalchemy.engine import Connection, Engine
+from app.core.logging import logger
+from app.tools.sql_tools import (
+    AGRI_CLIMATE_DATA,
+    AGRI_CLIMATE_TABLE,
+    MOCK_RESOURCE_ID,
+    TABLE_NAME,
+    refresh_aggregate_views,
+)
+
+KEY_COLUMNS = ("State", "Year", "Crop")
+VALUE_COLUMNS = ("Production_MT", "Rainfall_mm", "Is_Drought_Resistant")
+ALL_COLUMNS = KEY_COLUMNS + VALUE_COLUMNS
+
+WATERMARK_TABLE = Table(
+    "ingestion_watermarks",
+    MetaData(),
+    Column("resource_id", String, primary_key=True),
+    Column("source_version", String, nullable=False),
+    Column("records_done", BigInteger, nullable=False),
+    Column("rows_loaded", BigInteger, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+# Watermark row whose records_done counts loads into agri_climate_data. It lives in the
+# database, so API workers (which poll it) see loads made by any process, across restarts.
+DATA_VERSION_ID = "samarth-data-version"
+
+
+def advance_data_version(connection: Connection) -> None:
+    """Advances the persistent data version inside the caller's load transaction."""
+    advanced = connection.execute(
+        update(WATERMARK_TABLE)
+        .where(WATERMARK_TABLE.c.resource_id == DATA_VERSION_ID)
+        .values(records_done=WATERMARK_TABLE.c.records_done + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    if not advanced:
+        _upsert(
+            connection,
+            WATERMARK_TABLE,
+            [{"resource_id": DATA_VERSION_ID, "source_version": "", "records_done": 1, "rows_loaded": 0, "updated_at": datetime.utcnow()}],
+            ("resource_id",),
+        )
+
+
+def read_data_version(connection: Connection) -> int:
+    """The persistent data version; 0 before anything was loaded."""
+    version = connection.execute(
+        select(WATERMARK_TABLE.c.records_done).where(WATERMARK_TABLE.c.resource_id == DATA_VERSION_ID)
+    ).scalar()
+    return int(version or 0)
+
+
+def remove_mock_seed(connection: Connection) -> int:
+    """
+    Deletes the built-in mock rows and their seed marker if they are still
+    loaded, so real data is never mixed with them; returns the rows deleted.
+    """
+    marker = connection.execute(
+        select(WATERMARK_TABLE.c.resource_id).where(WATERMARK_TABLE.c.resource_id == MOCK_RESOURCE_ID)
+    ).first()
+    if marker is None:
+        return 0
+    keys = [tuple(row[name] for name in KEY_COLUMNS) for row in AGRI_CLIMATE_DATA]
+    deleted = connection.execute(
+        AGRI_CLIMATE_TABLE.delete().where(tuple_(*(AGRI_CLIMATE_TABLE.c[name] for name in KEY_COLUMNS)).in_(keys))
+    ).rowcount
+    connection.execute(WATERMARK_TABLE.delete().where(WATERMARK_TABLE.c.resource_id == MOCK_RESOURCE_ID))
+    logger.info(f"Removed {deleted} mock seed rows before loading real data")
+    return deleted
+
+
+def _quote(name: str) -> str:
+    return f'"{name}"'
+
+
+def _upsert(connection: Connection, table: Table, rows: List[Dict], key_columns: Tuple[str, ...]) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE for Postgres and SQLite."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={name: statement.excluded[name] for name in rows[0] if name not in key_columns},
+    )
+    connection.execute(statement, rows)
+
+
+class AgriLoader:
+    """Loads normalized rows into agri_climate_data and tracks a watermark per resource."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def ensure_schema(self) -> None:
+        """Creates the data table (with its unique key) and the watermark table if missing."""
+        with self.engine.begin() as connection:
+            AGRI_CLIMATE_TABLE.create(connection, checkfirst=True)
+            WATERMARK_TABLE.create(connection, checkfirst=True)
+
+    def refresh_aggregates(self) -> None:
+        """Refreshes the materialized aggregate views after a load."""
+        with self.engine.begin() as connection:
+            refresh_aggregate_views(connection)
+            # Aggregate views changed too, so caches built on them are invalidated again
+            advance_data_version(connection)
+
+    def get_watermark(self, resource_id: str) -> Optional[Tuple[str, int]]:
+        """Returns (source_version, records_done) for a resource, or None if never loaded."""
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(WATERMARK_TABLE.c.source_version, WATERMARK_TABLE.c.records_done)
+                .where(WATERMARK_TABLE.c.resource_id == resource_id)
+            ).first()
+        return (row[0], row[1]) if row else None
+
+    def load_chunk(self, resource_id: str, source_version: str, records_done: int, rows: List[Dict]) -> int:
+        """Upserts one chunk and advances the watermark in the same transaction."""
+        # Last write wins for duplicate keys inside a chunk (ON CONFLICT can't touch a row twice)
+        unique = {tuple(row[name] for name in KEY_COLUMNS): row for row in rows}
+        rows = list(unique.values())
+
+        with self.engine.begin() as connection:
+            if rows:
+                # The first real rows replace the mock seed in the same transaction, so
+                # readers never see the two mixed (or an empty table in between)
+                remove_mock_seed(connection)
+                if connection.dialect.name == "postgresql":
+                    self._copy_upsert(connection, rows)
+                else:
+                    _upsert(connection, AGRI_CLIMATE_TABLE, rows, KEY_COLUMNS)
+                advance_data_version(connection)
+
+            previous = connection.execute(
+                select(WATERMARK_TABLE.c.rows_loaded, WATERMARK_TABLE.c.source_version)
+                .where(WATERMARK_TABLE.c.resource_id == resource_id)
+            ).first()
+            rows_loaded = len(rows)
+            if previous is not None and previous[1] == source_version:
+                rows_loaded += previous[0]
+            _upsert(
+                connection,
+                WATERMARK_TABLE,
+                [{
+                    "resource_id": resource_id,
+                    "source_version": source_version,
+                    "records_done": records_done,
+                    "rows_loaded": rows_loaded,
+                    "updated_at": datetime.utcnow(),
+                }],
+                ("resource_id",),
+            )
+        return len(rows)
+
+    def _copy_upsert(self, connection: Connection, rows: List[Dict]) -> None:
+        """COPY the chunk into a session temp table, then merge it with one INSERT ... ON CONFLICT."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if row[name] is None else row[name] for name in ALL_COLUMNS])
+        buffer.seek(0)
+
+        columns = ", ".join(_quote(name) for name in ALL_COLUMNS)
+        updates = ", ".join(f"{_quote(name)} = EXCLUDED.{_quote(name)}" for name in VALUE_COLUMNS)
+        keys = ", ".join(_quote(name) for name in KEY_COLUMNS)
+
+        connection.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS _agri_stage (LIKE {TABLE_NAME} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        ))
+        cursor = connection.connection.cursor()
+        try:
+            # Unquoted empty fields are NULL in CSV mode
+            cursor.copy_expert(f"COPY _agri_stage ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+        connection.execute(text(
+            f"INSERT INTO {TABLE_NAME} ({columns}) SELECT {columns} FROM _agri_stage "
+            f"ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+        ))
+        logger.debug(f"COPY-merged {len(rows)} rows into {TABLE_NAME}")
@@ -0,0 +1,121 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from app.config import settings
+from app.core.concurrency import run_blocking
+from app.core.logging import logger
+from app.ingestion.loader import ALL_COLUMNS, AgriLoader
+from app.ingestion.sources import DEFAULT_COLUMN_MAP
+from app.tools.sql_tools import sync_data_generation
+
+NUMERIC_COLUMNS = {"Production_MT": float, "Rainfall_mm": float, "Is_Drought_Resistant": int}
+
+
+@dataclass
+class IngestionReport:
+    resource_id: str
+    source_version: str
+    skipped: bool = False
+    records_read: int = 0
+    rows_loaded: int = 0
+    rows_rejected: int = 0
+    seconds: float = 0.0
+
+
+def _to_number(value, cast):
+    if value is None:
+        return None
+    text = str(value).strip().replace(",", "")
+    if not text or text.upper() in ("NA", "N/A", "-", "NULL"):
+        return None
+    try:
+        return cast(float(text))
+    except ValueError:
+        return None
+
+
+def normalize_record(record: Dict, column_map: Dict[str, str]) -> Optional[Dict]:
+    """Maps a source record onto agri_climate_data columns; None if a key column is missing."""
+    row = dict.fromkeys(ALL_COLUMNS)
+    for field, value in record.items():
+        target = column_map.get(field.strip().lower())
+        if target:
+            row[target] = value
+
+    state = str(row["State"] or "").strip()
+    crop = str(row["Crop"] or "").strip()
+    # Years like "2019-20" or "2019.0" keep their first four digits
+    year = str(row["Year"] or "").strip()[:4]
+    if not state or not crop or not year.isdigit():
+        return None
+
+    row["State"], row["Crop"], row["Year"] = state, crop, int(year)
+    for name, cast in NUMERIC_COLUMNS.items():
+        row[name] = _to_number(row[name], cast)
+    return row
+
+
+async def ingest(
+    source,
+    loader: AgriLoader,
+    column_map: Optional[Dict[str, str]] = None,
+    chunk_rows: Optional[int] = None,
+    full_refresh: bool = False
+) -> IngestionReport:
+    """
+    Streams a source into agri_climate_data in COPY/upsert batches.
+
+    Resumes from the stored watermark when the source version is unchanged and
+    restarts from the beginning when the source has been republished.
+    """
+    start = time.perf_counter()
+    column_map = {**DEFAULT_COLUMN_MAP, **{k.lower(): v for k, v in (column_map or {}).items()}}
+    chunk_rows = chunk_rows or settings.INGEST_CHUNK_ROWS
+
+    await run_blocking(loader.ensure_schema)
+    version, total = await source.version()
+    report = IngestionReport(resource_id=source.resource_id, source_version=version)
+
+    watermark = None if full_refresh else await run_blocking(loader.get_watermark, source.resource_id)
+    offset = 0
+    if watermark is not None and watermark[0] == version:
+        offset = watermark[1]
+        if total is not None and offset >= total:
+            logger.info(f"Resource {source.resource_id} unchanged at version {version}; nothing to ingest")
+            report.skipped = True
+            return report
+    logger.info(f"Ingesting {source.resource_id} (version {version!r}) from record {offset}")
+
+    buffer: List[Dict] = []
+    position = flushed = offset
+
+    async def flush():
+        nonlocal flushed
+        loaded = await run_blocking(loader.load_chunk, source.resource_id, version, position, buffer)
+        flushed = position
+        report.rows_loaded += loaded
+        logger.info(f"{source.resource_id}: {position} records processed, {report.rows_loaded} rows upserted")
+
+    async for position, records in source.chunks(offset):
+        report.records_read += len(records)
+        for record in records:
+            row = normalize_record(record, column_map)
+            if row is None:
+                report.rows_rejected += 1
+            else:
+                buffer.append(row)
+        if len(buffer) >= chunk_rows:
+            await flush()
+            buffer = []
+
+    # Final partial chunk; also advances the watermark past trailing rejected records
+    if buffer or position != flushed:
+        await flush()
+
+    if report.rows_loaded:
+        await run_blocking(loader.refresh_aggregates)
+        # Every chunk advanced the data version in the database; API workers poll it
+        sync_data_generation()
+
+    report.seconds = round(time.perf_counter() - start, 3)
+    return report
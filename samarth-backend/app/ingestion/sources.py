@@ -0,0 +1,80 @@
+import csv
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.services.data_service import DataService, data_service
+
+# Source field names (lowercased) commonly used by data.gov.in crop/rainfall resources
+DEFAULT_COLUMN_MAP = {
+    "state": "State",
+    "state_name": "State",
+    "year": "Year",
+    "crop_year": "Year",
+    "crop": "Crop",
+    "production": "Production_MT",
+    "production_": "Production_MT",
+    "production_mt": "Production_MT",
+    "rainfall": "Rainfall_mm",
+    "rainfall_mm": "Rainfall_mm",
+    "annual": "Rainfall_mm",
+    "is_drought_resistant": "Is_Drought_Resistant",
+}
+
+
+class ApiSource:
+    """Pages through a data.gov.in JSON resource."""
+
+    def __init__(
+        self,
+        resource_id: str,
+        page_size: int,
+        filters: Optional[Dict] = None,
+        service: Optional[DataService] = None
+    ):
+        self.resource_id = resource_id
+        self.page_size = page_size
+        self.filters = filters
+        self.service = service or data_service
+
+    async def version(self) -> Tuple[str, Optional[int]]:
+        """Returns (source_version, total_records) from the resource metadata."""
+        page = await self.service.fetch_agricultural_data(self.resource_id, self.filters, limit=1)
+        if page is None:
+            raise RuntimeError(f"Could not read metadata for resource {self.resource_id}")
+        version = str(page.get("updated") or page.get("updated_date") or "")
+        total = page.get("total")
+        return version, int(total) if total is not None else None
+
+    async def chunks(self, start: int) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        async for next_offset, records, _ in self.service.iter_record_pages(
+            self.resource_id, self.page_size, start, self.filters
+        ):
+            yield next_offset, records
+
+
+class CsvSource:
+    """Streams a (possibly multi-GB) CSV file in fixed-size row chunks."""
+
+    def __init__(self, path: str, chunk_rows: int):
+        self.path = path
+        self.resource_id = f"file:{os.path.abspath(path)}"
+        self.chunk_rows = chunk_rows
+
+    async def version(self) -> Tuple[str, Optional[int]]:
+        # Size + mtime identifies the file revision without reading it
+        stat = os.stat(self.path)
+        return f"{stat.st_size}:{int(stat.st_mtime)}", None
+
+    async def chunks(self, start: int) -> AsyncIterator[Tuple[int, List[Dict]]]:
+        position = 0
+        batch: List[Dict] = []
+        with open(self.path, newline="", encoding="utf-8") as handle:
+            for record in csv.DictReader(handle):
+                position += 1
+                if position <= start:
+                    continue
+                batch.append(record)
+                if len(batch) >= self.chunk_rows:
+                    yield position, batch
+                    batch = []
+        if batch:
+            yield position, batch
@@ -0,0 +1,28 @@
+import csv
+import random
+
+SYNTHETIC_STATES = [
+    "Andhra Pradesh", "Assam", "Bihar", "Gujarat", "Haryana", "Karnataka", "Kerala", "Madhya Pradesh",
+    "Maharashtra", "Odisha", "Punjab", "Rajasthan", "Tamil Nadu", "Telangana", "Uttar Pradesh", "West Bengal",
+]
+SYNTHETIC_CROPS = ["Wheat", "Rice", "Millet", "Maize", "Jowar", "Bajra", "Cotton", "Sugarcane", "Pulses", "Groundnut"]
+DROUGHT_RESISTANT = {"Millet", "Jowar", "Bajra"}
+
+
+def write_synthetic_csv(path: str, rows: int, seed: int = 7) -> None:
+    """
+    Writes `rows` unique State/Year/Crop records in data.gov.in field naming.
+    Extra crops ("Crop 17", ...) are generated once the natural combinations run out.
+    """
+    rng = random.Random(seed)
+    combos_per_crop = len(SYNTHETIC_STATES) * 100  # years 1950-2049
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(["state_name", "crop_year", "crop", "production_", "rainfall"])
+        for i in range(rows):
+            crop_index, rest = divmod(i, combos_per_crop)
+            year_index, state_index = divmod(rest, len(SYNTHETIC_STATES))
+            crop = SYNTHETIC_CROPS[crop_index] if crop_index < len(SYNTHETIC_CROPS) else f"Crop {crop_index}"
+            rainfall = round(rng.uniform(250, 1400), 1)
+            production = round(rng.uniform(100, 5000) * (0.6 if crop in DROUGHT_RESISTANT else 1.0), 1)
+            writer.writerow([SYNTHETIC_STATES[state_index], 1950 + year_index, crop, production, rainfall])
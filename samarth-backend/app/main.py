@@ -1,50 +1,111 @@
+import asyncio
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.config import settings
-from app.core.logging import logger, setup_logging
-from app.api.routes import health, analytics
-from app.tools.sql_tools import setup_mock_database # NEW: Imports the Postgres setup function
+from app.core.logging import logger
+from app.api.routes import health, analytics, metrics
+from app.core.admission import AdmissionMiddleware
+from app.core.concurrency import agent_limiter, run_blocking
+from app.core.telemetry import TimedJSONResponse, TimingMiddleware, span
+from app.tools.sql_tools import poll_data_generation, setup_mock_database, sync_data_generation # NEW: Imports the Postgres setup function
+from app.services.ai_service import ai_service
+from app.services.rollup_engine import rollup_engine
+from app.services.history_store import history_store
+from app.services.insight_store import insight_store
+from app.tools.sql_guard import load_parser
 
-setup_logging()
-
-try:
-    from app.config import settings
-except ImportError:
-    settings = None
+async def warm_up():
+    """
+    Loads what the first queries would otherwise pay for: the Gemini client
+    (with the live schema), the SQL parser and the rollups the intent router needs.
+    """
+    try:
+        with span("startup.warmup.ai_service"):
+            await ai_service.get_model()
+        with span("startup.warmup.sql_guard"):
+            await asyncio.to_thread(load_parser)
+        if rollup_engine is not None:
+            with span("startup.warmup.rollups"):
+                await run_blocking(rollup_engine.ensure_fresh)
+        logger.info("Warm-up finished")
+    except Exception as e:
+        logger.warning(f"Warm-up failed; services will initialize on first use: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events: Initialize database and log startup/shutdown."""
     logger.info("Starting Project Samarth API...")
+    started = time.perf_counter()
     
     # Initialize the mock database table (Phase 1: Data Store)
-    # This connects to PostgreSQL and loads mock data
-    if setup_mock_database():
-         logger.info("PostgreSQL Mock Database loaded successfully.")
-    else:
-         logger.error("Failed to load PostgreSQL mock database. Check connection settings.")
+    # Seeds only when the table is empty or the mock rows changed. Real datasets
+    # are loaded out-of-band with `python -m app.ingestion`; disable SEED_MOCK_DATA then.
+    with span("startup.seed"):
+        if not settings.SEED_MOCK_DATA:
+             logger.info("Skipping mock data seed (SEED_MOCK_DATA is disabled).")
+        elif setup_mock_database():
+             logger.info("PostgreSQL Mock Database is ready.")
+        else:
+             logger.error("Failed to load PostgreSQL mock database. Check connection settings.")
+    # Adopts the data version in the database, then follows loads made by other processes
+    with span("startup.data_version"):
+        sync_data_generation()
+    version_poller = asyncio.create_task(poll_data_generation())
+
+    with span("startup.history"):
+        history_store.start()
+    if insight_store is not None:
+        insight_store.start()
+
+    # Heavy clients load in the background; requests arriving first initialize them on demand
+    warmup = asyncio.create_task(warm_up()) if settings.STARTUP_WARMUP else None
+    logger.info(f"Startup finished in {(time.perf_counter() - started) * 1000:.1f}ms")
     
     yield
     logger.info("Shutting down Project Samarth API...")
+    version_poller.cancel()
+    if warmup is not None:
+        warmup.cancel()
+    if insight_store is not None:
+        await insight_store.stop()
+    # Let running agent loops finish (new ones get 503) before history is flushed
+    stats = agent_limiter.stats()
+    if not await agent_limiter.drain(settings.SHUTDOWN_DRAIN_SECONDS):
+        logger.warning(f"Shutdown drain timed out with {agent_limiter.stats()['active']} agent loops still running")
+    elif stats["active"] or stats["waiting"]:
+        logger.info(f"Drained {stats['active'] + stats['waiting']} in-flight agent loops")
+    await history_store.stop()
 
 app = FastAPI(
     title="Project Samarth API",
     description="AI-Powered Agricultural Data Analytics Core Functionality",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse
 )
 
+# Per-client cost budgets; inside CORS so rejections carry CORS headers, and inside the
+# timing middleware, whose trace measures each request's cost
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], 
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read the backoff hint on 429/503 responses
+    expose_headers=["Retry-After"],
 )
 
 app.include_router(health.router) # Make sure health is included
 app.include_router(analytics.router)
+app.include_router(metrics.router)
+
+# Outermost, so request timing covers CORS handling and every route
+app.add_middleware(TimingMiddleware)
 
 @app.get("/")
 async def root():
@@ -1,12 +1,48 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
 class AnalyticsQuery(BaseModel):
     query: str = Field(..., min_length=10, max_length=1000)
     context: Optional[dict] = None
     filters: Optional[dict] = None
 
+class BatchQuery(BaseModel):
+    queries: List[AnalyticsQuery] = Field(..., min_length=1)
+    # Distinct questions processed at once; capped by BATCH_MAX_PARALLEL
+    max_parallel: Optional[int] = Field(None, ge=1)
+
 class QueryFeedback(BaseModel):
     query_id: str
     rating: int = Field(..., ge=1, le=5)
-    feedback: Optional[str] = None
\ No newline at end of file
+    feedback: Optional[str] = None
+
+class RollupQuery(BaseModel):
+    group_by: List[str] = Field(default_factory=list, description="Any of State, Year, Crop")
+    measures: List[str] = Field(default_factory=lambda: ["count"])
+    filters: Optional[Dict[str, Any]] = None
+    order_by: Optional[str] = None
+    descending: bool = True
+    limit: Optional[int] = Field(None, ge=1, le=10000)
+
+Dimension = Literal["State", "Year", "Crop"]
+Measure = Literal[
+    "count",
+    "sum_production",
+    "avg_production",
+    "sum_rainfall",
+    "avg_rainfall",
+    "corr_production_rainfall",
+]
+
+class RangeFilter(BaseModel):
+    gte: Optional[int] = None
+    lte: Optional[int] = None
+
+class StructuredQuery(BaseModel):
+    dimensions: List[Dimension] = Field(default_factory=list)
+    measures: List[Measure] = Field(..., min_length=1)
+    # {"State": "Bihar"}, {"Crop": ["Rice", "Wheat"]}, {"Year": {"gte": 2015, "lte": 2019}}
+    filters: Dict[Literal["State", "Year", "Crop", "Is_Drought_Resistant"], Union[RangeFilter, List[Union[str, int]], str, int]] = Field(default_factory=dict)
+    order_by: Optional[str] = None
+    descending: bool = True
+    limit: int = Field(100, ge=1, le=10000)
@@ -1,23 +1,48 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Optional, List, Any
 from datetime import datetime
+from app.utils.serialization import dumps_bytes, dumps_compact
 
-class APIResponse(BaseModel):
+class EncodedModel(BaseModel):
+    """Response model that encodes itself to a JSON body directly (no re-validation or jsonable_encoder pass)."""
+
+    def to_json(self, **extra: Any) -> bytes:
+        return dumps_bytes({**dict(self), **extra})
+
+class APIResponse(EncodedModel):
     success: bool
     message: str
     data: Optional[Any] = None
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
 
-class AnalyticsResponse(BaseModel):
+class AnalyticsResponse(EncodedModel):
     query_id: str
     query: str
     insights: str
     data_points: Optional[List[dict]] = None
     execution_time: float
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # Encoded once, then shared by the response body, SSE frames and history rows
+    _data_points_json: Optional[str] = PrivateAttr(None)
+
+    def data_points_json(self) -> Optional[str]:
+        """data_points as compact JSON, encoded on first use."""
+        if self.data_points is None:
+            return None
+        if self._data_points_json is None:
+            self._data_points_json = dumps_compact(self.data_points)
+        return self._data_points_json
+
+    def to_json(self, **extra: Any) -> bytes:
+        fields = {**dict(self), **extra}
+        if self.data_points is None:
+            return dumps_bytes(fields)
+        del fields["data_points"]
+        head = dumps_bytes(fields)
+        return head[:-1] + b',"data_points":' + self.data_points_json().encode("utf-8") + b"}"
 
 class HealthResponse(BaseModel):
     status: str
     version: str
     services: dict
-    timestamp: datetime = datetime.utcnow()
\ No newline at end of file
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
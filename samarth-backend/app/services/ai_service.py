@@ -1,118 +1,375 @@
-import google.generativeai as genai
+import asyncio
+import json
+import re
+import threading
+import time
 from app.config import settings
 from app.core.logging import logger
-from app.tools.sql_tools import SQL_TOOL, get_db_schema
-from typing import Optional
+from app.core.admission import admission
+from app.core.concurrency import after_fork, agent_limiter
+from app.core.telemetry import record_span, record_tokens, span
+from app.tools.sql_tools import SQL_TOOL, execute_mock_sql_async, get_db_schema
+from app.tools.result_encoding import parse_row_count
+from app.tools.rollup_tools import ROLLUP_TOOL, query_agri_rollup_async
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+ROLLUP_TOOL_ARGS = ("group_by", "measures", "state", "year", "crop")
+
+# Prefixes of the fallback strings generate_insights returns instead of raising
+ERROR_PREFIXES = ("Error:", "AI service is currently unavailable")
+
+def _genai():
+    """google.generativeai dominates cold-start import time, so it is imported on first use."""
+    import google.generativeai as genai
+    return genai
 
 class AIService:
     def __init__(self):
-        """Initialize AI service with Gemini configuration"""
-        try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model_name = settings.AI_MODEL
-            self.system_instruction = self._get_system_instruction()
-
-            # ✅ Attach system instruction when creating the model
-            self.model = genai.GenerativeModel(
-                model_name=self.model_name,
-                system_instruction=self.system_instruction,
-                tools=[SQL_TOOL],  # Attach tools once at model level
-            )
+        """Cheap to construct; the Gemini client is built on first use or by the startup warm-up."""
+        self.model_name = settings.AI_MODEL
+        self.model = None
+        self.system_instruction = ""
+        self._failed = False
+        self._lock = threading.Lock()
 
-            logger.info(f"AI Service initialized successfully with model: {self.model_name}")
-        except Exception as e:
-            logger.error(f"Failed to initialize AI service: {e}")
-            self.model = None
+    def _initialize(self) -> None:
+        with self._lock:
+            if self.model is not None or self._failed:
+                return
+            try:
+                genai = _genai()
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                # Live catalog when the database is up, static schema otherwise
+                self.model = self._build_model(get_db_schema())
+                logger.info(f"AI Service initialized successfully with model: {self.model_name}")
+            except Exception as e:
+                logger.error(f"Failed to initialize AI service: {e}")
+                self._failed = True
+
+    async def get_model(self):
+        """Returns the model, initializing it off the event loop the first time."""
+        if self.model is None and not self._failed:
+            await asyncio.to_thread(self._initialize)
+        return self.model
+
+    def _reset_after_fork(self) -> None:
+        # gRPC channels are not fork-safe; a forked worker builds its own client on first use
+        self.model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def status(self) -> str:
+        if self.model is not None:
+            return "operational"
+        return "unavailable (Check GEMINI_API_KEY)" if self._failed else "not initialized"
+
+    def _build_model(self, schema: str):
+        self.system_instruction = self._get_system_instruction(schema)
 
-    def _get_system_instruction(self) -> str:
-        schema = get_db_schema()
+        # ✅ Attach system instruction when creating the model
+        return _genai().GenerativeModel(
+            model_name=self.model_name,
+            system_instruction=self.system_instruction,
+            tools=[SQL_TOOL, ROLLUP_TOOL],  # Attach tools once at model level
+        )
+
+    def _get_system_instruction(self, schema: str) -> str:
         return f"""
 You are the Project Samarth Cross-Domain Data Analyst.
 Your job is to analyze data using SQL and summarize relationships clearly.
+For totals, averages or production/rainfall correlations grouped by State, Year and/or Crop,
+call query_agri_rollup first; it answers instantly. Use execute_mock_sql for anything else.
 Database schema:
 {schema}
 """
 
+    async def embed_text(self, text: str) -> Optional[List[float]]:
+        """Embeds text for semantic cache lookups; returns None if embedding fails."""
+        if not await self.get_model():
+            return None
+        try:
+            result = await asyncio.to_thread(
+                _genai().embed_content,
+                model=settings.EMBEDDING_MODEL,
+                content=text,
+                task_type="retrieval_query",
+            )
+            return result["embedding"]
+        except Exception as e:
+            logger.warning(f"Embedding failed, skipping semantic cache: {e}")
+            return None
+
     async def generate_insights(self, query: str, context: Optional[dict] = None) -> str:
         """Runs full Text-to-SQL → Execution → Synthesis pipeline."""
-        if not self.model:
-            return "AI service is currently unavailable. Please check the GEMINI_API_KEY."
+        answer = ""
+        async for event in self.stream_insights(query, context):
+            if event["event"] == "answer":
+                answer = event["text"]
+        return answer
 
+    async def stream_insights(self, query: str, context: Optional[dict] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same pipeline as generate_insights, as a stream of progress events:
+        route, tool_call, tool_result and token events, then a final answer event.
+        A reset event retracts the tokens streamed since the last one: that text
+        came from a turn that went on to call tools, so it isn't part of the answer.
+        """
+        if not await self.get_model():
+            yield {"event": "answer", "text": "AI service is currently unavailable. Please check the GEMINI_API_KEY."}
+            return
+
+        # Clients must afford a typical run before queueing for the agent lane
+        admission.check_agent_budget()
+        # Bound the number of concurrent agent loops; raises ServiceSaturatedError when full
+        async with agent_limiter.slot():
+            # Sent before the first model call so clients get a byte immediately
+            yield {"event": "route", "route": "agent"}
+            async for event in self._run_agent(query, context):
+                yield event
+
+    @staticmethod
+    def _tool_args(call) -> Optional[Dict[str, str]]:
+        if call.name == SQL_TOOL.__name__:
+            return {"query": call.args.get("query", "")}
+        if call.name == ROLLUP_TOOL.__name__:
+            return {k: str(call.args.get(k, "")) for k in ROLLUP_TOOL_ARGS}
+        return None
+
+    @staticmethod
+    async def _execute_tool(name: str, args: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with span(f"tool.{name}") as attributes:
+            if name == SQL_TOOL.__name__:
+                logger.info(f"[AGENT ACTION] Executing PostgreSQL SQL: {args['query']}")
+                result = await execute_mock_sql_async(args["query"])
+            elif name == ROLLUP_TOOL.__name__:
+                logger.info(f"[AGENT ACTION] Querying rollup engine: {args}")
+                result = await query_agri_rollup_async(**args)
+            else:
+                result = json.dumps({"error": f"Unknown tool {name!r}"})
+            rows, error = _result_rows(result)
+            attributes.update(rows=rows if rows is not None else -1, error=bool(error))
+        return {
+            "event": "tool_result",
+            "tool": name,
+            "rows": rows,
+            "error": error,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+            "result": result,
+        }
+
+    async def _run_tools(self, calls: list, deadline: float) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Runs one turn's tool calls concurrently (SQL on the bounded executor pool)
+        and yields each result as it completes, tagged with its call index.
+        """
+        tasks = []
+        for index, call in enumerate(calls):
+            args = self._tool_args(call)
+            yield {"event": "tool_call", "tool": call.name, "args": args}
+            tasks.append(asyncio.ensure_future(self._indexed(index, self._execute_tool(call.name, args))))
         try:
-            # 1️⃣ Generate initial content
-            response = self.model.generate_content(
-                query,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.4,   # optional fine-tuning params
-                    top_p=0.9,
-                    max_output_tokens=1024,
+            for next_done in asyncio.as_completed(tasks, timeout=max(deadline - time.perf_counter(), 0)):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def _indexed(index: int, coro) -> Dict[str, Any]:
+        return {**await coro, "index": index}
+
+    async def _run_agent(self, query: str, context: Optional[dict] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Agent loop over one accumulated conversation: every model turn and tool
+        response is kept, so follow-up calls see what the model already tried.
+        """
+        started = time.perf_counter()
+        deadline = started + settings.AGENT_TIME_BUDGET_SECONDS
+        turns: List[Dict[str, Any]] = []
+        generation_config = _genai().types.GenerationConfig(
+            temperature=0.4,   # optional fine-tuning params
+            top_p=0.9,
+            max_output_tokens=1024,
+        )
+        history: List[Dict[str, Any]] = [{"role": "user", "parts": [query]}]
+
+        try:
+            for turn in range(1, settings.AGENT_MAX_TURNS + 1):
+                # The last turn, or one started past two thirds of the budget, must answer from what it has
+                wrap_up = (
+                    turn == settings.AGENT_MAX_TURNS
+                    or time.perf_counter() - started > settings.AGENT_TIME_BUDGET_SECONDS * 2 / 3
+                )
+                model_start = time.perf_counter()
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(
+                        history,
+                        generation_config=generation_config,
+                        tool_config={"function_calling_config": {"mode": "NONE" if wrap_up else "AUTO"}},
+                        stream=True,
+                    ),
+                    deadline - time.perf_counter(),
                 )
-            )
 
-            # 2️⃣ Handle Tool Calls
-            while hasattr(response, "function_calls") and response.function_calls:
-                tool_outputs = []
-                for call in response.function_calls:
-                    if call.name == SQL_TOOL.__name__:
-                        sql_query = call.args.get("query", "")
-                        logger.info(f"[AGENT ACTION] Executing PostgreSQL SQL: {sql_query}")
-                        result = SQL_TOOL(sql_query)
-                        tool_outputs.append({
-                            "role": "function",
-                            "name": call.name,
-                            "content": {"result": result},
-                        })
-
-                # Feed tool results back to the model
-                response = self.model.generate_content(
-                    [
-                        {"role": "user", "parts": [query]},
-                        *tool_outputs
-                    ]
+                # Text parts are forwarded as they arrive (the answer turn isn't known until the
+                # turn ends); function calls are collected
+                calls, texts, parts, last_chunk, first_token_ms = [], [], [], None, None
+                async for chunk in _chunks(response, deadline):
+                    last_chunk = chunk
+                    for part in _parts(chunk):
+                        parts.append(part)
+                        function_call = getattr(part, "function_call", None)
+                        if function_call and function_call.name:
+                            calls.append(function_call)
+                        elif getattr(part, "text", ""):
+                            if first_token_ms is None:
+                                first_token_ms = round((time.perf_counter() - model_start) * 1000, 2)
+                            texts.append(part.text)
+                            yield {"event": "token", "text": part.text}
+
+                model_seconds = time.perf_counter() - model_start
+                usage = getattr(last_chunk, "usage_metadata", None)
+                prompt_tokens = getattr(usage, "prompt_token_count", None)
+                output_tokens = getattr(usage, "candidates_token_count", None)
+                record_tokens(prompt_tokens, output_tokens)
+                record_span(
+                    "gemini.generate",
+                    model_seconds,
+                    turn=turn,
+                    prompt_tokens=prompt_tokens or 0,
+                    output_tokens=output_tokens or 0,
+                    tool_calls=len(calls),
                 )
+                timing = {
+                    "turn": turn,
+                    "model_ms": round(model_seconds * 1000, 2),
+                    "first_token_ms": first_token_ms,
+                    "prompt_tokens": prompt_tokens,
+                    "output_tokens": output_tokens,
+                    "tool_calls": len(calls),
+                    "tool_ms": 0.0,
+                }
+                turns.append(timing)
+                if not calls or wrap_up:
+                    if calls:
+                        logger.warning(f"Agent ignored {len(calls)} tool calls on its final turn")
+                    yield {"event": "turn", **timing}
+                    break
+
+                if texts:
+                    # Narration before tool calls, not the answer: clients drop what they rendered
+                    yield {"event": "reset"}
+
+                # 2️⃣ Handle Tool Calls, all of this turn's calls at once
+                history.append({"role": "model", "parts": parts})
+                tool_start = time.perf_counter()
+                results = [None] * len(calls)
+                async for event in self._run_tools(calls, deadline):
+                    if event["event"] == "tool_result":
+                        results[event.pop("index")] = event.pop("result")
+                    yield event
+                timing["tool_ms"] = round((time.perf_counter() - tool_start) * 1000, 2)
+                yield {"event": "turn", **timing}
 
-            logger.info(f"Generated insights for query: {query[:60]}...")
-
-            # Safely extract textual content from the response. The library's
-            # `response.text` property will raise when any non-text parts
-            # (e.g. function_call) are present. Build the text from text parts
-            # as a robust fallback.
-            def _extract_text_from_response(resp) -> str:
-                try:
-                    # preferred path when response is all-text
-                    return resp.text
-                except Exception:
-                    texts = []
-                    # the response may expose `parts` which contain typed parts
-                    parts = getattr(resp, "parts", None)
-                    if parts:
-                        for p in parts:
-                            # parts can be objects or dict-like
-                            t = None
-                            if hasattr(p, "text"):
-                                t = p.text
-                            elif isinstance(p, dict) and "text" in p:
-                                t = p.get("text")
-                            # Some parts represent assistant messages with nested
-                            # 'content' or 'message' shapes — try common keys
-                            if not t and isinstance(p, dict):
-                                for key in ("content", "message", "body"):
-                                    if key in p and isinstance(p[key], str):
-                                        t = p[key]
-                                        break
-                            if t:
-                                texts.append(t)
-                    # final fallback to string representation
-                    joined = "\n".join(texts).strip()
-                    return joined or str(resp)
-
-            return _extract_text_from_response(response)
+                # Feed tool results back to the model as the next user turn
+                history.append({
+                    "role": "user",
+                    "parts": [
+                        {"function_response": {"name": call.name, "response": {"result": result}}}
+                        for call, result in zip(calls, results)
+                    ],
+                })
+
+            total_ms = (time.perf_counter() - started) * 1000
+            model_ms = sum(t["model_ms"] for t in turns)
+            tool_ms = sum(t["tool_ms"] for t in turns)
+            logger.info(
+                f"Generated insights for query: {query[:60]}... "
+                f"({len(turns)} turns, {total_ms:.0f}ms: model {model_ms:.0f}ms, tools {tool_ms:.0f}ms)"
+            )
+            text = "".join(texts).strip()
+            if not text and not calls and last_chunk is not None:
+                text = _extract_text_from_response(last_chunk)
+            yield {"event": "answer", "text": text or "Error: Unable to generate insights. The model returned no answer.", "turns": turns}
 
+        except TimeoutError:
+            logger.error(f"Agent loop exceeded its {settings.AGENT_TIME_BUDGET_SECONDS}s budget after {len(turns)} turns")
+            yield {"event": "answer", "text": "Error: Unable to generate insights within the time budget.", "turns": turns}
         except Exception as e:
             logger.error(f"Error during agent execution: {e}", exc_info=True)
             if "API_KEY" in str(e):
-                return "Error: Gemini API Key is missing or invalid."
-            return f"Error: Unable to generate insights. {str(e)}"
+                yield {"event": "answer", "text": "Error: Gemini API Key is missing or invalid.", "turns": turns}
+            else:
+                yield {"event": "answer", "text": f"Error: Unable to generate insights. {str(e)}", "turns": turns}
+
+
+async def _chunks(response, deadline: float) -> AsyncIterator[Any]:
+    """Iterates a streamed response, raising TimeoutError once the deadline passes."""
+    iterator = response.__aiter__()
+    while True:
+        try:
+            yield await asyncio.wait_for(iterator.__anext__(), deadline - time.perf_counter())
+        except StopAsyncIteration:
+            return
+
+
+def _parts(chunk) -> list:
+    try:
+        return list(chunk.parts)
+    except Exception:
+        return []
+
+
+def _result_rows(result: str) -> Tuple[Optional[int], Optional[str]]:
+    """Row count (or error message) of a tool result string, for progress events."""
+    rows = parse_row_count(result)
+    if rows is not None:
+        return rows, None
+    head, _, note = result.partition("\n")
+    try:
+        data = json.loads(head)
+    except ValueError:
+        return None, None
+    if isinstance(data, dict):
+        return None, data.get("error")
+    match = re.search(r"of (\d+) records", note)
+    return (int(match.group(1)) if match else len(data)), None
+
+
+def _extract_text_from_response(resp) -> str:
+    # Safely extract textual content from the response. The library's
+    # `response.text` property will raise when any non-text parts
+    # (e.g. function_call) are present. Build the text from text parts
+    # as a robust fallback.
+    try:
+        # preferred path when response is all-text
+        return resp.text
+    except Exception:
+        texts = []
+        # the response may expose `parts` which contain typed parts
+        parts = getattr(resp, "parts", None)
+        if parts:
+            for p in parts:
+                # parts can be objects or dict-like
+                t = None
+                if hasattr(p, "text"):
+                    t = p.text
+                elif isinstance(p, dict) and "text" in p:
+                    t = p.get("text")
+                # Some parts represent assistant messages with nested
+                # 'content' or 'message' shapes — try common keys
+                if not t and isinstance(p, dict):
+                    for key in ("content", "message", "body"):
+                        if key in p and isinstance(p[key], str):
+                            t = p[key]
+                            break
+                if t:
+                    texts.append(t)
+        # final fallback to string representation
+        joined = "\n".join(texts).strip()
+        return joined or str(resp)
 
 
 ai_service = AIService()
+after_fork(ai_service._reset_after_fork)
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import settings
+from app.core.concurrency import after_fork, run_blocking, run_shared
+from app.core.logging import logger
+from app.core.shared_state import SharedStateError, shared_state
+from app.tools.sql_tools import get_data_generation
+
+Embedder = Callable[[str], Awaitable[Optional[List[float]]]]
+
+
+@dataclass
+class CacheEntry:
+    answer: str
+    scope: str
+    generation: int
+    created_at: float
+    embedding: Optional[List[float]] = None
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(" ?.!")
+
+
+def _digest(payload) -> str:
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def query_key(query: str, context: Optional[Dict] = None, filters: Optional[Dict] = None) -> str:
+    """Identity of a question for caching and coalescing: normalized text plus its context and filters."""
+    return AnswerCache._keys(query, context, filters)[0]
+
+
+class MemoryCacheBackend:
+    """In-process LRU store with TTL expiry."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def candidates(self, scope: str, generation: int) -> Iterable[Tuple[str, List[float]]]:
+        now = time.time()
+        with self._lock:
+            return [
+                (key, entry.embedding)
+                for key, entry in self._entries.items()
+                if entry.embedding is not None
+                and entry.scope == scope
+                and entry.generation == generation
+                and now - entry.created_at <= self.ttl_seconds
+            ]
+
+    def prune(self, generation: int) -> None:
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.generation != generation]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Local-file store so cached answers survive restarts and are shared by workers on one host."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._open()
+        after_fork(self._open)
+
+    def _open(self) -> None:
+        # Also run in forked workers: an SQLite handle must not cross fork()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    answer TEXT NOT NULL,
+                    embedding TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_answer_cache_access ON answer_cache (last_access)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_answer_cache_scope ON answer_cache (scope, generation)")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer, scope, generation, created_at, embedding FROM answer_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[3] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE answer_cache SET last_access = ? WHERE key = ?", (now, key))
+        embedding = json.loads(row[4]) if row[4] else None
+        return CacheEntry(answer=row[0], scope=row[1], generation=row[2], created_at=row[3], embedding=embedding)
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        embedding = json.dumps(entry.embedding) if entry.embedding is not None else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, entry.scope, entry.generation, entry.answer, embedding, entry.created_at, time.time()),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM answer_cache WHERE key IN (
+                    SELECT key FROM answer_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def candidates(self, scope: str, generation: int) -> Iterable[Tuple[str, List[float]]]:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT key, embedding FROM answer_cache
+                WHERE scope = ? AND generation = ? AND embedding IS NOT NULL AND created_at >= ?
+                """,
+                (scope, generation, cutoff),
+            ).fetchall()
+        return [(key, json.loads(embedding)) for key, embedding in rows]
+
+    def prune(self, generation: int) -> None:
+        # Only other generations: workers sharing the file may adopt a new one at different times
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answer_cache WHERE generation != ?", (generation,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answer_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+
+
+class SharedCacheBackend:
+    """
+    Entries in the shared-state store, so every worker and node serves the
+    same cached answers. Expiry is the store's TTL; entries from older data
+    generations are ignored by AnswerCache and age out on their own.
+    """
+
+    name = "shared"
+
+    def __init__(self, state, max_entries: int, ttl_seconds: int):
+        self.state = state
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            raw = self.state.get(f"answer:{key}")
+        except SharedStateError as e:
+            logger.warning(f"Answer cache lookup skipped, shared state unavailable: {e}")
+            return None
+        return CacheEntry(**json.loads(raw)) if raw else None
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        try:
+            self.state.set(f"answer:{key}", json.dumps(entry.__dict__), ttl=self.ttl_seconds)
+            self.state.push("answer:recent", key, self.max_entries)
+            if entry.embedding is not None:
+                self.state.push(f"answer:embedded:{entry.scope}:{entry.generation}", key, self.max_entries)
+        except SharedStateError as e:
+            logger.warning(f"Answer not cached, shared state unavailable: {e}")
+
+    def candidates(self, scope: str, generation: int) -> Iterable[Tuple[str, List[float]]]:
+        try:
+            keys = list(dict.fromkeys(self.state.items(f"answer:embedded:{scope}:{generation}", self.max_entries)))
+            # One MGET instead of a round trip per candidate
+            values = self.state.get_many([f"answer:{key}" for key in keys])
+        except SharedStateError:
+            return []
+        found = []
+        for key, raw in zip(keys, values):
+            entry = CacheEntry(**json.loads(raw)) if raw else None
+            if entry is not None and entry.embedding is not None:
+                found.append((key, entry.embedding))
+        return found
+
+    def prune(self, generation: int) -> None:
+        # Entries carry their generation, so stale ones are already unreachable
+        pass
+
+    def clear(self) -> None:
+        # Other workers share these entries; they expire through the store's TTL
+        pass
+
+    def __len__(self) -> int:
+        try:
+            return len(set(self.state.items("answer:recent", self.max_entries)))
+        except SharedStateError:
+            return 0
+
+
+class AnswerCache:
+    """Exact-match and optional embedding-similarity cache for generated insights."""
+
+    def __init__(self, backend, embedder: Optional[Embedder] = None, similarity_threshold: float = 0.92):
+        self.backend = backend
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        # Set on first use: the generation is read from the database at startup, after this
+        # module is imported, and persisted entries of that generation must survive a restart
+        self._generation: Optional[int] = None
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    async def _run(self, func: Callable, *args):
+        """
+        Runs a backend call off the event loop: SQLite on the SQL pool, shared
+        state on its own pool. The in-memory backend is called directly.
+        """
+        if isinstance(self.backend, SQLiteCacheBackend):
+            return await run_blocking(func, *args)
+        if isinstance(self.backend, SharedCacheBackend):
+            return await run_shared(func, *args)
+        return func(*args)
+
+    async def _check_generation(self) -> int:
+        """Drop entries of older generations once agri_climate_data has been reloaded."""
+        generation = get_data_generation()
+        if self._generation is None:
+            self._generation = generation
+        elif generation != self._generation:
+            logger.info(f"Data generation changed ({self._generation} -> {generation}); pruning answer cache")
+            # Updated first, so concurrent requests don't prune again while this one waits
+            self._generation = generation
+            self._stats["invalidations"] += 1
+            await self._run(self.backend.prune, generation)
+        return generation
+
+    @staticmethod
+    def _keys(query: str, context: Optional[Dict], filters: Optional[Dict]) -> Tuple[str, str]:
+        scope = _digest({"context": context or {}, "filters": filters or {}})
+        return _digest({"query": normalize_query(query), "scope": scope}), scope
+
+    async def get(
+        self,
+        query: str,
+        context: Optional[Dict] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Return (answer, query_embedding); the embedding is reused by `set` on a miss."""
+        generation = await self._check_generation()
+        key, scope = self._keys(query, context, filters)
+
+        entry = await self._run(self.backend.get, key)
+        if entry is not None and entry.generation == generation:
+            self._stats["exact_hits"] += 1
+            return entry.answer, None
+
+        embedding = None
+        if self.embedder is not None:
+            embedding = await self.embedder(normalize_query(query))
+            # Candidate scan and scoring together, in one trip off the loop
+            match = await self._run(self._nearest, embedding, scope, generation) if embedding else None
+            if match is not None:
+                self._stats["semantic_hits"] += 1
+                return match.answer, embedding
+
+        self._stats["misses"] += 1
+        return None, embedding
+
+    def _nearest(self, embedding: List[float], scope: str, generation: int) -> Optional[CacheEntry]:
+        import numpy as np
+
+        candidates = list(self.backend.candidates(scope, generation))
+        if not candidates:
+            return None
+
+        matrix = np.asarray([vector for _, vector in candidates], dtype=np.float32)
+        probe = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(probe)
+        scores = matrix @ probe / np.where(norms == 0, 1.0, norms)
+
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self.backend.get(candidates[best][0])
+
+    async def set(
+        self,
+        query: str,
+        answer: str,
+        context: Optional[Dict] = None,
+        filters: Optional[Dict] = None,
+        embedding: Optional[List[float]] = None
+    ) -> None:
+        generation = await self._check_generation()
+        key, scope = self._keys(query, context, filters)
+        entry = CacheEntry(answer=answer, scope=scope, generation=generation, created_at=time.time(), embedding=embedding)
+        await self._run(self.backend.put, key, entry)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict:
+        """Counters plus the entry count, which queries the backend: call it off the event loop."""
+        lookups = self._stats["exact_hits"] + self._stats["semantic_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return {
+            "backend": self.backend.name,
+            "semantic": self.embedder is not None,
+            "entries": len(self.backend),
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _build_answer_cache() -> Optional[AnswerCache]:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+
+    if settings.ANSWER_CACHE_BACKEND == "sqlite":
+        # Same rule as logging: Vercel only allows writes under /tmp
+        path = settings.ANSWER_CACHE_SQLITE_PATH if not os.getenv("VERCEL") else "/tmp/answer_cache.sqlite3"
+        backend = SQLiteCacheBackend(path, settings.ANSWER_CACHE_MAX_ENTRIES, settings.ANSWER_CACHE_TTL_SECONDS)
+    elif settings.ANSWER_CACHE_BACKEND == "shared":
+        backend = SharedCacheBackend(shared_state, settings.ANSWER_CACHE_MAX_ENTRIES, settings.ANSWER_CACHE_TTL_SECONDS)
+    else:
+        backend = MemoryCacheBackend(settings.ANSWER_CACHE_MAX_ENTRIES, settings.ANSWER_CACHE_TTL_SECONDS)
+
+    embedder = None
+    if settings.ANSWER_CACHE_SEMANTIC_ENABLED:
+        from app.services.ai_service import ai_service
+        embedder = ai_service.embed_text
+
+    logger.info(f"Answer cache enabled (backend={backend.name}, semantic={embedder is not None})")
+    return AnswerCache(backend, embedder=embedder, similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD)
+
+
+answer_cache = _build_answer_cache()
@@ -1,27 +1,65 @@
 import httpx
-from typing import Optional, Dict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from app.config import settings
 from app.core.logging import logger
 
 class DataService:
     def __init__(self):
         """Initialize data service"""
-        self.base_url = settings.DATA_GOV_BASE_URL
+        self.base_url = settings.DATA_GOV_BASE_URL.rstrip("/")
         self.api_key = settings.DATA_GOV_API_KEY
-        
+
     async def fetch_agricultural_data(
-        self, 
+        self,
         resource_id: str,
         filters: Optional[Dict] = None,
-        limit: int = 1000
+        limit: int = 1000,
+        offset: int = 0,
+        client: Optional[httpx.AsyncClient] = None
     ) -> Optional[Dict]:
-        """Fetch data from external API (MOCKED for POC)"""
-        logger.info(f"Attempting to fetch data for resource: {resource_id}. This is mocked in POC.")
-        
-        # In a real app, this is where you'd use httpx to fetch the data
-        if resource_id == "crop_production":
-            return {"data": [{"state": "KA", "yield": 100}, {"state": "PB", "yield": 200}]}
-        
-        return {"data": []}
+        """Fetch one page of a data.gov.in resource (JSON format)."""
+        params = {"api-key": self.api_key, "format": "json", "offset": offset, "limit": limit}
+        for field, value in (filters or {}).items():
+            params[f"filters[{field}]"] = value
+
+        try:
+            if client is not None:
+                response = await client.get(f"{self.base_url}/{resource_id}", params=params)
+            else:
+                async with httpx.AsyncClient(timeout=settings.DATA_GOV_TIMEOUT_SECONDS) as own_client:
+                    response = await own_client.get(f"{self.base_url}/{resource_id}", params=params)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Failed to fetch resource {resource_id} at offset {offset}: {e}")
+            return None
+
+    async def iter_record_pages(
+        self,
+        resource_id: str,
+        page_size: int,
+        start_offset: int = 0,
+        filters: Optional[Dict] = None
+    ) -> AsyncIterator[Tuple[int, List[Dict], Dict]]:
+        """
+        Page through a resource, yielding (next_offset, records, page_metadata).
+        Stops at the reported total or the first empty page.
+        """
+        offset = start_offset
+        async with httpx.AsyncClient(timeout=settings.DATA_GOV_TIMEOUT_SECONDS) as client:
+            while True:
+                page = await self.fetch_agricultural_data(resource_id, filters, page_size, offset, client)
+                if page is None:
+                    raise RuntimeError(f"Fetching resource {resource_id} failed at offset {offset}")
+
+                records = page.get("records") or []
+                if not records:
+                    return
+                offset += len(records)
+                yield offset, records, page
+
+                total = page.get("total")
+                if total is not None and offset >= int(total):
+                    return
 
-data_service = DataService()
\ No newline at end of file
+data_service = DataService()
@@ -0,0 +1,374 @@
+import asyncio
+import base64
+import json
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import (
+    Column, DateTime, Float, Index, Integer, MetaData, String, Table, Text,
+    and_, create_engine, func, insert, or_, select,
+)
+from sqlalchemy.engine import Engine
+from app.config import settings
+from app.core.concurrency import run_blocking, run_shared
+from app.database.engine import get_engine
+from app.core.logging import logger
+from app.core.shared_state import SharedStateError, shared_state
+from app.models.request_models import QueryFeedback
+from app.models.response_models import AnalyticsResponse
+
+HISTORY_METADATA = MetaData()
+
+# Mirrors migrations/versions/0002 so SQLite and non-migrated databases get the same indexes
+QUERY_HISTORY_TABLE = Table(
+    "query_history",
+    HISTORY_METADATA,
+    Column("query_id", String, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("query", Text, nullable=False),
+    Column("insights", Text, nullable=False),
+    Column("data_points", Text),
+    Column("execution_time", Float),
+    # Keyset pagination walks (created_at, query_id) newest first
+    Index("ix_query_history_created", "created_at", "query_id"),
+)
+
+QUERY_FEEDBACK_TABLE = Table(
+    "query_feedback",
+    HISTORY_METADATA,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("query_id", String, nullable=False),
+    Column("rating", Integer, nullable=False),
+    Column("feedback", Text),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_query_feedback_query", "query_id"),
+)
+
+
+def encode_cursor(item: Dict[str, Any]) -> str:
+    raw = f"{item['timestamp'].isoformat()}|{item['query_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, _, query_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").partition("|")
+        return datetime.fromisoformat(created_at), query_id
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """History timestamps are stored as naive UTC."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _sort_key(item: Dict[str, Any]) -> Tuple[datetime, str]:
+    return item["timestamp"], item["query_id"]
+
+
+class HistoryStore:
+    """
+    Query history and feedback. The newest entries live in a per-worker ring
+    buffer; everything is also queued and written to the database in batches
+    by a background task, so requests never wait on history writes. The ring
+    starts with the newest persisted rows and answers unfiltered first pages;
+    a shared-state backend keeps one ring for all workers.
+    """
+
+    def __init__(self, buffer_size: int, batch_size: int, flush_seconds: float, queue_max: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_max = queue_max
+        self._recent: deque = deque(maxlen=buffer_size)
+        # True while the ring holds every persisted row, so any first page can be served from it
+        self._complete = True
+        # (table, row) pairs waiting for the writer, plus ids not yet readable from the database
+        self._pending: deque = deque()
+        self._unflushed: Dict[str, Dict[str, Any]] = {}
+        self._engine: Optional[Engine] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        # Shared-state pushes in flight; held so they aren't garbage collected
+        self._sharing: set = set()
+        self._stats = {"recorded": 0, "written": 0, "dropped": 0, "write_errors": 0}
+
+    @property
+    def persistent(self) -> bool:
+        return self._engine is not None
+
+    def start(self) -> None:
+        """Creates the tables if needed and starts the background writer."""
+        engine = _history_engine()
+        if engine is None:
+            logger.warning("Query history is memory-only")
+            return
+        try:
+            HISTORY_METADATA.create_all(engine, checkfirst=True)
+        except Exception as e:
+            logger.error(f"Query history is memory-only, could not create tables: {e}")
+            return
+        self._engine = engine
+        self._seed()
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+        logger.info(f"Query history persisted to {engine.dialect.name} (batch {self.batch_size}, every {self.flush_seconds}s)")
+
+    async def stop(self) -> None:
+        """Stops the writer after flushing everything still queued."""
+        if self._sharing:
+            await asyncio.gather(*self._sharing, return_exceptions=True)
+        if self._writer is None:
+            return
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+        await self.flush()
+
+    def _seed(self) -> None:
+        """Loads the newest persisted rows into the ring, so first pages are served without a query."""
+        try:
+            rows = self._select(self._recent.maxlen, None, None, None, None)
+        except Exception as e:
+            self._complete = False
+            logger.error(f"History ring starts empty, could not read recent rows: {e}")
+            return
+        self._recent.extendleft(rows)
+        self._complete = len(rows) < self._recent.maxlen
+
+    def _enqueue(self, table: Table, row: Dict[str, Any]) -> bool:
+        if self._engine is None:
+            return False
+        if len(self._pending) >= self.queue_max:
+            self._stats["dropped"] += 1
+            logger.warning(f"History write queue full ({self.queue_max}); dropping a {table.name} row")
+            return False
+        self._pending.append((table, row))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def record(self, response: AnalyticsResponse) -> None:
+        """Adds a response to history; never blocks on the database."""
+        # Shallow: data_points is shared with the response rather than deep-copied
+        item = dict(response)
+        # Recorded time, so pagination order follows completion order
+        item["timestamp"] = datetime.utcnow()
+        if len(self._recent) == self._recent.maxlen:
+            self._complete = False
+        self._recent.append(item)
+        self._stats["recorded"] += 1
+        if shared_state.shared:
+            self._share("history:recent", item)
+
+        row = {
+            "query_id": item["query_id"],
+            "created_at": item["timestamp"],
+            "query": item["query"],
+            "insights": item["insights"],
+            "data_points": response.data_points_json(),
+            "execution_time": item["execution_time"],
+        }
+        if self._enqueue(QUERY_HISTORY_TABLE, row):
+            self._unflushed[item["query_id"]] = item
+
+    def record_feedback(self, feedback: QueryFeedback) -> bool:
+        """Stores a rating; False if the write queue is full."""
+        row = {
+            "query_id": feedback.query_id,
+            "rating": feedback.rating,
+            "feedback": feedback.feedback,
+            "created_at": datetime.utcnow(),
+        }
+        return self._enqueue(QUERY_FEEDBACK_TABLE, row) if self._engine is not None else True
+
+    def _share(self, key: str, item: Dict[str, Any]) -> None:
+        """Pushes to shared state in the background, so recording never waits on the network."""
+        task = asyncio.get_running_loop().create_task(self._push(key, json.dumps(item, default=str)))
+        self._sharing.add(task)
+        task.add_done_callback(self._sharing.discard)
+
+    async def _push(self, key: str, value: str) -> None:
+        try:
+            await run_shared(shared_state.push, key, value, self._recent.maxlen)
+        except SharedStateError as e:
+            logger.warning(f"History entry kept in this worker only, shared state unavailable: {e}")
+
+    async def _shared_recent(self) -> List[Dict[str, Any]]:
+        """Every worker's recent history; this worker's ring if the store is unreachable."""
+        try:
+            raw = await run_shared(shared_state.items, "history:recent", self._recent.maxlen)
+        except SharedStateError as e:
+            logger.warning(f"Listing this worker's history only, shared state unavailable: {e}")
+            return list(self._recent)
+        items = [json.loads(entry) for entry in raw]
+        for item in items:
+            item["timestamp"] = datetime.fromisoformat(item["timestamp"])
+        return items
+
+    async def _write_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        while self._pending and self._engine is not None:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                await run_blocking(self._write, batch)
+                self._stats["written"] += len(batch)
+            except Exception as e:
+                # History is best effort: log and drop rather than retry forever
+                self._stats["write_errors"] += 1
+                self._stats["dropped"] += len(batch)
+                logger.error(f"Failed to write {len(batch)} history rows: {e}")
+            for table, row in batch:
+                if table is QUERY_HISTORY_TABLE:
+                    self._unflushed.pop(row["query_id"], None)
+
+    def _write(self, batch: List[Tuple[Table, Dict[str, Any]]]) -> None:
+        rows: Dict[str, List[Dict[str, Any]]] = {}
+        for table, row in batch:
+            rows.setdefault(table.name, []).append(row)
+        with self._engine.begin() as connection:
+            for table in (QUERY_HISTORY_TABLE, QUERY_FEEDBACK_TABLE):
+                if table.name in rows:
+                    connection.execute(insert(table), rows[table.name])
+
+    def _select(
+        self,
+        limit: int,
+        before: Optional[Tuple[datetime, str]],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        text: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        table = QUERY_HISTORY_TABLE
+        statement = select(table)
+        if before is not None:
+            created_at, query_id = before
+            statement = statement.where(or_(
+                table.c.created_at < created_at,
+                and_(table.c.created_at == created_at, table.c.query_id < query_id),
+            ))
+        if since is not None:
+            statement = statement.where(table.c.created_at >= since)
+        if until is not None:
+            statement = statement.where(table.c.created_at < until)
+        if text:
+            statement = statement.where(func.lower(table.c.query).contains(text.lower(), autoescape=True))
+        statement = statement.order_by(table.c.created_at.desc(), table.c.query_id.desc()).limit(limit)
+
+        with self._engine.connect() as connection:
+            return [
+                {
+                    "query_id": row.query_id,
+                    "query": row.query,
+                    "insights": row.insights,
+                    "data_points": json.loads(row.data_points) if row.data_points else None,
+                    "execution_time": row.execution_time,
+                    "timestamp": row.created_at,
+                }
+                for row in connection.execute(statement)
+            ]
+
+    async def list(
+        self,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        text: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Newest-first page of history and the cursor for the next page (None at the end)."""
+        before = decode_cursor(cursor) if cursor else None
+        since, until = _naive_utc(since), _naive_utc(until)
+        needle = text.lower() if text else None
+
+        def matches(item: Dict[str, Any]) -> bool:
+            return (
+                (before is None or _sort_key(item) < before)
+                and (since is None or item["timestamp"] >= since)
+                and (until is None or item["timestamp"] < until)
+                and (needle is None or needle in item["query"].lower())
+            )
+
+        items = None
+        if self._engine is None or (before is None and since is None and until is None and needle is None):
+            recent = await self._shared_recent() if shared_state.shared else self._recent
+            items = sorted(filter(matches, recent), key=_sort_key, reverse=True)
+            # The ring serves a persistent first page only if it holds that page and knows whether more follows
+            complete = self._complete and not shared_state.shared
+            if self._engine is not None and len(items) <= limit and not complete:
+                items = None
+        if items is None:
+            # The database is shared by every worker; merge in rows this worker hasn't flushed yet
+            # One extra row tells us whether another page exists
+            items = await run_blocking(self._select, limit + 1, before, since, until, text)
+            seen = {item["query_id"] for item in items}
+            items += [item for item in list(self._unflushed.values()) if item["query_id"] not in seen and matches(item)]
+            items.sort(key=_sort_key, reverse=True)
+
+        page = items[:limit]
+        next_cursor = encode_cursor(page[-1]) if len(items) > limit else None
+        return page, next_cursor
+
+    def _select_queries(self, limit: int) -> List[Tuple[str, str]]:
+        table = QUERY_HISTORY_TABLE
+        statement = (
+            select(table.c.query_id, table.c.query)
+            .order_by(table.c.created_at.desc(), table.c.query_id.desc())
+            .limit(limit)
+        )
+        with self._engine.connect() as connection:
+            return [(row.query_id, row.query) for row in connection.execute(statement)]
+
+    async def recent_queries(self, limit: int) -> List[str]:
+        """Newest-first question texts only; cheaper than list() for ranking popular questions."""
+        if self._engine is None:
+            recent = await self._shared_recent() if shared_state.shared else self._recent
+            return [item["query"] for item in sorted(recent, key=_sort_key, reverse=True)[:limit]]
+        # Rows this worker hasn't flushed yet are the newest
+        unflushed = sorted(self._unflushed.values(), key=_sort_key, reverse=True)
+        rows = await run_blocking(self._select_queries, limit)
+        seen = {item["query_id"] for item in unflushed}
+        queries = [item["query"] for item in unflushed]
+        queries += [query for query_id, query in rows if query_id not in seen]
+        return queries[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "persistent": self.persistent,
+            "buffered": len(self._recent),
+            "pending_writes": len(self._pending),
+            **self._stats,
+        }
+
+
+def _history_engine() -> Optional[Engine]:
+    if not settings.HISTORY_PERSIST:
+        return None
+    if settings.HISTORY_DATABASE_URL:
+        try:
+            return create_engine(settings.HISTORY_DATABASE_URL)
+        except Exception as e:
+            logger.error(f"Failed to create history engine: {e}")
+            return None
+    return get_engine()
+
+
+history_store = HistoryStore(
+    buffer_size=settings.HISTORY_BUFFER_SIZE,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_seconds=settings.HISTORY_FLUSH_SECONDS,
+    queue_max=settings.HISTORY_QUEUE_MAX,
+)
@@ -0,0 +1,217 @@
+"""
+Precomputed insights for the most popular questions. A background job ranks
+questions by how often they appear in recent query history, answers the top
+ones with the agent ahead of time and re-answers them when they age or the
+data is reloaded. Lookups are stale-while-revalidate: a stale answer is still
+served at once while its refresh runs in the background.
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+from app.config import settings
+from app.core.admission import detach_client
+from app.core.concurrency import run_shared
+from app.core.logging import logger
+from app.core.shared_state import SharedStateError, shared_state
+from app.core.telemetry import span, start_trace
+from app.services.ai_service import ERROR_PREFIXES, ai_service
+from app.services.answer_cache import query_key
+from app.services.history_store import history_store
+from app.services.intent_router import intent_router
+from app.tools.sql_tools import get_data_generation
+
+
+@dataclass
+class PrecomputedInsight:
+    query: str
+    insights: str
+    generation: int
+    computed_at: float
+
+
+class InsightStore:
+    """
+    Answers for the top questions in history, kept per worker and, with a
+    shared-state backend, shared by every worker so each question is
+    answered once per refresh across the deployment.
+    """
+
+    def __init__(self, top_n: int, min_asks: int, history_window: int, max_age_seconds: float, poll_seconds: float):
+        self.top_n = top_n
+        self.min_asks = min_asks
+        self.history_window = history_window
+        self.max_age_seconds = max_age_seconds
+        self.poll_seconds = poll_seconds
+        self._entries: Dict[str, PrecomputedInsight] = {}
+        # key -> (question text, asks in the history window)
+        self._popular: Dict[str, Tuple[str, int]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._job: Optional[asyncio.Task] = None
+        self._stats = {"hits": 0, "stale_hits": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def start(self) -> None:
+        """Starts the background ranking and refresh job."""
+        self._job = asyncio.create_task(self._run())
+        logger.info(f"Precomputing insights for the top {self.top_n} questions (refresh after {self.max_age_seconds:.0f}s)")
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._job, *self._refreshing.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._job = None
+
+    def _stale(self, entry: PrecomputedInsight) -> bool:
+        return entry.generation != get_data_generation() or time.time() - entry.computed_at >= self.max_age_seconds
+
+    async def _load(self, key: str) -> Optional[PrecomputedInsight]:
+        entry = self._entries.get(key)
+        if shared_state.shared:
+            try:
+                raw = await run_shared(shared_state.get, f"insight:{key}")
+            except SharedStateError as e:
+                logger.warning(f"Using this worker's precomputed insight only, shared state unavailable: {e}")
+                return entry
+            if raw is not None:
+                shared = PrecomputedInsight(**json.loads(raw))
+                # Another worker may have refreshed it more recently
+                if entry is None or shared.computed_at > entry.computed_at:
+                    entry = self._entries[key] = shared
+        return entry
+
+    async def _save(self, key: str, entry: PrecomputedInsight) -> None:
+        self._entries[key] = entry
+        if shared_state.shared:
+            try:
+                await run_shared(shared_state.set, f"insight:{key}", json.dumps(asdict(entry)))
+            except SharedStateError as e:
+                logger.warning(f"Precomputed insight kept in this worker only, shared state unavailable: {e}")
+
+    async def _claim(self, key: str, generation: int) -> bool:
+        """True for the one worker that should refresh this question now."""
+        lease = settings.AGENT_QUEUE_TIMEOUT_SECONDS + settings.AGENT_TIME_BUDGET_SECONDS
+        try:
+            return await run_shared(shared_state.incr, f"insight:claim:{key}:{generation}", ttl=lease) == 1
+        except SharedStateError:
+            return True
+
+    async def lookup(self, query: str, context: Optional[Dict] = None, filters: Optional[Dict] = None) -> Optional[PrecomputedInsight]:
+        """
+        The precomputed answer for a popular question, stale or not; a stale
+        one is refreshed in the background. None for everything else.
+        """
+        # History only records the question text, so only plain questions are ranked
+        if context or filters:
+            return None
+        key = query_key(query)
+        if key not in self._popular:
+            return None
+        entry = await self._load(key)
+        if entry is None:
+            return None
+        if self._stale(entry):
+            self._stats["stale_hits"] += 1
+            self._revalidate(key)
+        else:
+            self._stats["hits"] += 1
+        return entry
+
+    def _revalidate(self, key: str) -> Optional[asyncio.Task]:
+        task = self._refreshing.get(key)
+        if task is None and key in self._popular:
+            task = self._refreshing[key] = asyncio.create_task(self._refresh(key, self._popular[key][0]))
+            task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+
+    async def _refresh(self, key: str, query: str) -> bool:
+        # A task of its own, not work for the request whose lookup found the entry stale:
+        # that client's agent budget must not gate it, nor its cost land in that request's trace
+        detach_client()
+        start_trace()
+        generation = get_data_generation()
+        if not await self._claim(key, generation):
+            return False
+        try:
+            with span("insights.refresh"):
+                insights = await ai_service.generate_insights(query)
+        except Exception as e:
+            self._stats["refresh_errors"] += 1
+            logger.warning(f"Could not precompute insights for '{query[:50]}': {e}")
+            return False
+        if insights.startswith(ERROR_PREFIXES):
+            self._stats["refresh_errors"] += 1
+            logger.warning(f"Could not precompute insights for '{query[:50]}': {insights[:80]}")
+            return False
+        await self._save(key, PrecomputedInsight(query=query, insights=insights, generation=generation, computed_at=time.time()))
+        self._stats["refreshes"] += 1
+        return True
+
+    async def rank(self) -> Dict[str, Tuple[str, int]]:
+        """Recomputes the top questions from recent history, skipping ones the intent router answers."""
+        queries = await history_store.recent_queries(self.history_window)
+        counts: Counter = Counter()
+        texts: Dict[str, str] = {}
+        for query in queries:
+            key = query_key(query)
+            counts[key] += 1
+            # History is newest first, so this keeps the latest wording
+            texts.setdefault(key, query)
+
+        popular = {}
+        for key, asks in counts.most_common():
+            if len(popular) >= self.top_n or asks < self.min_asks:
+                break
+            # Structured answers are already instant
+            if settings.INTENT_ROUTER_ENABLED and intent_router.route(texts[key]) is not None:
+                continue
+            popular[key] = (texts[key], asks)
+
+        self._popular = popular
+        for key in [key for key in self._entries if key not in popular]:
+            del self._entries[key]
+        return popular
+
+    async def refresh(self) -> int:
+        """Ranks the questions, then answers any popular one that is missing or stale; returns how many ran."""
+        popular = await self.rank()
+        refreshed = 0
+        # One at a time, so precomputing never takes more than one agent slot
+        for key in popular:
+            entry = await self._load(key)
+            if entry is None or self._stale(entry):
+                task = self._revalidate(key)
+                if task is not None and await asyncio.shield(task):
+                    refreshed += 1
+        return refreshed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                refreshed = await self.refresh()
+                if refreshed:
+                    logger.info(f"Refreshed {refreshed} precomputed insights")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Precomputed insight refresh failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "popular": len(self._popular),
+            "entries": len(self._entries),
+            "refreshing": len(self._refreshing),
+            **self._stats,
+        }
+
+
+insight_store: Optional[InsightStore] = InsightStore(
+    top_n=settings.INSIGHTS_TOP_N,
+    min_asks=settings.INSIGHTS_MIN_ASKS,
+    history_window=settings.INSIGHTS_HISTORY_WINDOW,
+    max_age_seconds=settings.INSIGHTS_MAX_AGE_SECONDS,
+    poll_seconds=settings.INSIGHTS_POLL_SECONDS,
+) if settings.INSIGHTS_PRECOMPUTE_ENABLED else None
@@ -0,0 +1,167 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from app.core.logging import logger
+from app.models.request_models import RangeFilter, StructuredQuery
+from app.services.rollup_engine import rollup_engine
+
+# Open-ended questions always go to the agent
+BLOCKERS = re.compile(
+    r"\b(why|explain|reason|cause[sd]?|impact|affect(?:s|ed)?|effect|influence|suggest|recommend|should|"
+    r"predict|forecast|future|policy|policies|strategy|improve|insight|scheme|sustainab\w*|irrigation|price)\b"
+)
+
+DIMENSION_PATTERNS = [
+    re.compile(r"\b(?:by|per|each|every|across|which|what)\s+(state|year|crop)s?\b"),
+    re.compile(r"\b(state|year|crop)[- ]wise\b"),
+    re.compile(r"\b(?:top|bottom)\s+(?:\d+\s+)?(state|year|crop)s?\b"),
+]
+TREND = re.compile(r"\b(trend|over (?:the )?years|year[- ]on[- ]year|year[- ]over[- ]year|annual(?:ly)?)\b")
+
+YEAR = r"(19[5-9]\d|20[0-4]\d)"
+YEAR_RANGE = re.compile(rf"\b(?:between|from)\s+{YEAR}\s+(?:and|to|-)\s+{YEAR}\b|\b{YEAR}\s*(?:-|to)\s*{YEAR}\b")
+YEAR_SINCE = re.compile(rf"\b(?:since|after|from)\s+{YEAR}\b")
+YEAR_BEFORE = re.compile(rf"\b(?:before|until|till|up to)\s+{YEAR}\b")
+YEAR_ANY = re.compile(rf"\b{YEAR}\b")
+
+TOP_N = re.compile(r"\btop\s+(\d{1,3})\b")
+DESCENDING = re.compile(r"\b(top|highest|most|largest|maximum|max|best|leading)\b")
+ASCENDING = re.compile(r"\b(bottom|lowest|least|smallest|minimum|min|worst)\b")
+AVERAGE = re.compile(r"\b(average|avg|mean)\b")
+
+
+def _measures(text: str) -> List[str]:
+    if re.search(r"\bcorrelat\w*|\brelationship\b", text):
+        return ["corr_production_rainfall"]
+
+    measures = []
+    average = AVERAGE.search(text) is not None
+    if re.search(r"\b(production|produced|yield|output|harvest)\b", text):
+        measures.append("avg_production" if average else "sum_production")
+    if re.search(r"\b(rainfall|rain|precipitation)\b", text):
+        measures.append("sum_rainfall" if re.search(r"\btotal\s+rain", text) else "avg_rainfall")
+    if not measures and re.search(r"\b(how many|number of|count)\b", text):
+        measures.append("count")
+    return measures
+
+
+def _year_filter(text: str) -> Optional[Any]:
+    match = YEAR_RANGE.search(text)
+    if match:
+        years = sorted(int(y) for y in match.groups() if y)
+        return RangeFilter(gte=years[0], lte=years[-1])
+    match = YEAR_SINCE.search(text)
+    if match:
+        return RangeFilter(gte=int(match.group(1)))
+    match = YEAR_BEFORE.search(text)
+    if match:
+        return RangeFilter(lte=int(match.group(1)) - 1)
+    years = sorted({int(y) for y in YEAR_ANY.findall(text)})
+    if not years:
+        return None
+    return years[0] if len(years) == 1 else years
+
+
+class IntentRouter:
+    """
+    Recognizes template analytics questions ("rice production by state in 2019",
+    "top 5 states by average rainfall") and turns them into StructuredQuery
+    objects. Anything it is not sure about returns None and goes to the agent.
+    """
+
+    def __init__(self):
+        self._generation: Optional[int] = None
+        self._vocabulary: Dict[str, List[Tuple[re.Pattern, Any]]] = {}
+
+    def _names(self, dim: str) -> List[Tuple[re.Pattern, Any]]:
+        """Word-boundary patterns for every State/Crop value, rebuilt when the data changes."""
+        # One read, so the vocabulary and its generation come from the same build
+        snapshot = rollup_engine.snapshot
+        if self._generation != snapshot.generation:
+            self._vocabulary = {
+                d: [
+                    (re.compile(rf"\b{re.escape(str(value).lower())}s?\b"), value)
+                    # Longest names first so "Madhya Pradesh" wins over any shorter overlap
+                    for value in sorted(snapshot.dictionaries[d], key=lambda v: -len(str(v)))
+                ]
+                for d in ("State", "Crop")
+            }
+            self._generation = snapshot.generation
+        return self._vocabulary[dim]
+
+    def _match_names(self, dim: str, text: str) -> List[Any]:
+        found = []
+        for pattern, value in self._names(dim):
+            if pattern.search(text):
+                found.append(value)
+                text = pattern.sub(" ", text)
+        return found
+
+    def route(self, query: str, filters: Optional[Dict] = None) -> Optional[StructuredQuery]:
+        if rollup_engine is None or not rollup_engine.ready:
+            # No vocabulary to recognize states and crops with
+            return None
+
+        text = " ".join(query.lower().split())
+        if BLOCKERS.search(text):
+            return None
+        measures = _measures(text)
+        if not measures:
+            return None
+
+        dimensions = []
+        for pattern in DIMENSION_PATTERNS:
+            dimensions += [m.capitalize() for m in pattern.findall(text)]
+        if TREND.search(text):
+            dimensions.append("Year")
+
+        parsed: Dict[str, Any] = {}
+        for dim in ("State", "Crop"):
+            names = self._match_names(dim, text)
+            if names:
+                parsed[dim] = names[0] if len(names) == 1 else names
+        year = _year_filter(text)
+        if year is not None:
+            parsed["Year"] = year
+        if re.search(r"\bdrought[- ]resistant\b", text):
+            parsed["Is_Drought_Resistant"] = 1
+
+        # Explicit request filters win over anything read from the text
+        parsed.update(filters or {})
+        if re.search(r"\b(compare|comparison|vs|versus)\b", text) and not any(
+            isinstance(value, list) and len(value) > 1 for value in parsed.values()
+        ):
+            # Probably names a state or crop we don't have; let the agent say so
+            return None
+        for dim, value in parsed.items():
+            # "compare Bihar and Punjab" / "2018 vs 2019" means one row per value
+            if isinstance(value, list) and len(value) > 1 and dim != "Is_Drought_Resistant":
+                dimensions.append(dim)
+        dimensions = list(dict.fromkeys(dimensions))
+
+        order_by, descending, limit = None, True, 100
+        if DESCENDING.search(text) or ASCENDING.search(text):
+            order_by = measures[0]
+            descending = DESCENDING.search(text) is not None
+        top = TOP_N.search(text)
+        if top:
+            limit = int(top.group(1))
+        if order_by and not dimensions:
+            # "highest production" with nothing to rank over isn't a template question
+            return None
+
+        try:
+            return StructuredQuery(
+                dimensions=dimensions,
+                measures=measures,
+                filters=parsed,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+            )
+        except ValidationError as e:
+            logger.info(f"Intent router fell back to the agent: {e.error_count()} invalid fields")
+            return None
+
+
+intent_router = IntentRouter()
@@ -1,13 +1,41 @@
+import asyncio
 import time
 import uuid
-from typing import Optional, Dict
-from app.services.ai_service import ai_service
+from typing import Any, AsyncIterator, List, Optional, Dict, Tuple
+from app.config import settings
+from app.services.ai_service import ai_service, ERROR_PREFIXES
+from app.services.answer_cache import answer_cache, query_key
+from app.services.insight_store import insight_store
+from app.services.intent_router import intent_router
+from app.services.structured_query import describe_structured_query, run_structured_query, summarize_rows
+from app.models.request_models import AnalyticsQuery, StructuredQuery
 # Removed data_service import as it is no longer used for fetching data
+from app.core.admission import admission, detach_client
+from app.core.concurrency import ServiceSaturatedError, SingleFlight
 from app.core.logging import logger
+from app.core.telemetry import RequestTrace, current_trace, span, start_trace
 from app.models.response_models import AnalyticsResponse
 
+RANGE_OPERATORS = {"gte": ">=", "lte": "<=", "gt": ">", "lt": "<"}
+
+def _describe_filters(filters: Dict) -> str:
+    """Request filters as prompt text, e.g. State=Punjab, Crop=Rice or Wheat, Year >= 2015"""
+    parts = []
+    for key, value in filters.items():
+        if isinstance(value, dict):
+            parts += [f"{key} {RANGE_OPERATORS.get(op, op)} {bound}" for op, bound in value.items() if bound is not None]
+        elif isinstance(value, (list, tuple, set)):
+            parts.append(f"{key}={' or '.join(str(item) for item in value)}")
+        else:
+            parts.append(f"{key}={value}")
+    return ", ".join(parts)
+
 class QueryProcessor:
     """Process analytics queries end-to-end"""
+
+    def __init__(self):
+        # Identical agent runs in flight at the same time share one answer
+        self.single_flight = SingleFlight()
     
     async def process_query(
         self,
@@ -16,29 +44,187 @@ class QueryProcessor:
         filters: Optional[Dict] = None
     ) -> AnalyticsResponse:
         """Process analytics query and return insights"""
+        async for event in self.stream_query(query, context, filters, coalesce=True):
+            if event["event"] == "result":
+                return event["response"]
+
+    @staticmethod
+    async def _shared_agent_run(agent_query: str, context: Optional[Dict]) -> Tuple[str, RequestTrace]:
+        """
+        Agent run shared by concurrent callers. Runs as its own task with no
+        client and its own trace: budgets are checked and costs charged per caller.
+        """
+        detach_client()
+        trace = start_trace()
+        return await ai_service.generate_insights(agent_query, context), trace
+
+    async def process_batch(
+        self,
+        items: List[AnalyticsQuery],
+        max_parallel: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a batch of queries, yielding a result (or error) event per
+        item in completion order and a final done event. Identical questions
+        are answered once; at most max_parallel distinct ones run at a time.
+        """
+        start_time = time.perf_counter()
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(query_key(item.query, item.context, item.filters), []).append(index)
+
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def run(indices: List[int]):
+            item = items[indices[0]]
+            async with semaphore:
+                try:
+                    return indices, await self.process_query(item.query, item.context, item.filters), None
+                except Exception as e:
+                    return indices, None, e
+
+        tasks = [asyncio.ensure_future(run(indices)) for indices in groups.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                indices, response, error = await finished
+                for position, index in enumerate(indices):
+                    if error is not None:
+                        yield {"event": "error", "index": index, "error": error}
+                    else:
+                        # Duplicates get their own query_id so history and feedback stay per item
+                        copy = response if position == 0 else response.model_copy(update={"query_id": str(uuid.uuid4())})
+                        yield {"event": "result", "index": index, "response": copy}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "event": "done",
+            "items": len(items),
+            "unique": len(groups),
+            "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 1),
+        }
+
+    async def stream_query(
+        self,
+        query: str,
+        context: Optional[Dict] = None,
+        filters: Optional[Dict] = None,
+        coalesce: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process analytics query as a stream of events; the last one is a
+        result event carrying the AnalyticsResponse. With coalesce, an agent
+        run is shared with concurrent identical questions and streams no
+        progress events.
+        """
         
         query_id = str(uuid.uuid4())
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             logger.info(f"Processing query {query_id}: {query[:50]}...")
+
+            # Template questions are answered directly, without the agent
+            structured = intent_router.route(query, filters) if settings.INTENT_ROUTER_ENABLED else None
+            if structured is not None:
+                logger.info(f"Query {query_id} routed to structured query: {describe_structured_query(structured)}")
+                yield {"event": "route", "route": "structured", "query_id": query_id}
+                response = await self.process_structured(structured, query=query, query_id=query_id)
+                yield {"event": "result", "response": response}
+                return
             
+            # Popular questions are answered ahead of time; stale answers refresh in the background
+            precomputed = await insight_store.lookup(query, context, filters) if insight_store is not None else None
+            if precomputed is not None:
+                logger.info(f"Query {query_id} answered from precomputed insights")
+                yield {"event": "route", "route": "precomputed", "query_id": query_id}
+                yield {"event": "result", "response": AnalyticsResponse(
+                    query_id=query_id,
+                    query=query,
+                    insights=precomputed.insights,
+                    data_points=None,
+                    execution_time=round(time.perf_counter() - start_time, 4)
+                )}
+                return
+
             # Data fetching is now handled internally by the AI Agent via SQL Tool.
             
-            insights = await ai_service.generate_insights(query, context)
+            insights = None
+            embedding = None
+            if answer_cache is not None:
+                with span("cache.lookup") as attributes:
+                    insights, embedding = await answer_cache.get(query, context, filters)
+                    attributes["hit"] = insights is not None
+                if insights is not None:
+                    logger.info(f"Answer cache hit for query {query_id}")
+                    yield {"event": "route", "route": "cache", "query_id": query_id}
+
+            if insights is None:
+                agent_query = f"{query}\n\nApply these filters: {_describe_filters(filters)}" if filters else query
+                shared = False
+                if coalesce:
+                    # Checked per caller: the shared run itself belongs to no client
+                    admission.check_agent_budget()
+                    (insights, agent_trace), shared = await self.single_flight.run(
+                        query_key(query, context, filters),
+                        lambda: self._shared_agent_run(agent_query, context)
+                    )
+                    if shared:
+                        logger.info(f"Query {query_id} shared a concurrent identical agent run")
+                    # Every caller is charged the full cost of the run it received
+                    trace = current_trace()
+                    if trace is not None:
+                        trace.merge(agent_trace)
+                else:
+                    async for event in ai_service.stream_insights(agent_query, context):
+                        if event["event"] == "answer":
+                            insights = event["text"]
+                        else:
+                            yield {**event, "query_id": query_id} if event["event"] == "route" else event
+                # Only cache real answers, never the fallback error strings
+                if answer_cache is not None and not shared and not insights.startswith(ERROR_PREFIXES):
+                    await answer_cache.set(query, insights, context, filters, embedding=embedding)
             
-            execution_time = time.time() - start_time
+            execution_time = time.perf_counter() - start_time
             
-            return AnalyticsResponse(
+            yield {"event": "result", "response": AnalyticsResponse(
                 query_id=query_id,
                 query=query,
                 insights=insights,
                 data_points=None, # Data points are embedded in the 'insights' string
-                execution_time=round(execution_time, 2)
-            )
+                execution_time=round(execution_time, 4)
+            )}
             
+        except ServiceSaturatedError:
+            # Expected under load; the route logs the rejection
+            raise
         except Exception as e:
             logger.error(f"Error processing query {query_id}: {e}")
             raise # Re-raise to be caught by the FastAPI router
 
+    async def process_structured(
+        self,
+        structured: StructuredQuery,
+        query: Optional[str] = None,
+        query_id: Optional[str] = None
+    ) -> AnalyticsResponse:
+        """Run a structured query and return its rows as data_points"""
+
+        query_id = query_id or str(uuid.uuid4())
+        start_time = time.perf_counter()
+
+        with span("structured.query") as attributes:
+            rows, source = await run_structured_query(structured)
+            attributes.update(source=source, rows=len(rows))
+        logger.info(f"Structured query {query_id} answered from {source} with {len(rows)} rows")
+
+        return AnalyticsResponse(
+            query_id=query_id,
+            query=query or describe_structured_query(structured),
+            insights=summarize_rows(structured, rows),
+            data_points=rows,
+            execution_time=round(time.perf_counter() - start_time, 4)
+        )
+
 query_processor = QueryProcessor()
@@ -0,0 +1,308 @@
+import threading
+import time
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select
+from app.config import settings
+from app.core.logging import logger
+from app.database.engine import get_engine
+from app.tools.sql_tools import AGRI_CLIMATE_TABLE, get_data_generation
+
+DIMENSIONS = ("State", "Year", "Crop")
+
+MEASURES = {
+    "count": "number of rows",
+    "sum_production": "SUM(Production_MT)",
+    "avg_production": "AVG(Production_MT)",
+    "sum_rainfall": "SUM(Rainfall_mm)",
+    "avg_rainfall": "AVG(Rainfall_mm)",
+    "corr_production_rainfall": "Pearson correlation of Production_MT and Rainfall_mm",
+}
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+class Cuboid:
+    """
+    Group-by result for one subset of dimensions: dimension codes plus additive
+    sums per cell (counts, sums, and the cross products needed for correlation).
+    """
+
+    def __init__(self, dims: Tuple[str, ...], codes: Dict[str, np.ndarray], sums: Dict[str, np.ndarray]):
+        self.dims = dims
+        self.codes = codes
+        self.sums = sums
+
+    def __len__(self) -> int:
+        return len(self.sums["n"])
+
+
+def _group(dims: Sequence[str], codes: Dict[str, np.ndarray], sizes: Dict[str, int], sums: Dict[str, np.ndarray]) -> Cuboid:
+    """Re-aggregates rows (base rows or finer cuboid cells) onto `dims`."""
+    length = len(sums["n"])
+    if not dims:
+        return Cuboid((), {}, {name: np.array([values.sum()]) for name, values in sums.items()})
+    if length == 0:
+        return Cuboid(tuple(dims), {d: np.empty(0, dtype=np.int64) for d in dims}, {k: np.empty(0) for k in sums})
+
+    keys = np.ravel_multi_index([codes[d] for d in dims], [sizes[d] for d in dims])
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    group_codes = np.unravel_index(unique_keys, [sizes[d] for d in dims])
+    grouped = {name: np.bincount(inverse, weights=values, minlength=len(unique_keys)) for name, values in sums.items()}
+    return Cuboid(tuple(dims), dict(zip(dims, group_codes)), grouped)
+
+
+@dataclass(frozen=True)
+class RollupSnapshot:
+    """Everything one build produced; replaced as a whole, never modified."""
+
+    generation: int
+    rows: int
+    build_ms: float
+    dictionaries: Dict[str, List[Any]]
+    lookup: Dict[str, Dict[Any, int]]
+    folded: Dict[str, Dict[str, Any]]
+    sizes: Dict[str, int]
+    cuboids: Dict[frozenset, Cuboid]
+
+
+class RollupEngine:
+    """
+    In-memory columnar copy of agri_climate_data with every State/Year/Crop
+    rollup precomputed. Rebuilt whenever the table's load generation changes;
+    a rebuild swaps in a new snapshot, so readers never see a half-built one.
+    """
+
+    BATCH_ROWS = 50_000
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._snapshot: Optional[RollupSnapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[RollupSnapshot]:
+        """The current build; read it once per operation rather than reading attributes one by one."""
+        return self._snapshot
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def generation(self) -> Optional[int]:
+        snapshot = self._snapshot
+        return snapshot.generation if snapshot is not None else None
+
+    @property
+    def dictionaries(self) -> Dict[str, List[Any]]:
+        snapshot = self._snapshot
+        return snapshot.dictionaries if snapshot is not None else {d: [] for d in DIMENSIONS}
+
+    def _load_columns(self) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        engine = get_engine()
+        if engine is None:
+            raise RuntimeError("Database engine unavailable")
+
+        table = AGRI_CLIMATE_TABLE
+        statement = select(table.c.State, table.c.Year, table.c.Crop, table.c.Production_MT, table.c.Rainfall_mm)
+        batches: List[List[np.ndarray]] = [[] for _ in range(5)]
+        loaded = 0
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True, yield_per=self.BATCH_ROWS).execute(statement)
+            for partition in result.partitions(self.BATCH_ROWS):
+                loaded += len(partition)
+                if loaded > self.max_rows:
+                    raise OverflowError(f"agri_climate_data exceeds ROLLUP_MAX_ROWS ({self.max_rows})")
+                # Transposed per batch in C; NULL measures become NaN
+                for index, column in enumerate(zip(*partition)):
+                    batches[index].append(np.asarray(column, dtype=np.float64 if index >= 3 else object))
+        columns = [
+            np.concatenate(parts) if parts else np.empty(0, dtype=np.float64 if index >= 3 else object)
+            for index, parts in enumerate(batches)
+        ]
+        return dict(zip(DIMENSIONS, columns[:3])), columns[3], columns[4]
+
+    def refresh(self) -> bool:
+        """
+        Reloads the base columns and recomputes all 2^3 cuboids. A full rebuild:
+        loads upsert rows in place and the table tracks no changed-row marker,
+        so there is no reliable delta to merge incrementally.
+        """
+        with self._lock:
+            generation = get_data_generation()
+            if generation == self.generation:
+                return True
+
+            start = time.perf_counter()
+            try:
+                raw_dims, production, rainfall = self._load_columns()
+            except Exception as e:
+                logger.warning(f"Rollup engine refresh skipped: {e}")
+                return False
+
+            dictionaries, lookup, codes, sizes = {}, {}, {}, {}
+            for dim in DIMENSIONS:
+                values, inverse = np.unique(raw_dims[dim], return_inverse=True)
+                dictionaries[dim] = values.tolist()
+                lookup[dim] = {value: i for i, value in enumerate(dictionaries[dim])}
+                codes[dim] = inverse.astype(np.int64)
+                sizes[dim] = max(len(values), 1)
+
+            p, r = production, rainfall
+            has_p, has_r = ~np.isnan(p), ~np.isnan(r)
+            pair = has_p & has_r
+            p0, r0 = np.where(has_p, p, 0.0), np.where(has_r, r, 0.0)
+            pp, rp = np.where(pair, p0, 0.0), np.where(pair, r0, 0.0)
+            base = {
+                "n": np.ones(len(p)),
+                "n_p": has_p.astype(np.float64), "s_p": p0,
+                "n_r": has_r.astype(np.float64), "s_r": r0,
+                "n_pr": pair.astype(np.float64), "s_pr_p": pp, "s_pr_r": rp,
+                "s_pp": pp * pp, "s_rr": rp * rp, "s_pr": pp * rp,
+            }
+
+            # Finest cuboid from the base rows, every coarser one from the finest
+            finest = _group(DIMENSIONS, codes, sizes, base)
+            cuboids = {frozenset(DIMENSIONS): finest}
+            for size in range(len(DIMENSIONS)):
+                for dims in combinations(DIMENSIONS, size):
+                    cuboids[frozenset(dims)] = _group(dims, finest.codes, sizes, finest.sums)
+
+            snapshot = RollupSnapshot(
+                generation=generation,
+                rows=len(p),
+                build_ms=(time.perf_counter() - start) * 1000,
+                dictionaries=dictionaries,
+                lookup=lookup,
+                folded={d: {str(v).lower(): v for v in dictionaries[d]} for d in DIMENSIONS},
+                sizes=sizes,
+                cuboids=cuboids,
+            )
+            # One reference assignment: queries see the old build or the new one, never a mix
+            self._snapshot = snapshot
+            logger.info(f"Rollup engine built from {snapshot.rows} rows ({len(finest)} cells) in {snapshot.build_ms:.1f}ms")
+            return True
+
+    def ensure_fresh(self) -> bool:
+        if self.generation == get_data_generation():
+            return True
+        return self.refresh()
+
+    @staticmethod
+    def _filter_codes(snapshot: RollupSnapshot, dim: str, values: Iterable[Any]) -> np.ndarray:
+        lookup = snapshot.lookup[dim]
+        wanted = []
+        for value in values:
+            if dim == "Year":
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Year filter must be an integer, got {value!r}")
+            else:
+                # Case-insensitive match on State/Crop names
+                value = snapshot.folded[dim].get(str(value).strip().lower(), value)
+            if value in lookup:
+                wanted.append(lookup[value])
+        return np.asarray(wanted, dtype=np.int64)
+
+    def query(
+        self,
+        group_by: Sequence[str],
+        measures: Sequence[str],
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = True,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Answers a group-by over State/Year/Crop from the precomputed cuboids."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("Rollup engine has not been built yet")
+
+        group_by = list(dict.fromkeys(group_by))
+        filters = {k: v for k, v in (filters or {}).items() if v not in (None, "", [])}
+        for dim in [*group_by, *filters]:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dim!r}; expected one of {', '.join(DIMENSIONS)}")
+        for measure in measures:
+            if measure not in MEASURES:
+                raise ValueError(f"Unknown measure {measure!r}; expected one of {', '.join(MEASURES)}")
+
+        # Smallest precomputed cuboid that still carries every grouped or filtered dimension
+        cuboid = snapshot.cuboids[frozenset([*group_by, *filters])]
+        mask = np.ones(len(cuboid), dtype=bool)
+        for dim, values in filters.items():
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            mask &= np.isin(cuboid.codes[dim], self._filter_codes(snapshot, dim, values))
+
+        codes = {d: c[mask] for d, c in cuboid.codes.items()}
+        sums = {k: v[mask] for k, v in cuboid.sums.items()}
+        if set(cuboid.dims) == set(group_by):
+            result = Cuboid(cuboid.dims, codes, sums)
+        else:
+            # Filtered on a dimension that isn't grouped: roll the matching cells up
+            result = _group(group_by, codes, snapshot.sizes, sums)
+
+        columns = self._measures(result.sums, measures)
+        rows = []
+        for i in range(len(result)):
+            if result.sums["n"][i] == 0:
+                continue
+            row = {dim: snapshot.dictionaries[dim][int(result.codes[dim][i])] for dim in group_by}
+            for measure in measures:
+                value = columns[measure][i]
+                row[measure] = None if np.isnan(value) else (int(value) if measure == "count" else round(float(value), 4))
+            rows.append(row)
+
+        if order_by:
+            if order_by not in (*group_by, *measures):
+                raise ValueError("order_by must be one of the grouped dimensions or requested measures")
+            present = [row for row in rows if row[order_by] is not None]
+            missing = [row for row in rows if row[order_by] is None]
+            rows = sorted(present, key=lambda row: row[order_by], reverse=descending) + missing
+        else:
+            rows.sort(key=lambda row: tuple(row[d] for d in group_by))
+        return rows[:limit] if limit else rows
+
+    @staticmethod
+    def _measures(sums: Dict[str, np.ndarray], measures: Sequence[str]) -> Dict[str, np.ndarray]:
+        out = {}
+        for measure in measures:
+            if measure == "count":
+                out[measure] = sums["n"]
+            elif measure == "sum_production":
+                out[measure] = np.where(sums["n_p"] > 0, sums["s_p"], np.nan)
+            elif measure == "avg_production":
+                out[measure] = _divide(sums["s_p"], sums["n_p"])
+            elif measure == "sum_rainfall":
+                out[measure] = np.where(sums["n_r"] > 0, sums["s_r"], np.nan)
+            elif measure == "avg_rainfall":
+                out[measure] = _divide(sums["s_r"], sums["n_r"])
+            elif measure == "corr_production_rainfall":
+                n = sums["n_pr"]
+                cov = sums["s_pr"] - _divide(sums["s_pr_p"] * sums["s_pr_r"], n)
+                var_p = sums["s_pp"] - _divide(sums["s_pr_p"] ** 2, n)
+                var_r = sums["s_rr"] - _divide(sums["s_pr_r"] ** 2, n)
+                denominator = np.sqrt(np.clip(var_p, 0, None) * np.clip(var_r, 0, None))
+                # Needs at least two paired rows and non-constant inputs
+                out[measure] = np.where((n >= 2) & (denominator > 1e-12), _divide(cov, denominator), np.nan)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "ready": snapshot is not None,
+            "generation": snapshot.generation if snapshot else None,
+            "rows": snapshot.rows if snapshot else 0,
+            "cells": len(snapshot.cuboids[frozenset(DIMENSIONS)]) if snapshot else 0,
+            "build_ms": round(snapshot.build_ms, 2) if snapshot else 0.0,
+        }
+
+
+rollup_engine = RollupEngine(settings.ROLLUP_MAX_ROWS) if settings.ROLLUP_ENGINE_ENABLED else None
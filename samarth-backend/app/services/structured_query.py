@@ -0,0 +1,147 @@
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Select, func, select
+from app.core.concurrency import run_blocking
+from app.core.logging import logger
+from app.database.engine import get_engine, readonly_connection
+from app.models.request_models import RangeFilter, StructuredQuery
+from app.services.rollup_engine import DIMENSIONS, MEASURES, rollup_engine
+from app.tools.sql_tools import AGRI_CLIMATE_TABLE, get_data_generation
+
+_table = AGRI_CLIMATE_TABLE
+
+MEASURE_EXPRESSIONS = {
+    "count": lambda: func.count(),
+    "sum_production": lambda: func.sum(_table.c.Production_MT),
+    "avg_production": lambda: func.avg(_table.c.Production_MT),
+    "sum_rainfall": lambda: func.sum(_table.c.Rainfall_mm),
+    "avg_rainfall": lambda: func.avg(_table.c.Rainfall_mm),
+    "corr_production_rainfall": lambda: func.corr(_table.c.Production_MT, _table.c.Rainfall_mm),
+}
+
+
+def compile_structured_query(query: StructuredQuery) -> Select:
+    """Compiles a StructuredQuery to a parameterized SELECT; every filter value is a bound parameter."""
+    columns = [_table.c[d].label(d) for d in query.dimensions]
+    columns += [MEASURE_EXPRESSIONS[m]().label(m) for m in query.measures]
+    statement = select(*columns).select_from(_table)
+
+    for name, value in query.filters.items():
+        column = _table.c[name]
+        if isinstance(value, RangeFilter):
+            if value.gte is not None:
+                statement = statement.where(column >= value.gte)
+            if value.lte is not None:
+                statement = statement.where(column <= value.lte)
+        elif isinstance(value, list):
+            statement = statement.where(column.in_(value))
+        else:
+            statement = statement.where(column == value)
+
+    if query.dimensions:
+        statement = statement.group_by(*[_table.c[d] for d in query.dimensions])
+
+    if query.order_by:
+        if query.order_by not in (*query.dimensions, *query.measures):
+            raise ValueError("order_by must be one of the requested dimensions or measures")
+        order = columns[[*query.dimensions, *query.measures].index(query.order_by)]
+        statement = statement.order_by(order.desc().nulls_last() if query.descending else order.asc().nulls_last())
+    elif query.dimensions:
+        statement = statement.order_by(*[_table.c[d] for d in query.dimensions])
+
+    return statement.limit(query.limit)
+
+
+def _rollup_filters(query: StructuredQuery) -> Optional[Dict[str, Any]]:
+    """Filters in the shape the rollup engine accepts, or None if it can't answer them."""
+    if rollup_engine is None:
+        return None
+    filters = {}
+    for name, value in query.filters.items():
+        if name not in DIMENSIONS:
+            return None
+        if isinstance(value, RangeFilter):
+            if name != "Year":
+                return None
+            # Expand a year range over the years actually present
+            value = [
+                year for year in rollup_engine.dictionaries["Year"]
+                if (value.gte is None or year >= value.gte) and (value.lte is None or year <= value.lte)
+            ]
+        if value == []:
+            # The rollup engine treats an empty filter as "no filter"; let SQL return nothing instead
+            return None
+        filters[name] = value
+    return filters
+
+
+def _round(value: Any) -> Any:
+    return round(float(value), 4) if isinstance(value, (float, Decimal)) else value
+
+
+def _run_sql(query: StructuredQuery) -> List[Dict[str, Any]]:
+    engine = get_engine()
+    if engine is None:
+        raise RuntimeError("PostgreSQL connection failed. Check config and server status.")
+    statement = compile_structured_query(query)
+    with readonly_connection(engine) as connection:
+        result = connection.execute(statement)
+        columns = list(result.keys())
+        return [dict(zip(columns, (_round(v) for v in row))) for row in result]
+
+
+async def run_structured_query(query: StructuredQuery) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Executes a structured query, from the in-memory rollups when they cover it,
+    otherwise as parameterized SQL. Returns (rows, engine_used).
+    """
+    start = time.perf_counter()
+    filters = _rollup_filters(query)
+    if filters is not None and rollup_engine.generation == get_data_generation():
+        rows = rollup_engine.query(
+            group_by=query.dimensions,
+            measures=query.measures,
+            filters=filters,
+            order_by=query.order_by,
+            descending=query.descending,
+            limit=query.limit,
+        )
+        source = "rollup"
+    else:
+        rows = await run_blocking(_run_sql, query)
+        source = "sql"
+
+    logger.info(f"[STRUCTURED] {source}: {len(rows)} rows in {(time.perf_counter() - start) * 1000:.2f}ms")
+    return rows, source
+
+
+def describe_structured_query(query: StructuredQuery) -> str:
+    """Human-readable one-liner, used as the `query` field of structured responses."""
+    text = ", ".join(MEASURES[m] for m in query.measures)
+    if query.dimensions:
+        text += f" by {', '.join(query.dimensions)}"
+    if query.filters:
+        parts = []
+        for name, value in query.filters.items():
+            if isinstance(value, RangeFilter):
+                parts.append(f"{name} {value.gte if value.gte is not None else '...'}-{value.lte if value.lte is not None else '...'}")
+            else:
+                parts.append(f"{name}={', '.join(map(str, value)) if isinstance(value, list) else value}")
+        text += f" where {'; '.join(parts)}"
+    return text
+
+
+def summarize_rows(query: StructuredQuery, rows: List[Dict[str, Any]], max_rows: int = 10) -> str:
+    """Deterministic text summary for the `insights` field (no LLM involved)."""
+    if not rows:
+        return f"No data matched: {describe_structured_query(query)}."
+
+    lines = [f"{describe_structured_query(query)} ({len(rows)} rows):"]
+    for row in rows[:max_rows]:
+        label = ", ".join(str(row[d]) for d in query.dimensions) or "All data"
+        values = ", ".join(f"{m}={row[m]:,}" if isinstance(row[m], (int, float)) else f"{m}={row[m]}" for m in query.measures)
+        lines.append(f"- {label}: {values}")
+    if len(rows) > max_rows:
+        lines.append(f"... and {len(rows) - max_rows} more rows (see data_points).")
+    return "\n".join(lines)
@@ -0,0 +1,119 @@
+"""
+Compact encodings for tool results sent back to the model: a row-count line,
+then CSV with one header row and rounded numbers, instead of a JSON object
+(and every column name) per row.
+"""
+import csv
+import io
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.config import settings
+from app.core.telemetry import TOOL_OUTPUT_TOKENS
+from app.utils.serialization import dumps_compact
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+_ROWS_RE = re.compile(r"# rows: (\d+)")
+
+NUMERIC_TYPES = (int, float, Decimal)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough LLM token count (words, 3-digit number pieces, punctuation), for
+    comparing encodings without a tokenizer API call.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def _cell(value: Any, decimals: int) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (float, Decimal)):
+        value = round(float(value), decimals)
+        if value.is_integer() and abs(value) < 1e15:
+            return int(value)
+        return f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+def encode_table(columns: Sequence[str], rows: Sequence[Sequence[Any]], note: Optional[str] = None) -> str:
+    """CSV with a single header row, preceded by a `# note` line when given."""
+    decimals = settings.SQL_TOOL_DECIMALS
+    buffer = io.StringIO()
+    if note:
+        buffer.write(f"# {note}\n")
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows([_cell(value, decimals) for value in row] for row in rows)
+    return buffer.getvalue().rstrip("\n")
+
+
+def encode_records(records: List[Dict[str, Any]]) -> str:
+    """Encodes a list of dicts (e.g. rollup rows) in the configured tool format."""
+    if settings.SQL_TOOL_FORMAT == "json":
+        output = dumps_compact(records)
+    else:
+        columns = list(records[0]) if records else []
+        output = encode_table(columns, [[record.get(c) for c in columns] for record in records], f"rows: {len(records)}")
+    record_output_tokens(output, records)
+    return output
+
+
+def parse_row_count(output: str) -> Optional[int]:
+    """Row count from the `# rows: N` line of an encoded table, if there is one."""
+    match = _ROWS_RE.match(output)
+    return int(match.group(1)) if match else None
+
+
+def record_output_tokens(output: str, records: List[Dict[str, Any]]) -> None:
+    """Counts the tokens sent and what the same rows would cost as JSON objects."""
+    TOOL_OUTPUT_TOKENS.inc(estimate_tokens(output), format="sent")
+    TOOL_OUTPUT_TOKENS.inc(estimate_tokens(dumps_compact(records)), format="json_rows")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def summary_sql(query: str, columns: Sequence[str], sample: Sequence[Sequence[Any]], limit: int) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Builds a server-side summary of a result too large to list: row count
+    and min/max/mean of every numeric column, per value of the first text
+    column (or overall when there is none). Column kinds are inferred from
+    the sample rows. Returns (sql, group_column), or None when nothing
+    numeric can be summarized.
+    """
+    if len(set(columns)) != len(columns):
+        return None
+    numeric, text = [], []
+    for index, column in enumerate(columns):
+        values = [row[index] for row in sample if row[index] is not None]
+        if values and all(isinstance(v, NUMERIC_TYPES) and not isinstance(v, bool) for v in values):
+            numeric.append(column)
+        elif values and all(isinstance(v, str) for v in values):
+            text.append(column)
+    if not numeric:
+        return None
+
+    group = text[0] if text else None
+    measures = ['COUNT(*) AS "rows"']
+    for column in numeric:
+        quoted = _quote(column)
+        measures += [
+            f"MIN({quoted}) AS {_quote(column + '_min')}",
+            f"MAX({quoted}) AS {_quote(column + '_max')}",
+            f"AVG({quoted}) AS {_quote(column + '_mean')}",
+        ]
+    select = ", ".join(([_quote(group)] if group else []) + measures)
+    sql = f"SELECT {select} FROM ({query.strip().rstrip(';')}) AS _summarized"
+    if group:
+        sql += f' GROUP BY {_quote(group)} ORDER BY COUNT(*) DESC LIMIT {int(limit) + 1}'
+    return sql, group
@@ -0,0 +1,53 @@
+import time
+from typing import List
+from app.core.concurrency import run_blocking
+from app.core.logging import logger
+from app.services.rollup_engine import rollup_engine
+from app.tools.sql_tools import get_data_generation
+from app.tools.result_encoding import encode_records
+from app.utils.serialization import dumps_compact
+
+
+def _split(value: str) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def query_agri_rollup(group_by: str, measures: str, state: str = "", year: str = "", crop: str = "") -> str:
+    """
+    Fast pre-aggregated analytics over agri_climate_data, answered from memory without SQL.
+    Prefer this over execute_mock_sql for totals, averages and production/rainfall correlations
+    grouped by State, Year and/or Crop.
+
+    :param group_by: Comma-separated dimensions to group by: State, Year, Crop (empty for a grand total).
+    :param measures: Comma-separated measures: count, sum_production, avg_production, sum_rainfall, avg_rainfall, corr_production_rainfall.
+    :param state: Optional comma-separated State names to filter on.
+    :param year: Optional comma-separated years to filter on.
+    :param crop: Optional comma-separated Crop names to filter on.
+    :return: The result rows as CSV after a "# rows: N" line, or a JSON error message.
+    """
+    if rollup_engine is None or not rollup_engine.ensure_fresh():
+        return dumps_compact({"error": "Rollup engine unavailable; use execute_mock_sql instead."})
+
+    start = time.perf_counter()
+    try:
+        rows = rollup_engine.query(
+            group_by=_split(group_by),
+            measures=_split(measures) or ["count"],
+            filters={"State": _split(state), "Year": _split(year), "Crop": _split(crop)},
+        )
+    except ValueError as e:
+        return dumps_compact({"error": str(e)})
+
+    logger.info(f"[ROLLUP] {group_by or 'total'} -> {len(rows)} rows in {(time.perf_counter() - start) * 1e6:.0f}us")
+    return encode_records(rows)
+
+
+async def query_agri_rollup_async(**kwargs) -> str:
+    """Async variant; a stale engine rebuild reads the table, so it runs on the SQL thread pool."""
+    if rollup_engine is not None and rollup_engine.generation == get_data_generation():
+        return query_agri_rollup(**kwargs)
+    return await run_blocking(query_agri_rollup, **kwargs)
+
+
+# The tool object for the Gemini Agent
+ROLLUP_TOOL = query_agri_rollup
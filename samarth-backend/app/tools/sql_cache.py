@@ -0,0 +1,118 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.config import settings
+from app.tools import sql_guard
+
+# Comments, string literals, quoted identifiers, numbers, words, multi-char operators, single chars
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<op><>|!=|<=|>=|::|\|\||[^\sA-Za-z0-9_])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+def _canonical_tokens(query: str) -> str:
+    """Token-stream fallback for SQL sqlglot can't parse."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "comment":
+            continue
+        if kind == "word":
+            value = value.lower()
+        tokens.append(value)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def canonicalize_sql(query: str) -> str:
+    """
+    Canonical form of a SQL statement used as a cache key.
+
+    The statement is parsed and regenerated without comments, with identifiers
+    normalized the way Postgres resolves them: unquoted ones fold to lower
+    case, quoted identifiers and string literals keep their case. SQL that
+    doesn't parse (or a missing sqlglot) falls back to the token regex.
+    """
+    if sql_guard.load_parser():
+        try:
+            statement = sql_guard.sqlglot.parse_one(query, read="postgres")
+            return statement.sql(dialect="postgres", normalize=True, comments=False)
+        except sql_guard.sqlglot.errors.SqlglotError:
+            pass
+    return _canonical_tokens(query)
+
+
+def sql_fingerprint(query: str) -> str:
+    """Stable hash of the canonical statement, so formatting-only variants collide."""
+    return hashlib.sha256(canonicalize_sql(query).encode("utf-8")).hexdigest()
+
+
+class SQLResultCache:
+    """LRU cache of serialized tool results, bounded by total payload bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "db_time_ms": 0.0, "executions": 0}
+
+    def get(self, fingerprint: str, generation: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None or entry[0] != generation:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, fingerprint: str, generation: int, payload: str) -> None:
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(fingerprint, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[fingerprint] = (generation, payload, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats["evictions"] += 1
+
+    def record_execution(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self._stats["executions"] += 1
+            self._stats["db_time_ms"] += elapsed_ms
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._stats,
+                "db_time_ms": round(self._stats["db_time_ms"], 2),
+            }
+
+
+sql_result_cache = SQLResultCache(settings.SQL_CACHE_MAX_BYTES) if settings.SQL_CACHE_ENABLED else None
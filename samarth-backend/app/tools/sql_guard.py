@@ -0,0 +1,293 @@
+"""
+Pre-execution stage for model-generated SQL: parse, reject anything that is
+not a plain read, cap the rows the database produces, and rewrite GROUP BYs
+to the materialized aggregate views when that is equivalent.
+"""
+import json
+import threading
+from typing import FrozenSet, NamedTuple, Optional, Set, Tuple
+from app.core.logging import logger
+
+# Set by load_parser(): sqlglot costs ~100ms of cold-start import time, so it loads on first use
+sqlglot = exp = ParseError = None
+FORBIDDEN_NODES: tuple = ()
+_loaded = False
+_load_lock = threading.Lock()
+
+BASE_TABLE = "agri_climate_data"
+
+# Nodes that write, lock, change session state or run arbitrary commands
+FORBIDDEN_NODE_NAMES = (
+    "Insert", "Update", "Delete", "Merge", "Create", "Drop", "Alter", "Command", "Into", "Lock",
+    "Set", "TruncateTable", "Copy", "Grant", "Pragma", "Transaction", "Commit", "Rollback", "Use", "Analyze",
+)
+
+# Functions model SQL may call, as lower-case names without underscores (sqlglot's
+# function keys). Anything else, e.g. version(), pg_sleep() or dblink(), is rejected.
+ALLOWED_FUNCTIONS = frozenset({
+    # Aggregates
+    "count", "countif", "sum", "avg", "min", "max", "median", "mode", "stddev", "stddevpop", "stddevsamp",
+    "variance", "variancepop", "varpop", "varsamp", "corr", "covarpop", "covarsamp",
+    "percentilecont", "percentiledisc", "groupconcat", "stringagg", "arrayagg",
+    # Window functions
+    "rownumber", "rank", "denserank", "percentrank", "cumedist", "ntile", "lag", "lead",
+    "firstvalue", "lastvalue", "nthvalue",
+    # Arithmetic
+    "abs", "round", "ceil", "floor", "trunc", "sqrt", "pow", "power", "exp", "ln", "log", "log10", "mod",
+    "sign", "greatest", "least",
+    # Conditionals and casts
+    "case", "if", "coalesce", "nullif", "cast", "trycast",
+    # Text
+    "lower", "upper", "length", "trim", "substring", "concat", "concatws", "replace", "initcap",
+    "left", "right", "splitpart", "strposition", "pad",
+    # Dates
+    "extract", "datepart", "datetrunc", "timestamptrunc", "currentdate", "currenttimestamp",
+})
+
+# Aggregate views (see migrations/versions/0001): key columns and how base-table
+# aggregates map onto them. SUM and COUNT roll up from any subset of the key;
+# AVG only survives when grouping by the full key.
+VIEW_REWRITES = {
+    "agri_state_year_totals": {
+        "keys": frozenset({"State", "Year"}),
+        "sum": {"Production_MT": "Total_Production_MT"},
+        "count": "Crop_Count",
+        "avg": {"Rainfall_mm": "Avg_Rainfall_mm"},
+    },
+    "agri_crop_year_totals": {
+        "keys": frozenset({"Crop", "Year"}),
+        "sum": {"Production_MT": "Total_Production_MT"},
+        "count": "State_Count",
+        "avg": {"Rainfall_mm": "Avg_Rainfall_mm"},
+    },
+}
+
+
+def load_parser() -> bool:
+    """Imports sqlglot once; False when it is not installed (only the SELECT-prefix check applies)."""
+    global sqlglot, exp, ParseError, FORBIDDEN_NODES, _loaded
+    with _load_lock:
+        if not _loaded:
+            _loaded = True
+            try:
+                import sqlglot as module
+                from sqlglot.errors import ParseError as parse_error
+            except ImportError:
+                logger.warning("sqlglot is not installed; model SQL is only checked for a SELECT prefix")
+                return False
+            FORBIDDEN_NODES = tuple(getattr(module.exp, name) for name in FORBIDDEN_NODE_NAMES if hasattr(module.exp, name))
+            sqlglot, exp, ParseError = module, module.exp, parse_error
+    return sqlglot is not None
+
+
+class SQLRejectedError(ValueError):
+    """Model SQL that must not run; carries a short code and hint the model can act on."""
+
+    def __init__(self, code: str, message: str, hint: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+        self.hint = hint
+
+    def to_json(self) -> str:
+        error = {"error": str(self), "code": self.code}
+        if self.hint:
+            error["hint"] = self.hint
+        return json.dumps(error)
+
+
+class PreparedQuery(NamedTuple):
+    sql: str
+    # The same statement before the row cap, for server-side summaries of large results
+    uncapped_sql: str
+    # LIMIT was added or lowered: the database stops at row_limit + 1 rows and the full count is unknown
+    capped: bool
+    # Views the query was rewritten to read from
+    rewrites: Tuple[str, ...]
+
+
+def _arg(node, name: str):
+    # sqlglot renamed some args (from -> from_, with -> with_) across versions
+    return node.args.get(name) or node.args.get(f"{name}_")
+
+
+def _function_name(node) -> str:
+    name = node.name if isinstance(node, exp.Anonymous) else node.key
+    return name.lower().replace("_", "")
+
+
+def _column_sides(node) -> Set[str]:
+    return {column.table.lower() for column in node.find_all(exp.Column)}
+
+
+def _joins_columns(condition) -> bool:
+    """
+    True when a join condition ties columns of one side to columns of the
+    other (a.State = b.State), so it cannot degrade into a cartesian product
+    the way ON true, ON 1=1 or ON a.x = 5 do.
+    """
+    if isinstance(condition, exp.Paren):
+        return _joins_columns(condition.this)
+    if isinstance(condition, exp.And):
+        return _joins_columns(condition.left) or _joins_columns(condition.right)
+    if isinstance(condition, exp.Or):
+        return _joins_columns(condition.left) and _joins_columns(condition.right)
+    if isinstance(condition, (exp.EQ, exp.NullSafeEQ, exp.GT, exp.GTE, exp.LT, exp.LTE)):
+        left, right = _column_sides(condition.left), _column_sides(condition.right)
+        # Unqualified columns can't be attributed to a side; the database resolves them
+        return bool(left) and bool(right) and (left != right or "" in left)
+    return False
+
+
+def _check_read_only(root, allowed_tables: Set[str]) -> None:
+    for node in root.walk():
+        node = node[0] if isinstance(node, tuple) else node
+        if isinstance(node, FORBIDDEN_NODES):
+            raise SQLRejectedError("not_read_only", "Only read-only SELECT queries are allowed.")
+        if isinstance(node, exp.Func) and not isinstance(node, exp.Connector) and _function_name(node) not in ALLOWED_FUNCTIONS:
+            raise SQLRejectedError(
+                "forbidden_function",
+                f"Function {node.sql_name() if not isinstance(node, exp.Anonymous) else node.name}() is not allowed.",
+                "Use standard aggregate, window, arithmetic, text and date functions.",
+            )
+        if isinstance(node, (exp.Values, exp.Unnest, exp.Lateral)):
+            raise SQLRejectedError(
+                "unknown_table",
+                "Only tables, views and subqueries may appear in FROM and JOIN.",
+                f"Query {BASE_TABLE} or one of the aggregate views in the schema.",
+            )
+        if isinstance(node, exp.Table):
+            # Table functions (generate_series(...)) parse as tables without a name
+            if not isinstance(node.this, exp.Identifier) or (node.db and node.db.lower() != "public") \
+                    or node.name.lower() not in allowed_tables:
+                raise SQLRejectedError(
+                    "unknown_table",
+                    f"Table {node.sql()} is not available.",
+                    f"Query {BASE_TABLE} or one of the aggregate views in the schema.",
+                )
+        if isinstance(node, exp.Join):
+            condition = node.args.get("on")
+            if (node.args.get("kind") or "").upper() == "CROSS" or not (node.args.get("using") or (condition and _joins_columns(condition))):
+                raise SQLRejectedError(
+                    "cross_join",
+                    "Joins must match columns of both sides (no cartesian products).",
+                    "Use JOIN ... ON a.\"State\" = b.\"State\" (or USING) with the shared State/Year/Crop columns.",
+                )
+
+
+def _cap_rows(root, row_limit: int) -> bool:
+    """Adds or lowers the outermost LIMIT to row_limit + 1 (one extra row detects truncation)."""
+    cap = row_limit + 1
+    limit = root.args.get("limit")
+    if limit is not None:
+        count = limit.args.get("count") if isinstance(limit, exp.Fetch) else limit.expression
+        if isinstance(count, exp.Literal) and count.is_int and int(count.this) <= cap:
+            return False
+        root.set("limit", None)
+    root.set("limit", exp.Limit(expression=exp.Literal.number(cap)))
+    return True
+
+
+def _rewrite_aggregates(select, views: FrozenSet[str]) -> Optional[str]:
+    """
+    Points a GROUP BY over the base table at a matching aggregate view,
+    re-aggregating the view's columns. Returns the view used, or None when no
+    view is equivalent (the query is then left untouched).
+    """
+    if not isinstance(select, exp.Select) or select.args.get("joins") or _arg(select, "with") or select.args.get("distinct"):
+        return None
+    group = select.args.get("group")
+    source = _arg(select, "from")
+    if group is None or source is None or not isinstance(source.this, exp.Table) or source.this.name.lower() != BASE_TABLE:
+        return None
+    if any(select.find_all(exp.Subquery, exp.Window)):
+        return None
+    group_keys = {column.name for column in group.expressions if isinstance(column, exp.Column)}
+    if len(group_keys) != len(group.expressions):
+        return None
+    aliases = {expression.alias for expression in select.expressions if expression.alias}
+
+    aggregates = list(select.find_all(exp.AggFunc))
+    # Columns used outside aggregates must be view keys
+    plain: Set[str] = set()
+    for part in ("expressions", "where", "group", "having", "order"):
+        value = select.args.get(part)
+        for node in value if isinstance(value, list) else [value]:
+            if node is None:
+                continue
+            plain |= {c.name for c in node.find_all(exp.Column) if not c.find_ancestor(exp.AggFunc)}
+
+    # ORDER BY / HAVING may name select aliases
+    plain -= aliases
+    for view, mapping in VIEW_REWRITES.items():
+        if view not in views or not plain <= mapping["keys"]:
+            continue
+        replacements = []
+        for aggregate in aggregates:
+            target = aggregate.this
+            if isinstance(aggregate, exp.Count) and isinstance(target, exp.Star):
+                replacements.append((aggregate, exp.Sum(this=exp.column(mapping["count"], quoted=True))))
+            elif isinstance(aggregate, exp.Sum) and isinstance(target, exp.Column) and target.name in mapping["sum"]:
+                replacements.append((aggregate, exp.Sum(this=exp.column(mapping["sum"][target.name], quoted=True))))
+            elif (
+                isinstance(aggregate, exp.Avg) and isinstance(target, exp.Column)
+                and target.name in mapping["avg"] and group_keys == mapping["keys"]
+            ):
+                # One view row per group, so MAX just returns the view's average
+                replacements.append((aggregate, exp.Max(this=exp.column(mapping["avg"][target.name], quoted=True))))
+            else:
+                break
+        else:
+            for aggregate, replacement in replacements:
+                aggregate.replace(replacement)
+            source.this.replace(exp.to_table(view))
+            for column in select.find_all(exp.Column):
+                # Drop base-table aliases (a."State"): the view has its own name
+                column.set("table", None)
+            return view
+    return None
+
+
+def prepare_query(
+    query: str,
+    row_limit: int,
+    dialect: str = "postgresql",
+    views: FrozenSet[str] = frozenset(),
+    rewrite_aggregates: bool = True
+) -> PreparedQuery:
+    """
+    Validates and rewrites one model-generated statement.
+
+    :param dialect: SQLAlchemy dialect name of the target database; the SQL is read as Postgres.
+    :param views: aggregate views that exist in the target database.
+    :raises SQLRejectedError: when the statement must not run.
+    """
+    if not load_parser():
+        if not query.strip().upper().startswith("SELECT"):
+            raise SQLRejectedError("not_read_only", "Only SELECT queries are allowed.")
+        return PreparedQuery(query, query, False, ())
+
+    try:
+        statements = [statement for statement in sqlglot.parse(query, read="postgres") if statement is not None]
+    except ParseError as e:
+        detail = e.errors[0]["description"] if e.errors else str(e)
+        raise SQLRejectedError("parse_error", f"Could not parse the SQL: {detail}", "Send one PostgreSQL SELECT statement.")
+    if len(statements) != 1:
+        raise SQLRejectedError("multiple_statements", "Send exactly one SELECT statement.")
+
+    root = statements[0]
+    while isinstance(root, exp.Subquery):
+        root = root.this
+    if not isinstance(root, (exp.Select, exp.SetOperation)):
+        raise SQLRejectedError("not_read_only", "Only read-only SELECT queries are allowed.")
+
+    ctes = {cte.alias_or_name.lower() for cte in root.find_all(exp.CTE)}
+    _check_read_only(root, {BASE_TABLE, *(view.lower() for view in views), *ctes})
+
+    rewrites = ()
+    if rewrite_aggregates and views:
+        view = _rewrite_aggregates(root, views)
+        rewrites = (view,) if view else ()
+    write = "sqlite" if dialect == "sqlite" else "postgres"
+    uncapped_sql = root.sql(dialect=write)
+    capped = _cap_rows(root, row_limit)
+    return PreparedQuery(root.sql(dialect=write), uncapped_sql, capped, rewrites)
@@ -1,14 +1,61 @@
-import pandas as pd
+import asyncio
+import hashlib
 import json
-from sqlalchemy import create_engine, text
+import time
+from datetime import datetime
+from sqlalchemy import Column, Float, Index, Integer, MetaData, PrimaryKeyConstraint, String, Table, inspect, literal, select, text
 from sqlalchemy.exc import SQLAlchemyError
 from app.config import settings
 from app.core.logging import logger
-from typing import Dict, Any
+from app.core.concurrency import SingleFlight, run_blocking
+from app.core.telemetry import record_span
+from app.database.engine import (
+    QueryCostExceededError,
+    QueryResult,
+    get_async_engine,
+    get_engine,
+    run_readonly_query,
+    run_readonly_query_async,
+)
+from app.tools.sql_cache import sql_fingerprint, sql_result_cache
+from app.tools.result_encoding import encode_table, record_output_tokens, summary_sql
+from app.tools.sql_guard import PreparedQuery, SQLRejectedError, prepare_query
+from app.utils.serialization import dumps_compact
+from typing import FrozenSet, Optional, Tuple
 
 # --- CONFIGURATION ---
 TABLE_NAME = 'agri_climate_data'
-ENGINE = None 
+DATA_GENERATION = 0  # Data version of the table, adopted from the database; caches key on it
+_version_readable = True
+_views_checked: Optional[Tuple[int, FrozenSet[str]]] = None  # (generation, aggregate views that exist)
+# Identical SQL issued concurrently (batch items, parallel requests) runs once
+sql_single_flight = SingleFlight()
+
+# Mirrors migrations/versions/0001 (minus partitioning) so non-migrated databases
+# and SQLite get the same keys and indexes
+AGRI_CLIMATE_TABLE = Table(
+    TABLE_NAME,
+    MetaData(),
+    Column("State", String, nullable=False),
+    Column("Year", Integer, nullable=False),
+    Column("Crop", String, nullable=False),
+    Column("Production_MT", Float),
+    Column("Rainfall_mm", Float),
+    Column("Is_Drought_Resistant", Integer),
+    # Natural key of the table; ingestion upserts on it
+    PrimaryKeyConstraint("State", "Year", "Crop", name="pk_agri_climate_data"),
+    Index("ix_agri_climate_year_crop", "Year", "Crop"),
+)
+
+# Materialized views created by the migrations, with the hint shown to the model
+AGGREGATE_VIEWS = {
+    "agri_state_year_totals": "one row per State and Year: total production across crops, average rainfall, crop count",
+    "agri_crop_year_totals": "one row per Crop and Year: total production across states, average rainfall, state count",
+    "agri_state_rainfall_avg": "one row per State: average/min/max annual rainfall over all years",
+}
+COLUMN_NOTES = {
+    "Is_Drought_Resistant": "1 if crop requires little water, 0 otherwise.",
+}
 
 # Expanded Mock Data for cross-domain synthesis (The Unified Data Store)
 AGRI_CLIMATE_DATA = [
@@ -28,33 +75,109 @@ AGRI_CLIMATE_DATA = [
     {'State': 'Bihar', 'Year': 2019, 'Crop': 'Millet', 'Production_MT': 400, 'Rainfall_mm': 600, 'Is_Drought_Resistant': 1}, 
 ]
 
-def get_engine():
-    """Initializes and returns the SQLAlchemy engine for Postgres."""
-    global ENGINE
-    if ENGINE is None:
-        try:
-            # SQLAlchemy connects using the computed URL from config.py
-            ENGINE = create_engine(settings.DATABASE_URL)
-        except Exception as e:
-            logger.error(f"Failed to create PostgreSQL engine: {e}")
-            return None
-    return ENGINE
+# Seed bookkeeping lives in the ingestion watermark table; the version changes whenever the rows above do
+MOCK_RESOURCE_ID = "samarth-mock-seed"
+MOCK_DATA_VERSION = hashlib.sha1(json.dumps(AGRI_CLIMATE_DATA, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def get_data_generation() -> int:
+    """Returns the current load generation of the agri_climate_data table."""
+    return DATA_GENERATION
+
+def sync_data_generation() -> int:
+    """
+    Adopts the data version stored in the database. Every load advances it in
+    its own transaction, so loads by any process (CLI ingestion, other workers
+    or nodes) invalidate this worker's caches, with or without shared state.
+    """
+    global DATA_GENERATION, _version_readable
+    engine = get_engine()
+    if engine is None:
+        return DATA_GENERATION
+
+    # The loader imports this module, so its helpers are imported here
+    from app.ingestion.loader import read_data_version
+
+    try:
+        with engine.connect() as connection:
+            stored = read_data_version(connection)
+    except SQLAlchemyError as e:
+        # Warn once: the watermark table only exists after a seed or an ingestion
+        if _version_readable:
+            logger.warning(f"Could not read the data version, keeping generation {DATA_GENERATION}: {e}")
+        _version_readable = False
+        return DATA_GENERATION
+    _version_readable = True
+    if stored != DATA_GENERATION:
+        logger.info(f"Data generation {DATA_GENERATION} -> {stored}")
+        DATA_GENERATION = stored
+        if sql_result_cache is not None:
+            sql_result_cache.clear()
+    return DATA_GENERATION
+
+async def poll_data_generation() -> None:
+    """Background task: picks up data loaded by other processes every DATA_VERSION_POLL_SECONDS."""
+    while True:
+        await asyncio.sleep(settings.DATA_VERSION_POLL_SECONDS)
+        await run_blocking(sync_data_generation)
+
+def refresh_aggregate_views(connection) -> None:
+    """Refreshes the materialized aggregate views that exist (Postgres only)."""
+    if connection.dialect.name != "postgresql":
+        return
+    existing = set(inspect(connection).get_materialized_view_names())
+    for view in AGGREGATE_VIEWS:
+        if view in existing:
+            connection.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
 
 def setup_mock_database() -> bool:
-    """Initializes the PostgreSQL database with mock data on startup."""
+    """
+    Seeds the mock rows on startup, but only when the table is empty or holds
+    an older mock seed. Current seeds and ingested data are left untouched,
+    so a warm boot costs two small reads instead of a table rewrite.
+    """
     engine = get_engine()
     if engine is None:
         return False
-        
+
+    # The loader imports this module, so its table is imported here
+    from app.ingestion.loader import DATA_VERSION_ID, WATERMARK_TABLE, advance_data_version
+
+    watermarks = WATERMARK_TABLE
     try:
-        df = pd.DataFrame(AGRI_CLIMATE_DATA)
-        
-        # Use Pandas to write the DataFrame directly to the PostgreSQL table
-        with engine.connect() as connection:
-            df.to_sql(TABLE_NAME, connection, if_exists='replace', index=False)
-            connection.commit()
-            
-        logger.info(f"PostgreSQL table '{TABLE_NAME}' loaded with {len(df)} mock records.")
+        # The table is only created when missing, so the migrated
+        # (partitioned, indexed) schema is kept intact.
+        with engine.begin() as connection:
+            if connection.dialect.name == "postgresql":
+                # Workers booting together take turns; the loser sees the fresh seed and skips
+                connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": MOCK_RESOURCE_ID})
+            AGRI_CLIMATE_TABLE.create(connection, checkfirst=True)
+            watermarks.create(connection, checkfirst=True)
+
+            versions = dict(connection.execute(select(watermarks.c.resource_id, watermarks.c.source_version)).all())
+            seeded_version = versions.pop(MOCK_RESOURCE_ID, None)
+            versions.pop(DATA_VERSION_ID, None)
+            has_rows = connection.execute(select(literal(1)).select_from(AGRI_CLIMATE_TABLE).limit(1)).first() is not None
+            # Rows that aren't (only) a mock seed came from ingestion and are never replaced
+            if has_rows and (seeded_version == MOCK_DATA_VERSION or seeded_version is None or versions):
+                reason = "already seeded" if seeded_version == MOCK_DATA_VERSION else "holds ingested data"
+                logger.info(f"Skipping mock seed: '{TABLE_NAME}' {reason} (version {MOCK_DATA_VERSION}).")
+                return True
+
+            connection.execute(AGRI_CLIMATE_TABLE.delete())
+            connection.execute(AGRI_CLIMATE_TABLE.insert(), AGRI_CLIMATE_DATA)
+            refresh_aggregate_views(connection)
+            connection.execute(watermarks.delete().where(watermarks.c.resource_id == MOCK_RESOURCE_ID))
+            connection.execute(watermarks.insert().values(
+                resource_id=MOCK_RESOURCE_ID,
+                source_version=MOCK_DATA_VERSION,
+                records_done=len(AGRI_CLIMATE_DATA),
+                rows_loaded=len(AGRI_CLIMATE_DATA),
+                updated_at=datetime.utcnow(),
+            ))
+            advance_data_version(connection)
+
+        sync_data_generation()
+        logger.info(f"PostgreSQL table '{TABLE_NAME}' loaded with {len(AGRI_CLIMATE_DATA)} mock records (version {MOCK_DATA_VERSION}).")
         return True
     
     except SQLAlchemyError as e:
@@ -63,10 +186,8 @@ def setup_mock_database() -> bool:
     except Exception as e:
         logger.error(f"Unexpected error during mock DB setup: {e}")
         return False
-    
-def get_db_schema() -> str:
-    """Returns the SQL schema for the LLM's context (Postgres dialect)."""
-    return f"""
+
+STATIC_DB_SCHEMA = f"""
 CREATE TABLE {TABLE_NAME} (
     "State" VARCHAR,
     "Year" INTEGER,
@@ -79,38 +200,292 @@ CREATE TABLE {TABLE_NAME} (
 -- Contains unified data on crop production and corresponding annual rainfall by state and year.
 """
 
+def _quote_ident(name: str) -> str:
+    return f'"{name}"'
+
+def _describe_live_schema(engine) -> str:
+    """Builds the prompt schema from the database catalog: columns, keys, partitioning, indexes and aggregate views."""
+    inspector = inspect(engine)
+    if not inspector.has_table(TABLE_NAME):
+        raise LookupError(f"Table {TABLE_NAME} does not exist yet")
+
+    primary_key = inspector.get_pk_constraint(TABLE_NAME).get("constrained_columns") or []
+    entries = []
+    for column in inspector.get_columns(TABLE_NAME):
+        entry = f'    "{column["name"]}" {column["type"]}'
+        if not column.get("nullable", True):
+            entry += " NOT NULL"
+        note = COLUMN_NOTES.get(column["name"])
+        entries.append((entry, note))
+    if primary_key:
+        entries.append((f"    PRIMARY KEY ({', '.join(_quote_ident(c) for c in primary_key)})", None))
+
+    lines = [f"CREATE TABLE {TABLE_NAME} ("]
+    for i, (entry, note) in enumerate(entries):
+        comma = "," if i < len(entries) - 1 else ""
+        lines.append(f"{entry}{comma}" + (f"  -- {note}" if note else ""))
+
+    partition_key = None
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            partition_key = connection.execute(
+                text("SELECT pg_get_partkeydef(CAST(:name AS regclass))"), {"name": TABLE_NAME}
+            ).scalar()
+    lines.append(f") PARTITION BY {partition_key};" if partition_key else ");")
+    lines.append("-- Contains unified data on crop production and corresponding annual rainfall by state and year.")
+
+    for index in inspector.get_indexes(TABLE_NAME):
+        columns = ", ".join(_quote_ident(c) for c in index["column_names"] if c)
+        lines.append(f"CREATE INDEX {index['name']} ON {TABLE_NAME} ({columns});")
+    if primary_key:
+        lines.append(
+            f"-- Filters on {', '.join(_quote_ident(c) for c in primary_key)} (leading columns first) are index lookups;"
+            " prefer equality filters on these over functions of them."
+        )
+
+    views = []
+    if engine.dialect.name == "postgresql":
+        existing = set(inspector.get_materialized_view_names())
+        views = [view for view in AGGREGATE_VIEWS if view in existing]
+    if views:
+        lines.append("")
+        lines.append("-- Pre-aggregated materialized views, refreshed on every data load.")
+        lines.append("-- Prefer them over GROUP BY on the base table whenever they answer the question:")
+        for view in views:
+            columns = ", ".join(f'"{c["name"]}" {c["type"]}' for c in inspector.get_columns(view))
+            lines.append(f"CREATE MATERIALIZED VIEW {view} ({columns});  -- {AGGREGATE_VIEWS[view]}")
+
+    return "\n" + "\n".join(lines) + "\n"
+
+def get_db_schema(live: bool = True) -> str:
+    """Returns the SQL schema for the LLM's context (Postgres dialect), read from the live catalog when possible."""
+    if live:
+        engine = get_engine()
+        if engine is not None:
+            try:
+                return _describe_live_schema(engine)
+            except Exception as e:
+                logger.warning(f"Using static schema for the prompt, catalog unavailable: {e}")
+    return STATIC_DB_SCHEMA
+
+def _aggregate_views() -> FrozenSet[str]:
+    """Materialized aggregate views present in the database, looked up once per data generation."""
+    global _views_checked
+    generation = DATA_GENERATION
+    if _views_checked is not None and _views_checked[0] == generation:
+        return _views_checked[1]
+    views = frozenset()
+    engine = get_engine()
+    if engine is not None and engine.dialect.name == "postgresql":
+        try:
+            views = frozenset(set(inspect(engine).get_materialized_view_names()) & set(AGGREGATE_VIEWS))
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not list aggregate views, SQL rewrites disabled for now: {e}")
+    _views_checked = (generation, views)
+    return views
+
+def _prepare_query(query: str, dialect: str, views: FrozenSet[str]) -> PreparedQuery:
+    """Parses, validates and rewrites model SQL; raises SQLRejectedError for the model."""
+    start = time.perf_counter()
+    try:
+        prepared = prepare_query(
+            query,
+            settings.SQL_TOOL_ROW_LIMIT,
+            dialect=dialect,
+            views=views,
+            rewrite_aggregates=settings.SQL_REWRITE_AGGREGATES,
+        )
+    except SQLRejectedError as e:
+        record_span("sql.prepare", time.perf_counter() - start, rejected=e.code)
+        logger.info(f"[SQL] rejected ({e.code}): {e}")
+        raise
+    record_span("sql.prepare", time.perf_counter() - start, capped=prepared.capped, rewrites=len(prepared.rewrites))
+    if prepared.rewrites:
+        logger.info(f"[SQL] rewritten to read {', '.join(prepared.rewrites)}")
+    return prepared
+
+def _cache_lookup(query: str) -> Tuple[str, int, Optional[str]]:
+    """
+    Serve repeated (or formatting-only variant) queries from the result cache.
+    The generation is read before executing so a concurrent reload can't be cached as fresh.
+    """
+    start = time.perf_counter()
+    fingerprint = sql_fingerprint(query)
+    generation = DATA_GENERATION
+    cached = sql_result_cache.get(fingerprint, generation) if sql_result_cache is not None else None
+    record_span("sql.cache_lookup", time.perf_counter() - start, hit=cached is not None)
+    if cached is not None:
+        logger.info(f"[SQL] cache hit {fingerprint[:12]} in {(time.perf_counter() - start) * 1000:.2f}ms")
+    return fingerprint, generation, cached
+
+Summary = Tuple[QueryResult, Optional[str]]  # (summary rows, column they are grouped by)
+
+def _plan_summary(prepared: PreparedQuery, result: QueryResult) -> Optional[Tuple[str, Optional[str]]]:
+    """Summary SQL for a result with more rows than the model is shown, if one applies."""
+    columns, rows, total, _ = result
+    if not settings.SQL_TOOL_SUMMARIZE or settings.SQL_TOOL_FORMAT == "json" or total <= len(rows):
+        return None
+    return summary_sql(prepared.uncapped_sql, columns, rows, settings.SQL_TOOL_ROW_LIMIT)
+
+def _encode_result(result: QueryResult, capped: bool, summary: Optional[Summary]) -> str:
+    columns, rows, total, _ = result
+    row_limit = settings.SQL_TOOL_ROW_LIMIT
+
+    if settings.SQL_TOOL_FORMAT == "json":
+        output = dumps_compact([dict(zip(columns, row)) for row in rows])
+        if total > len(rows):
+            output += f"\n... (Truncated to first {row_limit}{' of ' + str(total) if not capped else ''} records)"
+        return output
+
+    if total <= len(rows):
+        return encode_table(columns, rows, f"rows: {total}")
+
+    if summary is not None:
+        (summary_columns, summary_rows, groups, _), group = summary
+        complete = groups <= len(summary_rows)
+        counts = summary_columns.index("rows")
+        matched = sum(int(row[counts]) for row in summary_rows) if complete else f"{row_limit}+"
+        scope = f"per {group}" if group else "overall"
+        if not complete:
+            scope += f" (largest {len(summary_rows)} groups)"
+        sample = rows[:settings.SQL_TOOL_SAMPLE_ROWS]
+        return (
+            encode_table(summary_columns, summary_rows, f"rows: {matched}; too many to list, summarized {scope}")
+            + f"\n# first {len(sample)} rows:\n"
+            + encode_table(columns, sample)
+        )
+
+    if capped:
+        # The database stopped at the injected LIMIT, so the full count was never computed
+        return encode_table(columns, rows, f"rows: {row_limit}+; listing the first {row_limit}. Aggregate or filter to see the rest")
+    return encode_table(columns, rows, f"rows: {total}; listing the first {row_limit}")
+
+def _finish_result(
+    fingerprint: str,
+    generation: int,
+    result: QueryResult,
+    capped: bool = False,
+    summary: Optional[Summary] = None
+) -> str:
+    """Encodes rows straight from the DB-API tuples and stores them in the cache."""
+    columns, rows, total, db_ms = result
+    start = time.perf_counter()
+
+    output = _encode_result(result, capped, summary)
+    record_output_tokens(output, [dict(zip(columns, row)) for row in rows])
+
+    serialize_ms = (time.perf_counter() - start) * 1000
+    record_span("sql.db", db_ms / 1000, rows=total)
+    if summary is not None:
+        db_ms += summary[0][3]
+        record_span("sql.db", summary[0][3] / 1000, rows=len(summary[0][1]), summary=True)
+    record_span("sql.serialize", serialize_ms / 1000, bytes=len(output))
+    logger.info(f"[SQL] executed {fingerprint[:12]}: {total} rows, db {db_ms:.2f}ms, serialize {serialize_ms:.2f}ms")
+    if sql_result_cache is not None:
+        sql_result_cache.record_execution(db_ms)
+        sql_result_cache.put(fingerprint, generation, output)
+    return output
+
+def _error_result(query: str, e: Exception) -> str:
+    # Rejections go back to the model as short structured errors, without echoing the query
+    if isinstance(e, SQLRejectedError):
+        return e.to_json()
+    if isinstance(e, QueryCostExceededError):
+        return SQLRejectedError(
+            "too_expensive",
+            f"{e}.",
+            "Filter on State/Year/Crop, aggregate, or query an aggregate view.",
+        ).to_json()
+    if isinstance(e, SQLAlchemyError):
+        return json.dumps({"error": f"PostgreSQL query error: {e.__class__.__name__}: {e}", "query_attempted": query})
+    return json.dumps({"error": f"An unexpected error occurred: {e}", "query_attempted": query})
+
 def execute_mock_sql(query: str) -> str:
     """
     The LLM's primary tool. Executes a read-only SQL query against Postgres. 
     
     :param query: The SQL SELECT query generated by the LLM (must be PostgreSQL syntax).
-    :return: The query result formatted as a JSON string, or an error message.
+    :return: The result as CSV after a "# rows: N" line (a per-group summary when there are
+        more rows than the limit), or a JSON error with a code and hint.
     """
     engine = get_engine()
     if engine is None:
         return json.dumps({"error": "PostgreSQL connection failed. Check config and server status."})
         
     try:
-        # Security check: only allow SELECT statements
-        if not query.strip().upper().startswith("SELECT"):
-            return json.dumps({"error": "Only SELECT queries are allowed."})
-            
-        # Execute the query using Pandas read_sql 
-        results_df = pd.read_sql(text(query), engine)
-        
-        # Convert DataFrame rows to list of dictionaries for the LLM
-        results = results_df.to_dict(orient='records')
-        
-        # Truncate large results to prevent context window overflow
-        if len(results) > 50:
-             return json.dumps(results[:50], indent=2) + f"\n... (Truncated to first 50 of {len(results)} records)"
+        # Only prepared (validated) queries are ever cached, so a hit needs no re-check
+        fingerprint, generation, cached = _cache_lookup(query)
+        if cached is not None:
+            return cached
+
+        prepared = _prepare_query(query, engine.dialect.name, _aggregate_views())
+        # Read-only transaction with statement_timeout, a plan cost budget and a server-side row cap
+        result = run_readonly_query(
+            engine,
+            prepared.sql,
+            settings.SQL_TOOL_ROW_LIMIT,
+            max_cost=settings.SQL_MAX_PLAN_COST,
+            count_total=not prepared.capped,
+        )
 
-        return json.dumps(results, indent=2)
+        summary = None
+        planned = _plan_summary(prepared, result)
+        if planned is not None:
+            try:
+                summary_rows = run_readonly_query(
+                    engine, planned[0], settings.SQL_TOOL_ROW_LIMIT, max_cost=settings.SQL_MAX_PLAN_COST, count_total=False
+                )
+                summary = (summary_rows, planned[1])
+            except Exception as e:
+                logger.info(f"[SQL] summary skipped, listing the first rows instead: {e}")
+        return _finish_result(fingerprint, generation, result, capped=prepared.capped, summary=summary)
     
-    except SQLAlchemyError as e:
-        return json.dumps({"error": f"PostgreSQL query error: {e.__class__.__name__}: {e}", "query_attempted": query})
     except Exception as e:
-        return json.dumps({"error": f"An unexpected error occurred: {e}", "query_attempted": query})
+        return _error_result(query, e)
+
+async def execute_mock_sql_async(query: str) -> str:
+    """
+    Async variant of the SQL tool. Uses the asyncpg engine when enabled,
+    otherwise runs the sync tool on the dedicated SQL thread pool. Concurrent
+    calls with the same (canonical) SQL share one execution.
+    """
+    result, _ = await sql_single_flight.run(sql_fingerprint(query), lambda: _execute_mock_sql_async(query))
+    return result
+
+async def _execute_mock_sql_async(query: str) -> str:
+    engine = get_async_engine()
+    if engine is None:
+        return await run_blocking(execute_mock_sql, query)
+
+    try:
+        fingerprint, generation, cached = _cache_lookup(query)
+        if cached is not None:
+            return cached
+
+        views = _views_checked[1] if _views_checked and _views_checked[0] == DATA_GENERATION else await run_blocking(_aggregate_views)
+        prepared = _prepare_query(query, engine.dialect.name, views)
+        result = await run_readonly_query_async(
+            engine,
+            prepared.sql,
+            settings.SQL_TOOL_ROW_LIMIT,
+            max_cost=settings.SQL_MAX_PLAN_COST,
+            count_total=not prepared.capped,
+        )
+
+        summary = None
+        planned = _plan_summary(prepared, result)
+        if planned is not None:
+            try:
+                summary_rows = await run_readonly_query_async(
+                    engine, planned[0], settings.SQL_TOOL_ROW_LIMIT, max_cost=settings.SQL_MAX_PLAN_COST, count_total=False
+                )
+                summary = (summary_rows, planned[1])
+            except Exception as e:
+                logger.info(f"[SQL] summary skipped, listing the first rows instead: {e}")
+        return _finish_result(fingerprint, generation, result, capped=prepared.capped, summary=summary)
+
+    except Exception as e:
+        return _error_result(query, e)
 
 # The actual tool object for the Gemini Agent
 SQL_TOOL = execute_mock_sql
@@ -0,0 +1,35 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is in requirements.txt; the stdlib encoder is a slower fallback for minimal installs
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encode DB-API types the JSON encoders don't know natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact JSON as bytes, ready to send as a response body."""
+    if orjson is not None:
+        # json.dumps accepts int keys; keep that working for response bodies
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_compact(obj: Any) -> str:
+    """Serialize to compact JSON (no indentation or padding), using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default).decode("utf-8")
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False)
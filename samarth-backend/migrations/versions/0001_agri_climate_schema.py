@@ -0,0 +1,122 @@
+"""Partitioned agri_climate_data with composite indexes and aggregate views
+
+Revision ID: 0001_agri_climate_schema
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_agri_climate_schema"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = '"State", "Year", "Crop", "Production_MT", "Rainfall_mm", "Is_Drought_Resistant"'
+# One partition per decade; anything outside lands in the default partition
+DECADES = range(1950, 2050, 10)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tables created earlier by pandas/SQLAlchemy are kept aside and copied over below
+    op.execute("ALTER TABLE IF EXISTS agri_climate_data RENAME TO agri_climate_data_legacy")
+    for index in ("pk_agri_climate_data", "ix_agri_climate_year_crop", "ux_agri_climate_state_year_crop"):
+        op.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_legacy")
+
+    op.create_table(
+        "agri_climate_data",
+        sa.Column("State", sa.String(), nullable=False),
+        sa.Column("Year", sa.Integer(), nullable=False),
+        sa.Column("Crop", sa.String(), nullable=False),
+        sa.Column("Production_MT", sa.Float(), nullable=True),
+        sa.Column("Rainfall_mm", sa.Float(), nullable=True),
+        sa.Column("Is_Drought_Resistant", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("State", "Year", "Crop", name="pk_agri_climate_data"),
+        postgresql_partition_by='RANGE ("Year")',
+    )
+    for start in DECADES:
+        op.execute(
+            f"CREATE TABLE agri_climate_data_{start}s PARTITION OF agri_climate_data "
+            f"FOR VALUES FROM ({start}) TO ({start + 10})"
+        )
+    op.execute("CREATE TABLE agri_climate_data_default PARTITION OF agri_climate_data DEFAULT")
+    # The primary key serves State/Year/Crop prefixes; this one serves year/crop filters across states
+    op.create_index("ix_agri_climate_year_crop", "agri_climate_data", ["Year", "Crop"])
+
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF to_regclass('agri_climate_data_legacy') IS NOT NULL THEN
+                INSERT INTO agri_climate_data ({COLUMNS})
+                SELECT DISTINCT ON ("State", "Year", "Crop") {COLUMNS}
+                FROM agri_climate_data_legacy
+                WHERE "State" IS NOT NULL AND "Year" IS NOT NULL AND "Crop" IS NOT NULL
+                ON CONFLICT DO NOTHING;
+                DROP TABLE agri_climate_data_legacy;
+            END IF;
+        END $$
+    """)
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW agri_state_year_totals AS
+        SELECT "State", "Year",
+               SUM("Production_MT") AS "Total_Production_MT",
+               AVG("Rainfall_mm") AS "Avg_Rainfall_mm",
+               COUNT(*) AS "Crop_Count"
+        FROM agri_climate_data
+        GROUP BY "State", "Year"
+    """)
+    op.execute("""
+        CREATE MATERIALIZED VIEW agri_crop_year_totals AS
+        SELECT "Crop", "Year",
+               SUM("Production_MT") AS "Total_Production_MT",
+               AVG("Rainfall_mm") AS "Avg_Rainfall_mm",
+               COUNT(*) AS "State_Count"
+        FROM agri_climate_data
+        GROUP BY "Crop", "Year"
+    """)
+    # Rainfall is repeated on every crop row, so average per state-year first
+    op.execute("""
+        CREATE MATERIALIZED VIEW agri_state_rainfall_avg AS
+        SELECT "State",
+               AVG(yearly."Rainfall_mm") AS "Avg_Rainfall_mm",
+               MIN(yearly."Rainfall_mm") AS "Min_Rainfall_mm",
+               MAX(yearly."Rainfall_mm") AS "Max_Rainfall_mm",
+               COUNT(*) AS "Years"
+        FROM (
+            SELECT "State", "Year", AVG("Rainfall_mm") AS "Rainfall_mm"
+            FROM agri_climate_data
+            GROUP BY "State", "Year"
+        ) AS yearly
+        GROUP BY "State"
+    """)
+    # Unique indexes allow REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.create_index("ux_agri_state_year_totals", "agri_state_year_totals", ["State", "Year"], unique=True)
+    op.create_index("ux_agri_crop_year_totals", "agri_crop_year_totals", ["Crop", "Year"], unique=True)
+    op.create_index("ux_agri_state_rainfall_avg", "agri_state_rainfall_avg", ["State"], unique=True)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+            resource_id VARCHAR PRIMARY KEY,
+            source_version VARCHAR NOT NULL,
+            records_done BIGINT NOT NULL,
+            rows_loaded BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS agri_state_rainfall_avg")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS agri_crop_year_totals")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS agri_state_year_totals")
+    op.drop_table("ingestion_watermarks")
+    # Dropping the parent drops every partition
+    op.drop_table("agri_climate_data")
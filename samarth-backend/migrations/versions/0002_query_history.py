@@ -0,0 +1,51 @@
+"""Query history and feedback tables
+
+Revision ID: 0002_query_history
+Revises: 0001_agri_climate_schema
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_query_history"
+down_revision: Union[str, Sequence[str], None] = "0001_agri_climate_schema"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "query_history",
+        sa.Column("query_id", sa.String(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("query", sa.Text(), nullable=False),
+        sa.Column("insights", sa.Text(), nullable=False),
+        sa.Column("data_points", sa.Text(), nullable=True),
+        sa.Column("execution_time", sa.Float(), nullable=True),
+        if_not_exists=True,
+    )
+    # Keyset pagination walks (created_at, query_id) newest first
+    op.create_index("ix_query_history_created", "query_history", ["created_at", "query_id"], if_not_exists=True)
+
+    op.create_table(
+        "query_feedback",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("query_id", sa.String(), nullable=False),
+        sa.Column("rating", sa.Integer(), nullable=False),
+        sa.Column("feedback", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index("ix_query_feedback_query", "query_feedback", ["query_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("query_feedback")
+    op.drop_table("query_history")
@@ -0,0 +1,13 @@
+"""
+Offline benchmarks for the analytics API.
+
+    python -m tests.benchmarks.run --rows 10k --workload mixed --concurrency 1,8,32
+    python -m tests.benchmarks.run --rows 1m --save-baseline
+    BENCH_ROWS=1m uvicorn tests.benchmarks.app:app --workers 4   # then: run --url http://127.0.0.1:8000
+    python -m tests.benchmarks.startup                          # cold-start profile
+    python -m tests.benchmarks.workers --workers 1,2,4          # multi-worker scaling, shared state
+    python -m tests.benchmarks.serialization --rows 1000,10000  # per-response encoding cost
+
+Gemini is replaced by FakeGenerativeModel (scripted function calls, simulated
+latency), so results measure this service rather than the model API.
+"""
@@ -0,0 +1,36 @@
+"""
+The real FastAPI app wired for benchmarking: Gemini swapped for the scripted
+fake and the database pointed at a synthetic dataset.
+
+Configured through the environment so it also works under
+`uvicorn tests.benchmarks.app:app --workers N`:
+
+    BENCH_ROWS            10k / 1m / 10m or a row count (default 10k)
+    BENCH_DATABASE_URL    load into this database instead of cached SQLite
+    BENCH_MODEL_LATENCY   seconds per fake model call (default 0.25)
+"""
+import os
+
+# Settings are read at import time, so these must be in place before any app import
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SEED_MOCK_DATA", "false")
+# The load generator is one client; keep admission in the path but never out of budget
+os.environ.setdefault("ADMISSION_BUCKET_CAPACITY", "1e12")
+os.environ.setdefault("ADMISSION_REFILL_PER_SECOND", "1e12")
+# Benchmarks measure the agent path; precomputed answers would skip it for repeated questions
+os.environ.setdefault("INSIGHTS_PRECOMPUTE_ENABLED", "false")
+
+import google.generativeai as genai
+from tests.benchmarks.fake_gemini import FakeGenerativeModel
+
+genai.GenerativeModel = FakeGenerativeModel
+FakeGenerativeModel.latency_seconds = float(os.getenv("BENCH_MODEL_LATENCY", FakeGenerativeModel.latency_seconds))
+
+import app.database.engine as database
+from tests.benchmarks.datasets import connect, parse_rows
+
+database.ENGINE = connect(parse_rows(os.getenv("BENCH_ROWS", "10k")), os.getenv("BENCH_DATABASE_URL"))
+
+from app.main import app  # noqa: E402
+
+__all__ = ["app"]
@@ -0,0 +1,195 @@
+import asyncio
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# One scripted turn is either a list of function calls or the final answer text
+Call = Tuple[str, Dict[str, str]]
+Turn = Union[List[Call], str]
+
+SQL = "execute_mock_sql"
+ROLLUP = "query_agri_rollup"
+
+
+def _scenarios(year: int, state: str, crop: str) -> List[List[Turn]]:
+    """Function-call sequences modelled on what Gemini does with the Samarth prompt."""
+    answer = (
+        f"In {year}, {state} produced the most {crop} among the states analysed. "
+        f"Production tracks rainfall closely: years with above-average rainfall show higher output, "
+        f"while drought-resistant crops hold up better in dry years. "
+        f"Recommend prioritising irrigation support where rainfall variability is highest."
+    )
+    return [
+        # One SQL query, then the answer
+        [
+            [(SQL, {"query": (
+                f'SELECT "State", SUM("Production_MT") AS total FROM agri_climate_data '
+                f'WHERE "Year" = {year} AND "Crop" = \'{crop}\' GROUP BY "State" ORDER BY total DESC'
+            )})],
+            answer,
+        ],
+        # Rollup engine lookup, then the answer
+        [
+            [(ROLLUP, {"group_by": "State", "measures": "sum_production,avg_rainfall", "year": str(year), "crop": crop})],
+            answer,
+        ],
+        # Two independent queries in one turn
+        [
+            [
+                (SQL, {"query": (
+                    f'SELECT "Year", AVG("Rainfall_mm") AS rain FROM agri_climate_data '
+                    f'WHERE "State" = \'{state}\' GROUP BY "Year" ORDER BY "Year"'
+                )}),
+                (ROLLUP, {"group_by": "Crop", "measures": "corr_production_rainfall", "state": state}),
+            ],
+            answer,
+        ],
+        # Drill-down over two turns
+        [
+            [(ROLLUP, {"group_by": "State", "measures": "sum_production", "year": str(year)})],
+            [(SQL, {"query": (
+                f'SELECT "Crop", "Production_MT", "Rainfall_mm" FROM agri_climate_data '
+                f'WHERE "State" = \'{state}\' AND "Year" BETWEEN {year - 4} AND {year}'
+            )})],
+            answer,
+        ],
+        # A wrong column name, corrected on the next turn
+        [
+            [(SQL, {"query": f'SELECT "State", SUM("Production") FROM agri_climate_data WHERE "Year" = {year} GROUP BY "State"'})],
+            [(SQL, {"query": (
+                f'SELECT "State", SUM("Production_MT") AS total FROM agri_climate_data '
+                f'WHERE "Year" = {year} GROUP BY "State" ORDER BY total DESC LIMIT 10'
+            )})],
+            answer,
+        ],
+    ]
+
+
+@dataclass
+class FakeFunctionCall:
+    name: str
+    args: Dict[str, Any]
+
+
+@dataclass
+class FakePart:
+    text: str = ""
+    function_call: Optional[FakeFunctionCall] = None
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+
+
+@dataclass
+class FakeChunk:
+    parts: List[FakePart]
+    usage_metadata: Optional[FakeUsage] = None
+
+    @property
+    def text(self) -> str:
+        if any(part.function_call for part in self.parts):
+            raise ValueError("response contains a function call")
+        return "".join(part.text for part in self.parts)
+
+    @property
+    def function_calls(self) -> List[FakeFunctionCall]:
+        return [part.function_call for part in self.parts if part.function_call]
+
+
+@dataclass
+class FakeStream:
+    chunks: List[FakeChunk]
+    chunk_delay: float
+    _index: int = field(default=0, init=False)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> FakeChunk:
+        if self._index >= len(self.chunks):
+            raise StopAsyncIteration
+        if self._index:
+            await asyncio.sleep(self.chunk_delay)
+        chunk = self.chunks[self._index]
+        self._index += 1
+        return chunk
+
+
+def _first_text(contents: Union[str, Sequence[Any]]) -> str:
+    if isinstance(contents, str):
+        return contents
+    first = contents[0]
+    parts = first.get("parts", []) if isinstance(first, dict) else [first]
+    return str(parts[0]) if parts else ""
+
+
+def _model_turns(contents: Union[str, Sequence[Any]]) -> int:
+    if isinstance(contents, str):
+        return 0
+    return sum(1 for item in contents if isinstance(item, dict) and item.get("role") == "model")
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel. Picks one of the scripted scenarios from
+    a hash of the question (so runs are reproducible), replays it turn by turn
+    based on how many model turns the conversation already holds, and streams
+    the final answer in chunks with configurable latency.
+    """
+
+    latency_seconds = 0.25
+    chunk_delay_seconds = 0.02
+    chunk_words = 6
+    calls = 0
+
+    def __init__(self, model_name: str = "fake-gemini", system_instruction: str = "", tools: Any = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ""
+        self.tools = tools
+
+    def _script(self, question: str) -> List[Turn]:
+        from tests.benchmarks.datasets import SYNTHETIC_CROPS, SYNTHETIC_STATES
+
+        seed = zlib.crc32(question.encode("utf-8"))
+        year = 2010 + seed % 10
+        state = SYNTHETIC_STATES[seed // 10 % len(SYNTHETIC_STATES)]
+        crop = SYNTHETIC_CROPS[seed // 160 % len(SYNTHETIC_CROPS)]
+        scenarios = _scenarios(year, state, crop)
+        return scenarios[seed // 1600 % len(scenarios)]
+
+    def _respond(self, contents, tool_config: Optional[Dict]) -> List[FakeChunk]:
+        script = self._script(_first_text(contents))
+        turn = min(_model_turns(contents), len(script) - 1)
+        step = script[turn]
+        wrap_up = (tool_config or {}).get("function_calling_config", {}).get("mode") == "NONE"
+        prompt_tokens = (len(self.system_instruction) + len(str(contents))) // 4
+
+        if isinstance(step, list) and not wrap_up:
+            parts = [FakePart(function_call=FakeFunctionCall(name, dict(args))) for name, args in step]
+            return [FakeChunk(parts, FakeUsage(prompt_tokens, 12 * len(parts)))]
+
+        text = script[-1]
+        words = text.split(" ")
+        pieces = [" ".join(words[i:i + self.chunk_words]) + " " for i in range(0, len(words), self.chunk_words)]
+        chunks = [FakeChunk([FakePart(text=piece)]) for piece in pieces]
+        chunks[-1].usage_metadata = FakeUsage(prompt_tokens, len(text) // 4)
+        return chunks
+
+    async def generate_content_async(
+        self,
+        contents,
+        generation_config: Any = None,
+        tool_config: Optional[Dict] = None,
+        stream: bool = False,
+        **kwargs
+    ):
+        FakeGenerativeModel.calls += 1
+        chunks = self._respond(contents, tool_config)
+        await asyncio.sleep(self.latency_seconds)
+        if stream:
+            return FakeStream(chunks, self.chunk_delay_seconds)
+        parts = [part for chunk in chunks for part in chunk.parts]
+        return FakeChunk(parts, chunks[-1].usage_metadata)
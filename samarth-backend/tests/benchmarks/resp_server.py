@@ -0,0 +1,142 @@
+"""
+Minimal single-process Redis-protocol server covering the commands the
+shared-state backend uses, for benchmarks on machines without Redis.
+
+    python -m tests.benchmarks.resp_server --port 6390
+    SHARED_STATE_BACKEND=redis SHARED_STATE_URL=redis://127.0.0.1:6390/0 ...
+
+Point SHARED_STATE_URL at a real Redis or Valkey server whenever one is available.
+"""
+import argparse
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Store:
+    def __init__(self):
+        self.values: Dict[bytes, Any] = {}
+        self.expiry: Dict[bytes, float] = {}
+
+    def _live(self, key: bytes) -> Optional[Any]:
+        if key in self.expiry and time.monotonic() >= self.expiry[key]:
+            self.values.pop(key, None)
+            del self.expiry[key]
+        return self.values.get(key)
+
+    def execute(self, name: bytes, args: List[bytes]) -> Any:
+        name = name.upper()
+        if name in (b"PING",):
+            return ("+", b"PONG")
+        if name in (b"AUTH", b"SELECT"):
+            return ("+", b"OK")
+        if name == b"GET":
+            value = self._live(args[0])
+            return value if value is None or isinstance(value, bytes) else str(value).encode()
+        if name == b"MGET":
+            values = [self._live(key) for key in args]
+            return [value if value is None or isinstance(value, bytes) else str(value).encode() for value in values]
+        if name == b"SET":
+            self.values[args[0]] = args[1]
+            self.expiry.pop(args[0], None)
+            if len(args) >= 4 and args[2].upper() == b"PX":
+                self.expiry[args[0]] = time.monotonic() + int(args[3]) / 1000
+            return ("+", b"OK")
+        if name == b"DEL":
+            removed = sum(1 for key in args if self.values.pop(key, None) is not None)
+            for key in args:
+                self.expiry.pop(key, None)
+            return removed
+        if name == b"INCRBY":
+            value = int(self._live(args[0]) or 0) + int(args[1])
+            self.values[args[0]] = value
+            return value
+        if name == b"PTTL":
+            if self._live(args[0]) is None:
+                return -2
+            return int((self.expiry[args[0]] - time.monotonic()) * 1000) if args[0] in self.expiry else -1
+        if name == b"PEXPIRE":
+            if self._live(args[0]) is None:
+                return 0
+            self.expiry[args[0]] = time.monotonic() + int(args[1]) / 1000
+            return 1
+        if name == b"LPUSH":
+            items = self._live(args[0])
+            if items is None:
+                items = self.values[args[0]] = deque()
+            for value in args[1:]:
+                items.appendleft(value)
+            return len(items)
+        if name == b"LTRIM":
+            items = self._live(args[0])
+            if items is not None:
+                start, stop = int(args[1]), int(args[2])
+                self.values[args[0]] = deque(list(items)[start:None if stop == -1 else stop + 1])
+            return ("+", b"OK")
+        if name == b"LRANGE":
+            items = list(self._live(args[0]) or [])
+            start, stop = int(args[1]), int(args[2])
+            return items[start:None if stop == -1 else stop + 1]
+        return ("-", b"ERR unknown command " + name)
+
+
+def _encode(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, tuple):
+        kind, payload = reply
+        return kind.encode() + payload + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[Tuple[bytes, List[bytes]]]:
+    header = await reader.readline()
+    if not header:
+        return None
+    parts = []
+    for _ in range(int(header[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        parts.append((await reader.readexactly(length + 2))[:-2])
+    return parts[0], parts[1:]
+
+
+async def serve(host: str, port: int) -> None:
+    store = Store()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    break
+                writer.write(_encode(store.execute(*command)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Minimal Redis-protocol server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+"""
+Load generator for /api/analytics/query.
+
+Runs the app in-process (or against --url), drives it with N concurrent
+clients per concurrency level, and reports latency percentiles, throughput,
+status codes and RSS. --save-baseline stores the results; later runs are
+compared against them and exit non-zero on a regression.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from app.ingestion.synthetic import SYNTHETIC_CROPS, SYNTHETIC_STATES
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+AGENT_QUESTIONS = [
+    "Explain why {crop} production in {state} changed around {year}",
+    "What is the impact of rainfall on {crop} output in {state}?",
+    "Suggest which crops {state} should prioritise after {year} given rainfall",
+    "Why did {state} see a shift in {crop} yields since {year}?",
+]
+STRUCTURED_QUESTIONS = [
+    "{crop} production by state in {year}",
+    "Top 5 states by average rainfall in {year}",
+    "Total {crop} production in {state} between {year} and {year_end}",
+    "Average rainfall by year in {state}",
+]
+
+
+def _questions(workload: str, count: int, offset: int = 0) -> List[str]:
+    """
+    Deterministic question mix. Each phase takes a different slice (offset), so
+    answer caching only helps when a run is long enough for questions to repeat.
+    """
+    templates = {
+        "agent": AGENT_QUESTIONS,
+        "structured": STRUCTURED_QUESTIONS,
+        "mixed": [q for pair in zip(AGENT_QUESTIONS, STRUCTURED_QUESTIONS) for q in pair],
+    }[workload]
+    questions = []
+    for i in range(offset, offset + count):
+        year = 2000 + i % 20
+        questions.append(templates[i % len(templates)].format(
+            crop=SYNTHETIC_CROPS[i % len(SYNTHETIC_CROPS)],
+            state=SYNTHETIC_STATES[i // len(templates) % len(SYNTHETIC_STATES)],
+            year=year,
+            year_end=year + 4,
+        ))
+    return questions
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def _run_level(client: httpx.AsyncClient, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    pending = iter(enumerate(questions))
+
+    async def worker():
+        for _, question in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/analytics/query", json={"query": question})
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+async def _benchmark(args: argparse.Namespace, levels: List[int]) -> List[Dict[str, Any]]:
+    results = []
+    warmup = _questions(args.workload, args.warmup)
+
+    async def drive(client: httpx.AsyncClient, model_calls=lambda: None, prompt_tokens=lambda: None):
+        if warmup:
+            await _run_level(client, warmup, max(levels))
+        for index, level in enumerate(levels):
+            calls_before, tokens_before = model_calls(), prompt_tokens()
+            measured = _questions(args.workload, args.requests, offset=args.warmup + index * args.requests)
+            result = await _run_level(client, measured, level)
+            result["rss_mb"] = round(_rss_mb(), 1)
+            if calls_before is not None:
+                result["model_calls"] = model_calls() - calls_before
+                # Tool results are resent as prompt tokens on every following turn
+                result["prompt_tokens"] = int(prompt_tokens() - tokens_before)
+            results.append(result)
+            _print_result(result)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            await drive(client)
+        return results
+
+    from tests.benchmarks.app import app
+    from tests.benchmarks.fake_gemini import FakeGenerativeModel
+    from app.core.telemetry import GEMINI_TOKENS
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            await drive(client, lambda: FakeGenerativeModel.calls, lambda: GEMINI_TOKENS.value(kind="prompt"))
+    return results
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    statuses = " ".join(f"{code}={count}" for code, count in result["statuses"].items())
+    print(
+        f"c={result['concurrency']:<4} n={result['requests']:<5} "
+        f"p50={result['p50_ms']:>8.1f}ms p95={result['p95_ms']:>8.1f}ms p99={result['p99_ms']:>8.1f}ms "
+        f"max={result['max_ms']:>8.1f}ms {result['throughput_rps']:>7.1f} req/s "
+        f"rss={result['rss_mb']:.0f}MB [{statuses}]"
+        + (f" model_calls={result['model_calls']}" if "model_calls" in result else "")
+        + (f" prompt_tokens={result['prompt_tokens']}" if "prompt_tokens" in result else ""),
+        flush=True,
+    )
+
+
+def _baseline_path(workload: str, rows: str, concurrency: int) -> Path:
+    return BASELINE_DIR / f"{workload}-{rows}-c{concurrency}.json"
+
+
+def _compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regressions beyond the allowed fraction; lower is better for latency, higher for throughput."""
+    failures = []
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        if baseline.get(key) and result[key] > baseline[key] * (1 + max_regression):
+            failures.append(f"{key} {baseline[key]} -> {result[key]}")
+    if baseline.get("throughput_rps") and result["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        failures.append(f"throughput_rps {baseline['throughput_rps']} -> {result['throughput_rps']}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark /api/analytics/query")
+    parser.add_argument("--rows", default="10k", help="dataset size: 10k, 1m, 10m or a row count")
+    parser.add_argument("--database-url", help="Postgres (or other) database to load the dataset into")
+    parser.add_argument("--workload", choices=["agent", "structured", "mixed"], default="mixed")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, help="seconds per fake Gemini call")
+    parser.add_argument("--no-caches", action="store_true", help="disable the answer and SQL caches")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="allowed fraction worse than baseline")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    # Read by the app's settings and tests.benchmarks.app at import time
+    os.environ["BENCH_ROWS"] = args.rows
+    if args.database_url:
+        os.environ["BENCH_DATABASE_URL"] = args.database_url
+    if args.model_latency is not None:
+        os.environ["BENCH_MODEL_LATENCY"] = str(args.model_latency)
+    if args.no_caches:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+        os.environ["SQL_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    print(f"workload={args.workload} rows={args.rows} python={platform.python_version()} target={args.url or 'in-process'}")
+    results = asyncio.run(_benchmark(args, levels))
+
+    failures = []
+    for result in results:
+        path = _baseline_path(args.workload, args.rows, result["concurrency"])
+        if args.save_baseline:
+            BASELINE_DIR.mkdir(exist_ok=True)
+            path.write_text(json.dumps(result, indent=2) + "\n")
+            continue
+        if path.exists():
+            regressions = _compare(result, json.loads(path.read_text()), args.max_regression)
+            failures += [f"c={result['concurrency']}: {message}" for message in regressions]
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2) + "\n")
+    if args.save_baseline:
+        print(f"Baselines saved to {BASELINE_DIR}")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
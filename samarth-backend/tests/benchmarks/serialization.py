@@ -0,0 +1,155 @@
+"""
+Per-request serialization cost of AnalyticsResponse bodies with large
+data_points: FastAPI's response_model path (re-validation, jsonable_encoder,
+JSONResponse) plus the old deep-copying history record, against the
+serialize-once path (to_json() reused for the history row).
+
+    python -m tests.benchmarks.serialization --rows 100,1000,10000
+
+Each request goes through a minimal FastAPI app called directly over ASGI;
+the "noop" column is that harness's own cost with an empty body.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from fastapi import FastAPI
+from starlette.responses import JSONResponse, Response
+
+from app.core.telemetry import encoded_response
+from app.models.response_models import AnalyticsResponse
+from app.utils.serialization import dumps_compact
+
+STATES = ["Punjab", "Bihar", "Kerala", "Maharashtra", "Uttar Pradesh", "West Bengal", "Madhya Pradesh"]
+CROPS = ["Rice", "Wheat", "Maize", "Cotton", "Sugarcane"]
+
+
+def _rows(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "State": rng.choice(STATES),
+            "Year": 2000 + index % 24,
+            "Crop": rng.choice(CROPS),
+            "Production_MT": round(rng.uniform(1e3, 1e7), 2),
+            "Rainfall_mm": round(rng.uniform(200, 3000), 2),
+            "Is_Drought_Resistant": rng.random() < 0.3,
+        }
+        for index in range(count)
+    ]
+
+
+def _app(holder: Dict[str, AnalyticsResponse]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/noop")
+    async def noop():
+        return Response(b"{}", media_type="application/json")
+
+    @app.get("/legacy", response_model=AnalyticsResponse, response_class=JSONResponse)
+    async def legacy():
+        response = holder["response"]
+        # What HistoryStore.record used to do: a deep copy, then its own encode
+        item = response.model_dump()
+        dumps_compact(item["data_points"])
+        return response
+
+    @app.get("/encoded", response_model=AnalyticsResponse)
+    async def encoded():
+        response = holder["response"]
+        # HistoryStore.record now: a shallow dict and the shared data_points encoding
+        dict(response)
+        response.data_points_json()
+        return encoded_response(response)
+
+    return app
+
+
+async def _call(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "http_version": "1.1", "scheme": "http",
+        "server": ("bench", 80), "client": ("127.0.0.1", 1),
+    }
+    chunks: List[bytes] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(chunks)
+
+
+async def _measure(rows: int, iterations: int) -> Dict[str, Any]:
+    data_points = _rows(rows)
+    holder: Dict[str, AnalyticsResponse] = {}
+    app = _app(holder)
+
+    def fresh() -> AnalyticsResponse:
+        return AnalyticsResponse(
+            query_id="bench", query="benchmark question", insights="insights",
+            data_points=data_points, execution_time=0.1,
+        )
+
+    holder["response"] = fresh()
+    legacy_body = json.loads(await _call(app, "/legacy"))
+    holder["response"] = fresh()
+    encoded_body = json.loads(await _call(app, "/encoded"))
+    # Timestamps differ: every instance gets its own
+    legacy_body.pop("timestamp"), encoded_body.pop("timestamp")
+    if legacy_body != encoded_body:
+        raise AssertionError("/encoded body differs from the FastAPI-serialized body")
+
+    timings: Dict[str, List[float]] = {"noop": [], "legacy": [], "encoded": []}
+    size = 0
+    for _ in range(iterations):
+        for path in timings:
+            # A new instance per request, so nothing encoded by an earlier request is reused
+            holder["response"] = fresh()
+            start = time.perf_counter()
+            body = await _call(app, f"/{path}")
+            timings[path].append((time.perf_counter() - start) * 1000)
+            size = max(size, len(body))
+
+    result = {name: round(statistics.median(values), 3) for name, values in timings.items()}
+    result.update(rows=rows, body_kb=round(size / 1024, 1))
+    result["speedup"] = round((result["legacy"] - result["noop"]) / max(result["encoded"] - result["noop"], 1e-3), 1)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-request response serialization cost")
+    parser.add_argument("--rows", default="100,1000,10000", help="comma-separated data_points sizes")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = [
+        asyncio.run(_measure(int(rows), args.iterations))
+        for rows in args.rows.split(",") if rows.strip()
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    for result in results:
+        print(
+            f"rows={result['rows']:<6} body={result['body_kb']:>8.1f}KB "
+            f"noop={result['noop']:>7.3f}ms legacy={result['legacy']:>8.3f}ms "
+            f"encoded={result['encoded']:>8.3f}ms serialization {result['speedup']}x faster"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
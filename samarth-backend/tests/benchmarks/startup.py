@@ -0,0 +1,141 @@
+"""
+Cold-start profile: imports app.main in fresh interpreters and measures import
+time, lifespan startup and the first /api/health response, plus the slowest
+imports from `python -X importtime`.
+
+    python -m tests.benchmarks.startup --runs 5
+    python -m tests.benchmarks.startup --save-baseline
+
+Fails when a run regresses past the stored baseline, or when a module that
+must stay lazy (see LAZY_MODULES) is imported by app.main.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "startup.json"
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# Loaded on first use or by the warm-up task, never at import
+LAZY_MODULES = ("google.generativeai", "pandas", "sqlglot")
+
+CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+eager = [name for name in %r if name in sys.modules]
+
+import httpx
+from sqlalchemy import create_engine
+import app.database.engine as database
+database.ENGINE = create_engine(sys.argv[1])
+
+async def first_response():
+    begin = time.perf_counter()
+    async with app.main.app.router.lifespan_context(app.main.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            status = (await client.get("/api/health/")).status_code
+        return started - begin, time.perf_counter() - started, status
+
+lifespan, response, status = asyncio.run(first_response())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": lifespan * 1000,
+    "first_response_ms": response * 1000,
+    "status": status,
+    "eager_loaded": eager,
+}))
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "startup-benchmark")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env["PYTHONPATH"] = str(BACKEND_DIR) + os.pathsep + env.get("PYTHONPATH", "")
+    # Measure the cold path: warm-up would overlap with the first request
+    env.setdefault("STARTUP_WARMUP", "false")
+    return env
+
+
+def _run_once(database_url: str) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD % (LAZY_MODULES,), database_url],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _slowest_imports(top: int) -> List[Dict[str, Any]]:
+    """Top-level packages by total self import time (no double counting of nested imports)."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True, check=True,
+    )
+    totals: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)", line)
+        if match:
+            package = match.group(2).split(".")[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1))
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"package": name, "ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold-start profile of app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed fraction slower than baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Fresh database per profile: the first run seeds, later runs measure the warm-boot skip
+        database_url = f"sqlite:///{Path(workdir) / 'startup.sqlite3'}"
+        runs = [_run_once(database_url) for _ in range(args.runs)]
+    slowest = _slowest_imports(args.top)
+
+    result = {
+        key: round(statistics.median(run[key] for run in runs), 1)
+        for key in ("import_ms", "lifespan_ms", "first_response_ms")
+    }
+    result["first_boot_lifespan_ms"] = round(runs[0]["lifespan_ms"], 1)
+    eager = sorted({name for run in runs for name in run["eager_loaded"]})
+
+    print(f"runs={args.runs} python={sys.version.split()[0]}")
+    for key, value in result.items():
+        print(f"  {key:<24} {value:>8.1f}ms")
+    print("slowest imports:")
+    for entry in slowest:
+        print(f"  {entry['package']:<24} {entry['ms']:>8.1f}ms")
+
+    failures = [f"{name} is imported by app.main; it must load lazily" for name in eager]
+    failures += [f"GET /api/health/ returned {run['status']}" for run in runs if run["status"] != 200]
+    if args.save_baseline:
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+    elif BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())
+        for key in ("import_ms", "lifespan_ms", "first_response_ms"):
+            if baseline.get(key) and result[key] > baseline[key] * (1 + args.max_regression):
+                failures.append(f"{key} {baseline[key]} -> {result[key]}")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
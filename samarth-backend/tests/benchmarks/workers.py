@@ -0,0 +1,157 @@
+"""
+Horizontal-scaling benchmark: serves tests.benchmarks.app with 1, 2, 4...
+uvicorn workers sharing one state backend and reports how throughput scales.
+
+    python -m tests.benchmarks.workers --workers 1,2,4
+    python -m tests.benchmarks.workers --shared-url redis://127.0.0.1:6379/0 --min-efficiency 0.8
+
+Without --shared-url a local tests.benchmarks.resp_server is started. Answer
+caching is off so every request runs the (fake) agent loop; with the model
+latency dominating, per-worker agent concurrency is the bottleneck and
+throughput should grow close to linearly with workers.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _process(args: List[str], env: Dict[str, str]) -> Iterator[subprocess.Popen]:
+    process = subprocess.Popen(args, cwd=BACKEND_DIR, env=env)
+    try:
+        yield process
+    finally:
+        # SIGTERM, so uvicorn drains in-flight requests through the app's lifespan
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _wait_ready(url: str, workers: int, timeout: float = 90.0) -> None:
+    """Waits until every worker has answered a health check (and finished its warm-up)."""
+    deadline = time.monotonic() + timeout
+    seen = set()
+    while time.monotonic() < deadline:
+        try:
+            # A fresh connection per probe, so the accepting worker varies
+            response = httpx.get(f"{url}/api/health/", timeout=2.0, headers={"Connection": "close"})
+            services = response.json()["services"]
+            if services["ai_service"] == "operational":
+                seen.add(services["worker_pid"])
+            if len(seen) >= workers:
+                return
+        except (httpx.HTTPError, KeyError, ValueError):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{workers} workers at {url} did not become ready within {timeout:.0f}s")
+
+
+async def _load(url: str, clients: int, requests: int, offset: int, timeout: float) -> Dict:
+    from tests.benchmarks.run import _questions, _run_level
+
+    # No keep-alive: every request is accepted anew, spreading load over the workers like a load balancer would
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        return await _run_level(client, _questions("agent", requests, offset=offset), clients)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Throughput across uvicorn workers with shared state")
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--rows", default="10k")
+    parser.add_argument("--clients-per-worker", type=int, default=16)
+    parser.add_argument("--requests-per-worker", type=int, default=64)
+    parser.add_argument("--model-latency", type=float, default=0.25)
+    parser.add_argument("--shared-url", help="Redis-protocol server; default starts tests.benchmarks.resp_server")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--min-efficiency", type=float, default=0.0, help="fail below this fraction of linear scaling")
+    args = parser.parse_args(argv)
+    levels = [int(level) for level in args.workers.split(",") if level.strip()]
+
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    env["PYTHONPATH"] = str(BACKEND_DIR) + os.pathsep + env.get("PYTHONPATH", "")
+    env.update({
+        "BENCH_ROWS": args.rows,
+        "BENCH_MODEL_LATENCY": str(args.model_latency),
+        "ANSWER_CACHE_ENABLED": "false",
+        "HISTORY_PERSIST": "false",
+        "SHARED_STATE_BACKEND": "redis",
+    })
+    os.environ.update({key: env[key] for key in ("GEMINI_API_KEY", "LOG_LEVEL", "BENCH_ROWS")})
+
+    # Build the dataset once here rather than racing in every worker
+    from tests.benchmarks.datasets import connect, parse_rows
+    connect(parse_rows(args.rows), env.get("BENCH_DATABASE_URL"))
+
+    resp_port = _free_port()
+    resp_server = None if args.shared_url else _process(
+        [sys.executable, "-m", "tests.benchmarks.resp_server", "--port", str(resp_port)], env
+    )
+    env["SHARED_STATE_URL"] = args.shared_url or f"redis://127.0.0.1:{resp_port}/0"
+
+    results = []
+    with resp_server or _noop():
+        for index, workers in enumerate(levels):
+            port = _free_port()
+            url = f"http://127.0.0.1:{port}"
+            command = [
+                sys.executable, "-m", "uvicorn", "tests.benchmarks.app:app",
+                "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+            ]
+            with _process(command, env):
+                _wait_ready(url, workers)
+                clients = args.clients_per_worker * workers
+                requests = args.requests_per_worker * workers
+                result = asyncio.run(_load(url, clients, requests, offset=index * 1000, timeout=args.timeout))
+            result["workers"] = workers
+            # 503s are fast rejections, not served work
+            result["ok_rps"] = round(result["throughput_rps"] * result["statuses"].get("200", 0) / max(result["requests"], 1), 2)
+            results.append(result)
+            statuses = " ".join(f"{code}={count}" for code, count in result["statuses"].items())
+            print(
+                f"workers={workers:<3} clients={clients:<4} {result['ok_rps']:>7.1f} ok req/s "
+                f"p50={result['p50_ms']:>8.1f}ms p95={result['p95_ms']:>8.1f}ms [{statuses}]",
+                flush=True,
+            )
+
+    base = results[0]["ok_rps"] / results[0]["workers"] if results and results[0]["ok_rps"] else 0.0
+    failures = []
+    for result in results:
+        efficiency = result["ok_rps"] / (base * result["workers"]) if base else 0.0
+        print(f"workers={result['workers']:<3} scaling efficiency {efficiency:.2f}")
+        if efficiency < args.min_efficiency:
+            failures.append(f"{result['workers']} workers at {efficiency:.2f} of linear")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+@contextmanager
+def _noop():
+    yield None
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
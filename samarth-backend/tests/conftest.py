@@ -0,0 +1,44 @@
+"""
+Shared setup for the test suite: the app runs offline against the scripted
+fake Gemini and a small synthetic agri_climate_data in a temporary SQLite file.
+
+    python -m pytest -q
+"""
+import os
+
+# Settings are read at import time, so these must be in place before any app import
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SEED_MOCK_DATA", "false")
+os.environ.setdefault("DB_ASYNC_ENABLED", "false")
+os.environ.setdefault("SHARED_STATE_BACKEND", "memory")
+os.environ.setdefault("ANSWER_CACHE_BACKEND", "memory")
+os.environ.setdefault("INSIGHTS_PRECOMPUTE_ENABLED", "false")
+os.environ.setdefault("STARTUP_WARMUP", "false")
+
+import google.generativeai as genai
+import pytest
+from sqlalchemy import create_engine
+from tests.benchmarks.fake_gemini import FakeGenerativeModel
+
+genai.GenerativeModel = FakeGenerativeModel
+FakeGenerativeModel.latency_seconds = 0.01
+
+import app.database.engine as database
+import app.tools.sql_tools as sql_tools
+from tests.benchmarks.datasets import connect
+
+DATASET_ROWS = 2_000
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dataset(tmp_path_factory):
+    """Engine over DATASET_ROWS synthetic rows, installed as the app's database."""
+    url = f"sqlite:///{tmp_path_factory.mktemp('data') / 'agri.sqlite3'}"
+    # Installed before loading: ingestion syncs the data version through the app's engine
+    database.ENGINE = create_engine(url)
+    engine = connect(DATASET_ROWS, url)
+    database.ENGINE.dispose()
+    database.ENGINE = engine
+    sql_tools.sync_data_generation()
+    yield engine
+    engine.dispose()
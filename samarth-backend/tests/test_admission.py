@@ -0,0 +1,88 @@
+import asyncio
+import httpx
+import pytest
+import app.core.admission as admission_module
+from app.core.admission import AdmissionController, AdmissionMiddleware, _current_client
+from app.core.concurrency import ClientRateLimitedError
+from app.core.telemetry import RequestTrace
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = dict(
+        capacity=10.0, refill_per_second=0.0, max_in_flight=100, max_clients=100,
+        base_cost=1.0, cost_per_model_call=5.0, cost_per_sql_second=1.0,
+    )
+    return AdmissionController(**{**options, **overrides})
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _request(app, method: str, path: str, api_key: str = "client-a") -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.request(method, path, headers={"X-API-Key": api_key})
+
+
+def test_spent_budget_gets_429(monkeypatch):
+    monkeypatch.setattr(admission_module, "admission", _controller(capacity=2.0))
+    app = AdmissionMiddleware(_ok)
+
+    statuses = [asyncio.run(_request(app, "POST", "/api/analytics/query")).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    rejected = asyncio.run(_request(app, "POST", "/api/analytics/query"))
+    assert rejected.headers["Retry-After"] == "60"
+    # Budgets are per client
+    assert asyncio.run(_request(app, "POST", "/api/analytics/query", api_key="client-b")).status_code == 200
+
+
+def test_full_server_gets_503(monkeypatch):
+    controller = _controller(max_in_flight=1)
+    monkeypatch.setattr(admission_module, "admission", controller)
+    assert controller.admit("ip:other") is None
+
+    response = asyncio.run(_request(AdmissionMiddleware(_ok), "POST", "/api/analytics/query"))
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert controller.stats()["rejected_capacity"] == 1
+
+
+def test_unmetered_requests(monkeypatch):
+    controller = _controller(capacity=0.5)
+    monkeypatch.setattr(admission_module, "admission", controller)
+    app = AdmissionMiddleware(_ok)
+
+    for _ in range(3):
+        # CORS preflights and routes outside the analytics API are never charged
+        assert asyncio.run(_request(app, "OPTIONS", "/api/analytics/query")).status_code == 200
+        assert asyncio.run(_request(app, "GET", "/health")).status_code == 200
+    assert controller.stats()["cost_charged"] == 0
+
+
+def test_charges_measured_cost():
+    controller = _controller()
+    trace = RequestTrace()
+    trace.add("gemini.generate", 0.5)
+    trace.add("gemini.generate", 0.5)
+    trace.add("sql.db", 2.0)
+
+    assert controller.admit("key:a") is None
+    # base + 2 model calls + 2 SQL seconds
+    assert controller.release("key:a", trace) == pytest.approx(1.0 + 2 * 5.0 + 2.0)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_agent_budget_gate():
+    controller = _controller(capacity=10.0)
+    token = _current_client.set("key:a")
+    try:
+        # A full bucket affords a typical run (estimate capped at capacity)
+        controller.check_agent_budget()
+        controller._bucket("key:a").tokens = 1.0
+        with pytest.raises(ClientRateLimitedError):
+            controller.check_agent_budget()
+    finally:
+        _current_client.reset(token)
@@ -0,0 +1,46 @@
+import asyncio
+from app.services.ai_service import AIService
+from tests.benchmarks.fake_gemini import FakeGenerativeModel, FakePart
+
+QUESTION = "Which state grew the most rice, and how did rainfall matter?"
+
+
+class NarratingModel(FakeGenerativeModel):
+    """Says what it is about to do before each tool call, as Gemini often does."""
+
+    def _respond(self, contents, tool_config):
+        chunks = super()._respond(contents, tool_config)
+        if chunks[0].parts[0].function_call:
+            chunks[0].parts.insert(0, FakePart(text="Let me look that up. "))
+        return chunks
+
+
+def _events(model) -> list:
+    service = AIService()
+    service.model = model
+
+    async def main():
+        return [event async for event in service.stream_insights(QUESTION)]
+
+    return asyncio.run(main())
+
+
+def test_narration_before_tool_calls_is_retracted():
+    events = _events(NarratingModel())
+    answer = events[-1]["text"]
+    assert "Let me look that up" not in answer
+
+    # What a client shows: tokens since the last reset
+    shown = []
+    for event in events:
+        if event["event"] == "reset":
+            shown = []
+        elif event["event"] == "token":
+            shown.append(event["text"])
+    assert "".join(shown).strip() == answer
+    assert [event["event"] for event in events].count("reset") == len(events[-1]["turns"]) - 1
+
+
+def test_no_reset_without_narration():
+    events = _events(FakeGenerativeModel())
+    assert "reset" not in [event["event"] for event in events]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+import app.tools.sql_tools as sql_tools
+from app.core.shared_state import MemorySharedState
+from app.services.answer_cache import (
+    AnswerCache,
+    CacheEntry,
+    MemoryCacheBackend,
+    SQLiteCacheBackend,
+    SharedCacheBackend,
+)
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    """Sets the data generation the caches see."""
+    def set_generation(value: int) -> None:
+        monkeypatch.setattr(sql_tools, "DATA_GENERATION", value)
+    set_generation(7)
+    return set_generation
+
+
+def _get(cache: AnswerCache, query: str, **kwargs):
+    return asyncio.run(cache.get(query, **kwargs))[0]
+
+
+def _set(cache: AnswerCache, query: str, answer: str) -> None:
+    asyncio.run(cache.set(query, answer))
+
+
+def test_exact_hit_ignores_case_and_punctuation(generation):
+    cache = AnswerCache(MemoryCacheBackend(100, 3600))
+    _set(cache, "Which state grew the most rice?", "Bihar")
+    assert _get(cache, "which state grew  the most rice") == "Bihar"
+    # Context and filters are part of the identity
+    assert _get(cache, "which state grew the most rice", filters={"Year": 2019}) is None
+
+
+def test_reload_invalidates_answers(generation):
+    cache = AnswerCache(MemoryCacheBackend(100, 3600))
+    _set(cache, "rice production in bihar", "2500 MT")
+    assert _get(cache, "rice production in bihar") == "2500 MT"
+
+    generation(8)
+    assert _get(cache, "rice production in bihar") is None
+    assert cache.stats()["invalidations"] == 1
+    assert len(cache.backend) == 0
+
+
+def test_sqlite_answers_survive_restart(generation, tmp_path):
+    path = str(tmp_path / "answers.sqlite3")
+    _set(AnswerCache(SQLiteCacheBackend(path, 100, 3600)), "rice production in bihar", "2500 MT")
+
+    # A new process at the same data version keeps the persisted answer
+    assert _get(AnswerCache(SQLiteCacheBackend(path, 100, 3600)), "rice production in bihar") == "2500 MT"
+
+    # Only entries of other generations are pruned after a reload
+    cache = AnswerCache(SQLiteCacheBackend(path, 100, 3600))
+    _set(cache, "wheat production in punjab", "1800 MT")
+    generation(8)
+    _set(cache, "millet production in rajasthan", "1000 MT")
+    assert len(cache.backend) == 1
+    assert _get(cache, "millet production in rajasthan") == "1000 MT"
+
+
+def test_shared_candidates_are_read_in_one_call(generation):
+    state = MemorySharedState()
+    backend = SharedCacheBackend(state, 100, 3600)
+    for index in range(3):
+        backend.put(f"k{index}", CacheEntry("answer", "scope", 7, 1e12, [float(index), 1.0]))
+    backend.put("old", CacheEntry("answer", "scope", 6, 1e12, [1.0, 1.0]))
+
+    calls = []
+    get_many = state.get_many
+    state.get_many = lambda keys: calls.append(keys) or get_many(keys)
+    state.get = lambda key: pytest.fail("candidates must not GET keys one by one")
+
+    found = dict(backend.candidates("scope", 7))
+    assert found == {"k0": [0.0, 1.0], "k1": [1.0, 1.0], "k2": [2.0, 1.0]}
+    assert len(calls) == 1
+
+
+def test_sqlite_calls_leave_the_event_loop(generation, tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "answers.sqlite3"), 100, 3600)
+    threads = []
+    for name in ("get", "put"):
+        call = getattr(backend, name)
+        setattr(backend, name, lambda *args, call=call: threads.append(threading.get_ident()) or call(*args))
+    cache = AnswerCache(backend)
+
+    async def main():
+        await cache.set("rice production in bihar", "2500 MT")
+        return await cache.get("rice production in bihar"), threading.get_ident()
+
+    (answer, _), loop_thread = asyncio.run(main())
+    assert answer == "2500 MT"
+    assert len(threads) == 2 and loop_thread not in threads
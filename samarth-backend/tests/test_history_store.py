@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.models.response_models import AnalyticsResponse
+from app.services.history_store import HistoryStore
+
+
+def _response(index: int) -> AnalyticsResponse:
+    return AnalyticsResponse(query_id=f"q{index:03d}", query=f"question {index}", insights="answer", execution_time=0.1)
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "HISTORY_PERSIST", True)
+    monkeypatch.setattr(settings, "HISTORY_DATABASE_URL", f"sqlite:///{tmp_path / 'history.sqlite3'}")
+
+
+def _persisted(count: int, buffer_size: int) -> HistoryStore:
+    """A store whose database holds `count` rows written by an earlier process."""
+    async def write():
+        store = HistoryStore(buffer_size=buffer_size, batch_size=10, flush_seconds=60, queue_max=1000)
+        store.start()
+        for index in range(count):
+            store.record(_response(index))
+        await store.stop()
+
+    asyncio.run(write())
+    return HistoryStore(buffer_size=buffer_size, batch_size=10, flush_seconds=60, queue_max=1000)
+
+
+def _pages(store: HistoryStore, selects: list, **kwargs):
+    select = store._select
+    store._select = lambda *args: selects.append(args) or select(*args)
+
+    async def main():
+        store.start()
+        first = await store.list(limit=5)
+        rest = await store.list(limit=5, cursor=first[1], **kwargs)
+        await store.stop()
+        return first, rest
+
+    return asyncio.run(main())
+
+
+def test_first_page_is_served_from_the_ring(database):
+    store = _persisted(count=12, buffer_size=8)
+    selects = []
+    (page, cursor), (rest, _) = _pages(store, selects)
+
+    assert [item["query_id"] for item in page] == ["q011", "q010", "q009", "q008", "q007"]
+    assert cursor is not None
+    # Only the startup seed and the cursor page read the database
+    assert len(selects) == 2
+    assert [item["query_id"] for item in rest] == ["q006", "q005", "q004", "q003", "q002"]
+
+
+def test_short_ring_falls_back_to_the_database(database):
+    # The ring holds 4 of 12 rows, fewer than a page
+    store = _persisted(count=12, buffer_size=4)
+    selects = []
+    (page, cursor), _ = _pages(store, selects)
+
+    assert [item["query_id"] for item in page] == ["q011", "q010", "q009", "q008", "q007"]
+    assert cursor is not None
+    assert len(selects) == 3
+
+
+def test_ring_holding_every_row_ends_the_listing(database):
+    store = _persisted(count=3, buffer_size=8)
+    selects = []
+    (page, cursor), _ = _pages(store, selects)
+
+    assert [item["query_id"] for item in page] == ["q002", "q001", "q000"]
+    assert cursor is None
+    # Seed only; the second call has no cursor either, so it's a first page too
+    assert len(selects) == 1
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime
+import app.core.admission as admission_module
+import app.services.insight_store as insight_module
+from app.config import settings
+from app.core.admission import AdmissionController, _current_client
+from app.core.telemetry import start_trace
+from app.services.answer_cache import query_key
+from app.services.history_store import HistoryStore
+from app.services.insight_store import InsightStore
+
+QUESTION = "Explain how rainfall patterns affected rice output in drought years"
+
+
+def _store() -> InsightStore:
+    return InsightStore(top_n=5, min_asks=2, history_window=100, max_age_seconds=3600, poll_seconds=60)
+
+
+def test_refresh_is_not_charged_to_the_triggering_request(monkeypatch):
+    broke = AdmissionController(
+        capacity=10.0, refill_per_second=0.0, max_in_flight=100, max_clients=100,
+        base_cost=1.0, cost_per_model_call=5.0, cost_per_sql_second=1.0,
+    )
+    broke._bucket("key:broke").tokens = 0.0
+    monkeypatch.setattr(admission_module, "admission", broke)
+    store = _store()
+    key = query_key(QUESTION)
+    store._popular = {key: (QUESTION, 3)}
+
+    async def request():
+        # A lookup by a client with no agent budget left finds the entry missing or stale
+        _current_client.set("key:broke")
+        trace = start_trace()
+        refreshed = await store._revalidate(key)
+        return refreshed, trace
+
+    refreshed, trace = asyncio.run(request())
+    assert refreshed
+    assert store.stats()["refreshes"] == 1
+    assert trace.totals("gemini.generate") == (0, 0.0)
+
+
+def test_rank_counts_question_texts(monkeypatch):
+    history = HistoryStore(buffer_size=100, batch_size=10, flush_seconds=1, queue_max=100)
+    for query in ["Why did wheat fall in Punjab?", "why did wheat fall in punjab", "Which crops resist drought?"]:
+        history._recent.append({"query_id": query, "query": query, "timestamp": datetime.utcnow()})
+    monkeypatch.setattr(insight_module, "history_store", history)
+    monkeypatch.setattr(settings, "INTENT_ROUTER_ENABLED", False)
+
+    popular = asyncio.run(_store().rank())
+    assert list(popular.values()) == [("why did wheat fall in punjab", 2)]
@@ -0,0 +1,89 @@
+import math
+import numpy as np
+import pytest
+from sqlalchemy import select
+import app.tools.sql_tools as sql_tools
+from app.models.request_models import StructuredQuery
+from app.services import structured_query
+from app.services.rollup_engine import RollupEngine
+from app.services.structured_query import _rollup_filters, compile_structured_query
+from app.tools.sql_tools import AGRI_CLIMATE_TABLE
+
+QUERIES = [
+    {"dimensions": ["State"], "measures": ["count", "sum_production", "avg_rainfall"]},
+    {"dimensions": ["Year", "Crop"], "measures": ["sum_production", "avg_production"]},
+    {"dimensions": [], "measures": ["count", "sum_rainfall", "avg_rainfall"]},
+    {"dimensions": ["Crop"], "measures": ["avg_production"], "filters": {"Year": {"gte": 2010, "lte": 2015}}},
+    {"dimensions": ["State"], "measures": ["sum_production"], "filters": {"Crop": ["Rice", "Wheat"], "Year": 2012}},
+    {"dimensions": ["State", "Year", "Crop"], "measures": ["count", "sum_production"], "filters": {"State": "Punjab"}},
+    {"dimensions": ["State"], "measures": ["avg_rainfall"], "order_by": "avg_rainfall", "limit": 5},
+]
+
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    rollups = RollupEngine(max_rows=1_000_000)
+    assert rollups.refresh()
+    # Structured queries expand year ranges from the app's engine
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(structured_query, "rollup_engine", rollups)
+        yield rollups
+
+
+def _same(left, right) -> bool:
+    if left is None or right is None:
+        return left is None and right is None
+    return math.isclose(left, right, rel_tol=1e-6, abs_tol=1e-6)
+
+
+@pytest.mark.parametrize("spec", QUERIES)
+def test_rollups_match_sql(engine, dataset, spec):
+    query = StructuredQuery(**spec)
+    with dataset.connect() as connection:
+        result = connection.execute(compile_structured_query(query))
+        expected = [dict(row._mapping) for row in result]
+
+    rows = engine.query(
+        group_by=query.dimensions,
+        measures=query.measures,
+        filters=_rollup_filters(query),
+        order_by=query.order_by,
+        descending=query.descending,
+        limit=query.limit,
+    )
+
+    assert expected
+    assert len(rows) == len(expected)
+    for row, want in zip(rows, expected):
+        for dim in query.dimensions:
+            assert row[dim] == want[dim]
+        for measure in query.measures:
+            assert _same(row[measure], want[measure]), (measure, row, want)
+
+
+def test_correlation_matches_numpy(engine, dataset):
+    table = AGRI_CLIMATE_TABLE
+    with dataset.connect() as connection:
+        pairs = connection.execute(
+            select(table.c.Production_MT, table.c.Rainfall_mm).where(table.c.Crop == "Rice")
+        ).all()
+    production, rainfall = np.array(pairs, dtype=np.float64).T
+
+    (row,) = engine.query(group_by=[], measures=["corr_production_rainfall"], filters={"Crop": "Rice"})
+    assert row["corr_production_rainfall"] == pytest.approx(np.corrcoef(production, rainfall)[0, 1], abs=1e-4)
+
+
+def test_filters_are_case_insensitive(engine):
+    assert engine.query(["State"], ["count"], {"State": "punjab"}) == engine.query(["State"], ["count"], {"State": "Punjab"})
+
+
+def test_rebuild_swaps_in_a_new_snapshot(engine, monkeypatch):
+    before = engine.snapshot
+    monkeypatch.setattr(sql_tools, "DATA_GENERATION", before.generation + 1)
+    assert engine.ensure_fresh()
+
+    after = engine.snapshot
+    assert after is not before
+    assert (before.generation, after.generation) == (after.generation - 1, sql_tools.DATA_GENERATION)
+    # The old build is untouched, so a query holding it finishes consistently
+    assert before.rows == after.rows > 0
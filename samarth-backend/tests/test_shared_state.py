@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.core.shared_state import RedisSharedState, SharedStateError
+from tests.benchmarks.resp_server import Store, _encode, _read_command
+
+
+class RespServer:
+    """tests.benchmarks.resp_server on a background loop, with hooks to cut connections."""
+
+    def __init__(self):
+        self.store = Store()
+        # Commands applied and then answered by closing the connection instead of a reply
+        self.drop_after: set = set()
+        self._writers: set = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._server = self._call(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(5)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                command = await _read_command(reader)
+                if command is None:
+                    break
+                reply = self.store.execute(*command)
+                if command[0].upper() in self.drop_after:
+                    break
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def disconnect_all(self) -> None:
+        async def close():
+            for writer in list(self._writers):
+                writer.close()
+        self._call(close())
+        time.sleep(0.05)
+
+    def stop(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._server.close()
+        self.disconnect_all()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+
+@pytest.fixture
+def server():
+    server = RespServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def state(server):
+    return RedisSharedState(f"redis://127.0.0.1:{server.port}/0", prefix="test:", timeout=1.0)
+
+
+def test_get_set_delete(state):
+    assert state.ping()
+    assert state.get("missing") is None
+    state.set("answer", "42")
+    state.set("short", "gone soon", ttl=0.05)
+    assert state.get_many(["answer", "missing", "short"]) == ["42", None, "gone soon"]
+    time.sleep(0.1)
+    assert state.get("short") is None
+    state.delete("answer")
+    assert state.get("answer") is None
+
+
+def test_incr_sets_ttl_only_on_create(state, server):
+    assert state.incr("hits", ttl=60) == 1
+    assert state.incr("hits", 2, ttl=60) == 3
+    expires_at = server.store.expiry[b"test:hits"]
+    assert state.incr("hits", ttl=1) == 4
+    # The window is not pushed out by later increments
+    assert server.store.expiry[b"test:hits"] == expires_at
+
+
+def test_push_keeps_newest_items(state):
+    for index in range(5):
+        state.push("recent", f"item {index}", cap=3)
+    assert state.items("recent", 10) == ["item 4", "item 3", "item 2"]
+    assert state.items("recent", 2) == ["item 4", "item 3"]
+
+
+def test_reconnects_after_the_server_drops_connections(state, server):
+    state.set("answer", "42")
+    server.disconnect_all()
+    assert state.get("answer") == "42"
+    assert state.incr("hits") == 1
+    assert state.stats()["errors"] == 0
+
+
+def test_incr_is_not_resent_after_a_lost_reply(state, server):
+    state.ping()
+    server.drop_after.add(b"INCRBY")
+    with pytest.raises(SharedStateError):
+        state.incr("hits")
+    server.drop_after.clear()
+    # The server applied the first INCRBY; a retry would have counted it twice
+    assert state.incr("hits") == 2
+
+
+def test_unreachable_server(state, server):
+    server.stop()
+    assert not state.ping()
+    with pytest.raises(SharedStateError):
+        state.get("answer")
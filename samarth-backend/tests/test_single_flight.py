@@ -0,0 +1,96 @@
+import asyncio
+from app.core.concurrency import SingleFlight
+from app.services.answer_cache import answer_cache
+from app.services.query_processor import query_processor
+from tests.benchmarks.fake_gemini import FakeGenerativeModel
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.run("same", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(runs) == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_different_keys_and_later_calls_run_again():
+    flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0)
+        return len(runs)
+
+    async def main():
+        await asyncio.gather(flight.run("a", work), flight.run("b", work))
+        # The first run has finished, so nothing stale is reused
+        return await flight.run("a", work)
+
+    assert asyncio.run(main()) == (3, False)
+
+
+def test_failure_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model unavailable")
+
+    async def main():
+        return await asyncio.gather(*(flight.run("same", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["started"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_run():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.run("same", work))
+        second = asyncio.ensure_future(flight.run("same", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == ("answer", True)
+
+
+def test_identical_questions_run_the_agent_once(monkeypatch):
+    monkeypatch.setattr(query_processor, "single_flight", SingleFlight())
+    question = "Describe the history of irrigation policy and its impacts"
+
+    def ask(count: int):
+        if answer_cache is not None:
+            answer_cache.clear()
+        calls = FakeGenerativeModel.calls
+
+        async def main():
+            return await asyncio.gather(*(query_processor.process_query(question) for _ in range(count)))
+
+        return asyncio.run(main()), FakeGenerativeModel.calls - calls
+
+    (single,), single_calls = ask(1)
+    responses, calls = ask(4)
+    assert single_calls > 0
+    # Four callers, one agent run: the same model calls as a lone caller
+    assert calls == single_calls
+    assert {response.insights for response in responses} == {single.insights}
+    assert query_processor.single_flight.stats()["coalesced"] == 3
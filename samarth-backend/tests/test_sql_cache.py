@@ -0,0 +1,16 @@
+from app.tools.sql_cache import canonicalize_sql, sql_fingerprint
+
+
+def test_formatting_variants_collide():
+    assert sql_fingerprint('SELECT State, SUM("Production_MT") FROM agri_climate_data;') == sql_fingerprint(
+        'select state,\n  sum("Production_MT")  -- total\nFROM Agri_Climate_Data'
+    )
+
+
+def test_quoted_identifiers_and_literals_keep_their_case():
+    assert sql_fingerprint('SELECT "State" FROM t') != sql_fingerprint('SELECT "state" FROM t')
+    assert sql_fingerprint("SELECT 1 FROM t WHERE s = 'Bihar'") != sql_fingerprint("SELECT 1 FROM t WHERE s = 'bihar'")
+
+
+def test_unparseable_sql_falls_back_to_tokens():
+    assert canonicalize_sql("SELECT 'unterminated /* note */") == "select ' unterminated"
@@ -0,0 +1,59 @@
+import pytest
+from app.tools.sql_guard import SQLRejectedError, prepare_query
+
+VIEWS = frozenset({"agri_state_year_totals", "agri_crop_year_totals", "agri_state_rainfall_avg"})
+
+ALLOWED = [
+    'SELECT "State", SUM("Production_MT") FROM agri_climate_data GROUP BY "State"',
+    'SELECT * FROM public.agri_climate_data WHERE "Year" BETWEEN 2015 AND 2019',
+    'SELECT "Crop", ROUND(AVG("Rainfall_mm")::numeric, 2) FROM agri_climate_data GROUP BY 1 ORDER BY 2 DESC',
+    'SELECT LOWER("State"), COALESCE("Production_MT", 0) FROM agri_climate_data',
+    'SELECT "State", RANK() OVER (PARTITION BY "Year" ORDER BY "Production_MT" DESC) FROM agri_climate_data',
+    'WITH totals AS (SELECT "State", SUM("Production_MT") AS p FROM agri_climate_data GROUP BY 1) SELECT * FROM totals',
+    'SELECT a."State" FROM agri_climate_data a JOIN agri_climate_data b ON a."State" = b."State" AND a."Year" = b."Year" - 1',
+    'SELECT a."State" FROM agri_climate_data a JOIN agri_state_rainfall_avg r USING ("State")',
+    'SELECT "State" FROM agri_climate_data WHERE "Year" IN (SELECT MAX("Year") FROM agri_climate_data)',
+    'SELECT CORR("Production_MT", "Rainfall_mm") FROM agri_climate_data',
+]
+
+REJECTED = [
+    ("DELETE FROM agri_climate_data", "not_read_only"),
+    ("DROP TABLE agri_climate_data", "not_read_only"),
+    ("SELECT 1; SELECT 2", "multiple_statements"),
+    ("SELECT FROM WHERE", "parse_error"),
+    ("SELECT * FROM pg_catalog.pg_user", "unknown_table"),
+    ("SELECT * FROM users", "unknown_table"),
+    ("SELECT * FROM generate_series(1, 1000000000)", "unknown_table"),
+    ("SELECT * FROM (VALUES (1), (2)) AS v(x)", "unknown_table"),
+    ("SELECT version()", "forbidden_function"),
+    ("SELECT pg_sleep(10)", "forbidden_function"),
+    ("SELECT current_setting('server_version')", "forbidden_function"),
+    ('SELECT * FROM agri_climate_data a, agri_climate_data b', "cross_join"),
+    ('SELECT * FROM agri_climate_data a CROSS JOIN agri_climate_data b', "cross_join"),
+    ('SELECT * FROM agri_climate_data a JOIN agri_climate_data b ON true', "cross_join"),
+    ('SELECT * FROM agri_climate_data a JOIN agri_climate_data b ON 1 = 1', "cross_join"),
+    ('SELECT * FROM agri_climate_data a JOIN agri_climate_data b ON a."Year" = 2019', "cross_join"),
+    ('SELECT * FROM agri_climate_data a JOIN agri_climate_data b ON a."State" = a."State"', "cross_join"),
+    ('SELECT * FROM agri_climate_data a JOIN agri_climate_data b ON a."State" = b."State" OR 1 = 1', "cross_join"),
+]
+
+
+@pytest.mark.parametrize("sql", ALLOWED)
+def test_allows_read_only_queries(sql):
+    prepared = prepare_query(sql, row_limit=100, views=VIEWS)
+    assert prepared.sql.upper().startswith(("SELECT", "WITH"))
+
+
+@pytest.mark.parametrize("sql,code", REJECTED)
+def test_rejects_unsafe_queries(sql, code):
+    with pytest.raises(SQLRejectedError) as error:
+        prepare_query(sql, row_limit=100, views=VIEWS)
+    assert error.value.code == code
+
+
+def test_caps_rows():
+    prepared = prepare_query('SELECT * FROM agri_climate_data LIMIT 5000', row_limit=100)
+    # One row past the limit, so truncation can be detected
+    assert prepared.capped
+    assert prepared.sql.endswith("LIMIT 101")
+    assert prepared.uncapped_sql.endswith("LIMIT 5000")